@@ -42,12 +42,14 @@ def create_app():
         CORS(app, 
              origins=[o.strip() for o in cors_origins.split(",") if o.strip()],
              methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-             allow_headers=["Content-Type", "Authorization"])
+             allow_headers=["Content-Type", "Authorization"],
+             expose_headers=["X-Total-Count"])
     else:
         CORS(app, 
              origins="*",
              methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-             allow_headers=["Content-Type", "Authorization"])
+             allow_headers=["Content-Type", "Authorization"],
+             expose_headers=["X-Total-Count"])
 
     # Register blueprints
     try:
@@ -144,6 +146,7 @@ def _ensure_columns(flask_app: Flask):
                 ("skill_profiles", "RecommendedCourseIds", "JSON"),
                 ("learning_paths", "RecommendedCourseIds", "JSON"),
                 ("learning_path_items", "CourseIds", "JSON"),
+                ("learning_path_items", "Courses", "JSON"),
                 ("placement_questions", "BatchId", "VARCHAR(64)"),
                 ("placement_questions", "Difficulty", "VARCHAR(64)"),
                 ("placement_question_bank", "Difficulty", "VARCHAR(64)"),
@@ -152,6 +155,7 @@ def _ensure_columns(flask_app: Flask):
                 ("placement_tests", "Language", "VARCHAR(64) DEFAULT 'general' NOT NULL"),
                 ("placement_questions", "Language", "VARCHAR(64) DEFAULT 'general' NOT NULL"),
                 ("Courses", "Language", "VARCHAR(64) DEFAULT 'general' NOT NULL"),
+                ("Courses", "EmbeddingHash", "VARCHAR(64)"),
                 ("Messages", "AttachmentUrl", "VARCHAR(500)"),
                 ("Messages", "AttachmentType", "VARCHAR(20)"),
                 ("Messages", "AttachmentName", "VARCHAR(255)"),
@@ -168,6 +172,56 @@ def _ensure_columns(flask_app: Flask):
                     flask_app.logger.warning(
                         "Failed to ensure column %s.%s (%s)", table, column, exc
                     )
+            for table, index_name, definition in [
+                (
+                    "TestAttempts",
+                    "uq_test_attempts_student_test_number",
+                    "UNIQUE INDEX uq_test_attempts_student_test_number (StudentId, TestId, AttemptNumber)",
+                ),
+                (
+                    "skill_profiles",
+                    "idx_skill_profiles_user_created",
+                    "INDEX idx_skill_profiles_user_created (UserId, CreatedAt)",
+                ),
+                (
+                    "learning_paths",
+                    "idx_learning_paths_user_created",
+                    "INDEX idx_learning_paths_user_created (UserId, CreatedAt)",
+                ),
+                (
+                    "learning_path_items",
+                    "idx_learning_path_items_path_week",
+                    "INDEX idx_learning_path_items_path_week (LearningPathId, WeekNumber)",
+                ),
+                (
+                    "Messages",
+                    "idx_messages_course_from_to_created",
+                    "INDEX idx_messages_course_from_to_created (CourseId, FromUserId, ToUserId, CreatedAt)",
+                ),
+                (
+                    "Messages",
+                    "idx_messages_to_read",
+                    "INDEX idx_messages_to_read (ToUserId, ReadAt)",
+                ),
+            ]:
+                try:
+                    exists = connection.execute(
+                        text(f"SHOW INDEX FROM {table} WHERE Key_name = :name"),
+                        {"name": index_name},
+                    ).first()
+                    if not exists:
+                        connection.execute(text(f"ALTER TABLE {table} ADD {definition}"))
+                except Exception as exc:
+                    flask_app.logger.warning(
+                        "Failed to ensure index %s.%s (%s)", table, index_name, exc
+                    )
+            try:
+                # Tables created before Value became LONGTEXT
+                value_col = connection.execute(text("SHOW COLUMNS FROM session_store LIKE 'Value'")).first()
+                if value_col and str(value_col[1]).lower() != "longtext":
+                    connection.execute(text("ALTER TABLE session_store MODIFY Value LONGTEXT NOT NULL"))
+            except Exception as exc:
+                flask_app.logger.warning("Failed to widen session_store.Value (%s)", exc)
 
 
 def _ensure_default_data(flask_app: Flask):
@@ -179,6 +233,24 @@ def _ensure_default_data(flask_app: Flask):
         seed_default_instructor()
         seed_question_bank()
         _ensure_columns(flask_app)
+        try:
+            from app.services.course_index import load_course_index
+            from app.services.course_embeddings import schedule_backfill
+            from app.services.recommender import get_embedding_backend
+
+            stale = get_embedding_backend().warm()
+            load_course_index()
+            if stale:
+                schedule_backfill(flask_app)
+        except Exception as exc:
+            flask_app.logger.warning("Failed to load course embedding index: %s", exc)
+        try:
+            from app.services.video_uploads import start_sweeper
+
+            # Đẩy tiếp các video upload dở dang trước khi restart, dọn spool cũ
+            start_sweeper()
+        except Exception as exc:
+            flask_app.logger.warning("Failed to start video upload sweeper: %s", exc)
 
 
 app = create_app()
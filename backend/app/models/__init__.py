@@ -19,6 +19,9 @@ from .learning_path import LearningPath
 from .learning_path_item import LearningPathItem
 from .placement_question import PlacementQuestion
 from .placement_question_bank import PlacementQuestionBank
+from .student_test_stats import StudentTestStats
+from .ai_quiz_cache import AIQuizCacheEntry
+from .session_entry import SessionEntry
 
 __all__ = [
     'db', 'User', 'Student', 'Instructor', 'Admin', 'Course',
@@ -27,5 +30,6 @@ __all__ = [
     'CodeSubmission', 'Answer', 'AIAbilityAnalysis', 'StudyPlan',
     'PlanItem', 'Message', 'Invoice', 'AIChatSession', 'AIChatMessage',
     'PlacementTest', 'SkillProfile', 'LearningPath', 'LearningPathItem',
-    'PlacementQuestion', 'PlacementQuestionBank', 'Payment',
+    'PlacementQuestion', 'PlacementQuestionBank', 'Payment', 'StudentTestStats',
+    'AIQuizCacheEntry', 'SessionEntry',
 ]
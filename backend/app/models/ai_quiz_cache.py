@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from app.models import db
+
+
+class AIQuizCacheEntry(db.Model):
+    """Parsed questions of one AI quiz generation, keyed by a hash of its inputs (see app.services.quiz_cache)."""
+
+    __tablename__ = "ai_quiz_cache"
+
+    cache_key = db.Column("CacheKey", db.String(64), primary_key=True)
+    prompt_version = db.Column("PromptVersion", db.String(16), nullable=False)
+    lesson_title = db.Column("LessonTitle", db.String(255), nullable=False)
+    num_questions = db.Column("NumQuestions", db.Integer, nullable=False)
+    difficulty = db.Column("Difficulty", db.String(16), nullable=False)
+    model = db.Column("Model", db.String(100), nullable=False)
+    questions = db.Column("Questions", db.JSON, nullable=False)
+    hit_count = db.Column("HitCount", db.Integer, nullable=False, default=0)
+    created_at = db.Column("CreatedAt", db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column("LastUsedAt", db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    expires_at = db.Column("ExpiresAt", db.DateTime, nullable=True, index=True)
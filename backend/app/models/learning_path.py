@@ -5,6 +5,7 @@ from app.models import db
 
 class LearningPath(db.Model):
     __tablename__ = "learning_paths"
+    __table_args__ = (db.Index("idx_learning_paths_user_created", "UserId", "CreatedAt"),)
 
     id = db.Column("Id", db.BigInteger, primary_key=True, autoincrement=True)
     user_id = db.Column("UserId", db.BigInteger, db.ForeignKey("Users.Id"), nullable=False)
@@ -5,6 +5,7 @@ from app.models import db
 
 class LearningPathItem(db.Model):
     __tablename__ = "learning_path_items"
+    __table_args__ = (db.Index("idx_learning_path_items_path_week", "LearningPathId", "WeekNumber"),)
 
     id = db.Column("Id", db.BigInteger, primary_key=True, autoincrement=True)
     learning_path_id = db.Column(
@@ -15,6 +16,8 @@ class LearningPathItem(db.Model):
     description = db.Column("Description", db.Text, nullable=True)
     topics = db.Column("Topics", db.JSON, nullable=True)
     course_ids = db.Column("CourseIds", db.JSON, nullable=True)
+    # Timeline materialized at creation: [{"id", "title", "slug"}] in course_ids order
+    courses = db.Column("Courses", db.JSON, nullable=True)
     created_at = db.Column(
         "CreatedAt", db.DateTime(timezone=True), nullable=False, default=datetime.utcnow
     )
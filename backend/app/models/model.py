@@ -156,6 +156,8 @@ class Course(db.Model):
     is_public = db.Column('IsPublic', db.Boolean, nullable=False, default=False)
     # [MỚI] Vector đặc trưng khóa học cho AI
     embedding_vector = db.Column('EmbeddingVector', db.JSON)
+    # sha256(model + course text) of the text the vector was computed from
+    embedding_hash = db.Column('EmbeddingHash', db.String(64))
 
     created_at = db.Column('CreatedAt', db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
     updated_at = db.Column('UpdatedAt', db.DateTime(timezone=True), nullable=False, default=datetime.utcnow)
@@ -353,6 +355,9 @@ class QuestionTestCase(db.Model):
 # ========================
 class TestAttempt(db.Model):
     __tablename__ = 'TestAttempts'
+    __table_args__ = (
+        db.UniqueConstraint('StudentId', 'TestId', 'AttemptNumber', name='uq_test_attempts_student_test_number'),
+    )
 
     id = db.Column('Id', db.BigInteger, primary_key=True, autoincrement=True)
     test_id = db.Column('TestId', db.BigInteger, db.ForeignKey('Tests.Id'), nullable=False)
@@ -449,6 +454,12 @@ class PlanItem(db.Model):
 # ========================
 class Message(db.Model):
     __tablename__ = 'Messages'
+    __table_args__ = (
+        # Thread listing: last message per (course, participants)
+        db.Index('idx_messages_course_from_to_created', 'CourseId', 'FromUserId', 'ToUserId', 'CreatedAt'),
+        # Unread counters
+        db.Index('idx_messages_to_read', 'ToUserId', 'ReadAt'),
+    )
 
     id = db.Column('Id', db.BigInteger, primary_key=True, autoincrement=True)
     channel = db.Column('Channel', db.String(20), default='direct')
@@ -0,0 +1,14 @@
+from sqlalchemy.dialects import mysql
+
+from app.models import db
+
+
+class SessionEntry(db.Model):
+    """One key of the shared session store (app.utils.session_store, SESSION_STORE_BACKEND=sql)."""
+
+    __tablename__ = "session_store"
+
+    key = db.Column("Key", db.String(255), primary_key=True)
+    # JSON; MySQL TEXT stops at 64 KB, too small for a long chat history
+    value = db.Column("Value", db.Text().with_variant(mysql.LONGTEXT(), "mysql"), nullable=False)
+    expires_at = db.Column("ExpiresAt", db.DateTime, nullable=False, index=True)
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from app.models import db
+
+
+class StudentTestStats(db.Model):
+    """Running aggregates of a student's attempts on one test (maintained on submit)."""
+
+    __tablename__ = "student_test_stats"
+
+    student_id = db.Column("StudentId", db.BigInteger, db.ForeignKey("Students.Id"), primary_key=True)
+    test_id = db.Column("TestId", db.BigInteger, db.ForeignKey("Tests.Id"), primary_key=True)
+    attempt_count = db.Column("AttemptCount", db.Integer, nullable=False, default=0)
+    score_sum = db.Column("ScoreSum", db.Numeric(12, 2), nullable=False, default=0)
+    best_score = db.Column("BestScore", db.Numeric(6, 2), nullable=True)
+    updated_at = db.Column(
+        "UpdatedAt", db.DateTime(timezone=True), nullable=False, default=datetime.utcnow
+    )
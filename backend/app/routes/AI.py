@@ -3,29 +3,24 @@
 from __future__ import annotations
 
 import os
-from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
-from dotenv import load_dotenv
-from flask import Blueprint, current_app, jsonify, request, send_from_directory
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, verify_jwt_in_request, get_jwt_identity
-from werkzeug.utils import secure_filename
-from sqlalchemy import or_
-from app.models.model import Course, AIChatSession, AIChatMessage, db
+from app.models.model import AIChatSession, AIChatMessage, db
+from app.services import llm_client
+from app.services.course_context import get_course_context
+from app.services.ai_streaming import wants_stream, sse_event, sse_response, stream_text
+from app.utils.uploads import UploadError, receive_upload, serve_upload_file
 import mimetypes
 import base64
 
-try:
-    import google.generativeai as genai
-except Exception:  # pragma: no cover - optional dependency
-    genai = None
-
-
 ai_bp = Blueprint("ai", __name__, url_prefix="/api/ai")
 
 UPLOAD_DIR = Path(__file__).resolve().parents[2] / "uploads" / "ai"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp", "pdf", "txt", "md"}
+MAX_UPLOAD_SIZE = int(os.getenv("AI_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
 
 COURSE_LIBRARY = [
     {
@@ -190,63 +185,17 @@ def _log_ai_chat_message(session: AIChatSession, user_id: int, text: str, role:
     session.message_count = (session.message_count or 0) + 1
 
 
-def _missing_dependency() -> RuntimeError:
-    return RuntimeError(
-        "google-generativeai is not installed. "
-        "Run `pip install google-generativeai` inside the backend environment."
-    )
-
-
-@lru_cache(maxsize=1)
-def _configure_client() -> None:
-    """Configure the Generative AI client once."""
-    load_dotenv()
-    if genai is None:
-        raise _missing_dependency()
-
-    api_key = (
-        os.getenv("GEMINI_API_KEY")
-        or os.getenv("GOOGLE_API_KEY")
-        or os.getenv("GOOGLE_GEMINI_KEY")
-    )
-    if not api_key:
-        raise RuntimeError("Missing GEMINI_API_KEY / GOOGLE_API_KEY in environment.")
-
-    genai.configure(api_key=api_key)
-
-
 def list_text_models() -> list[str]:
     """Return Gemini model IDs that support text generation."""
     try:
-        _configure_client()
-        models = genai.list_models()
+        return llm_client.list_models()
     except Exception as exc:  # pragma: no cover - network call
         current_app.logger.warning("Gemini list_models failed: %s", exc)
         return []
 
-    names = []
-    for model in models:
-        methods = getattr(model, "supported_generation_methods", None) or []
-        if "generateContent" in methods:
-            names.append(model.name)
-    return names
-
 
 def _prompt_gemini(prompt: str, model_name: str | None = None) -> str:
-    _configure_client()
-    name = model_name or "gemini-2.5-flash"
-    model = genai.GenerativeModel(name)
-    response = model.generate_content(prompt)
-    text = getattr(response, "text", None)
-    if text:
-        return text.strip()
-    # Fallback to concatenating individual parts if .text is empty
-    return " ".join(
-        part.text.strip()
-        for part in getattr(response, "candidates", [])  # type: ignore[attr-defined]
-        for part in getattr(getattr(part, "content", None), "parts", []) or []  # type: ignore[arg-type]
-        if hasattr(part, "text") and part.text
-    ).strip()
+    return llm_client.generate_text(prompt, model_name or "gemini-2.5-flash")
 
 
 def _load_local_image(url: str) -> dict | None:
@@ -267,30 +216,17 @@ def _load_local_image(url: str) -> dict | None:
 
 def _prompt_gemini_multimodal(prompt: str, attachments: list[dict], model_name: str | None = None) -> str:
     """Send prompt + image parts to Gemini vision-capable model."""
-    _configure_client()
-    name = model_name or "gemini-1.5-flash"
-    model = genai.GenerativeModel(name)
-
-    parts: list[dict] = [{"text": prompt}]
+    images = []
     for item in attachments:
         url = item.get("url") or ""
         img_part = _load_local_image(url)
         if img_part:
-            parts.append(img_part)
+            images.append(img_part)
     # If no valid images, fall back to text-only.
-    if len(parts) == 1:
+    if not images:
         return _prompt_gemini(prompt, model_name)
 
-    response = model.generate_content(parts)
-    text = getattr(response, "text", None)
-    if text:
-        return text.strip()
-    return " ".join(
-        part.text.strip()
-        for part in getattr(response, "candidates", [])  # type: ignore[attr-defined]
-        for part in getattr(getattr(part, "content", None), "parts", []) or []  # type: ignore[arg-type]
-        if hasattr(part, "text") and part.text
-    ).strip()
+    return llm_client.generate_text(prompt, model_name or "gemini-1.5-flash", images=images)
 
 
 def _local_reply(prompt: str) -> tuple[str, list[str], list[int]]:
@@ -365,37 +301,13 @@ def _local_reply(prompt: str) -> tuple[str, list[str], list[int]]:
 
 
 def _build_course_context(keyword: str | None = None, limit: int = 10) -> str:
-    """Fetch recent/public courses from DB to ground Gemini responses."""
+    """Recent public courses (from the shared course snapshot) to ground Gemini responses."""
     try:
-        query = Course.query.filter_by(is_public=True)
-        if keyword:
-            like = f"%{keyword.lower()}%"
-            query = query.filter(
-                or_(
-                    Course.title.ilike(like),
-                    Course.description.ilike(like),
-                    Course.level.ilike(like),
-                )
-            )
-        courses = (
-            query.order_by(Course.created_at.desc()).limit(limit).all()
-        )
+        return get_course_context().public_course_lines(keyword, limit=limit)
     except Exception as exc:  # pragma: no cover - DB error fallback
         current_app.logger.warning("Course fetch failed: %s", exc)
         return ""
 
-    if not courses:
-        return ""
-
-    lines = []
-    for idx, course in enumerate(courses, 1):
-        price = f"{course.price} {course.currency}" if course.price is not None else "N/A"
-        lines.append(
-            f"{idx}) Ten: {course.title}; Mo ta: {course.description or 'N/A'}; "
-            f"Level: {course.level or 'N/A'}; Gia: {price}"
-        )
-    return "\n".join(lines)
-
 
 @ai_bp.get("/models")
 def get_models():
@@ -410,6 +322,49 @@ _SHORT_CHAT_INSTRUCTION = (
 )
 
 
+def _persist_ai_reply(session, user_id, reply):
+    if not session:
+        return
+    try:
+        _log_ai_chat_message(session, user_id, reply, "ai")
+        session.updated_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as log_exc:
+        current_app.logger.error("Unable to log assistant reply: %s", log_exc)
+        db.session.rollback()
+
+
+def _stream_chat_reply(prompt, model, session, user_id, fallback_text, suggestions, course_ids):
+    """SSE generator for /chat: relay Gemini tokens, persist the full reply once the stream ends."""
+    model_used = model or "gemini-2.5-flash"
+    parts = []
+    warning = None
+    try:
+        for chunk in stream_text(prompt, model_used):
+            parts.append(chunk)
+            yield sse_event("token", {"text": chunk})
+    except Exception as exc:
+        current_app.logger.error("Gemini chat stream failed: %s", exc)
+        warning = str(exc)
+
+    reply = "".join(parts).strip()
+    if not reply:
+        reply = fallback_text
+        yield sse_event("token", {"text": reply})
+
+    _persist_ai_reply(session, user_id, reply)
+    yield sse_event(
+        "done",
+        {
+            "reply": reply or "No response generated.",
+            "suggestions": suggestions,
+            "recommendations": course_ids,
+            "model": model_used,
+            "warning": warning,
+        },
+    )
+
+
 @ai_bp.post("/chat")
 def chat():
     payload = request.get_json(silent=True) or {}
@@ -450,6 +405,11 @@ def chat():
             current_app.logger.error("Unable to log user prompt: %s", log_exc)
             db.session.rollback()
 
+    if wants_stream(payload) and not attachments:
+        return sse_response(
+            _stream_chat_reply(prompt, model, session, user_id, fallback_text, suggestions, course_ids)
+        )
+
     try:
         if attachments:
             ai_answer = _prompt_gemini_multimodal(prompt, attachments, model)
@@ -462,14 +422,7 @@ def chat():
         current_app.logger.error("Gemini chat failed: %s", exc)
         warning = str(exc)
 
-    if session:
-        try:
-            _log_ai_chat_message(session, user_id, reply, "ai")
-            session.updated_at = datetime.utcnow()
-            db.session.commit()
-        except Exception as log_exc:
-            current_app.logger.error("Unable to log assistant reply: %s", log_exc)
-            db.session.rollback()
+    _persist_ai_reply(session, user_id, reply)
 
     return jsonify(
         {
@@ -492,49 +445,29 @@ def _ensure_upload_dir() -> Path:
     return UPLOAD_DIR
 
 
-def _allowed_file(filename: str) -> bool:
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
 @ai_bp.post("/upload")
 def upload_attachment():
-    if "file" not in request.files:
-        return jsonify({"error": "file is required"}), 400
-
-    file = request.files["file"]
-    if not file or not file.filename:
-        return jsonify({"error": "missing filename"}), 400
-
-    if not _allowed_file(file.filename):
-        return jsonify({"error": "Unsupported file type"}), 400
-
-    safe_name = secure_filename(file.filename)
-    upload_dir = _ensure_upload_dir()
-
-    final_name = safe_name
-    counter = 1
-    while (upload_dir / final_name).exists():
-        stem = Path(safe_name).stem
-        suffix = Path(safe_name).suffix
-        final_name = f"{stem}_{counter}{suffix}"
-        counter += 1
+    """Stream the file to disk (multipart ``file`` field or raw body with ``?filename=``),
+    stopping at MAX_UPLOAD_SIZE; the stored name is the content hash."""
+    try:
+        stored = receive_upload(_ensure_upload_dir(), ALLOWED_EXTENSIONS, MAX_UPLOAD_SIZE)
+    except UploadError as e:
+        return jsonify({"error": e.message}), e.status
 
-    file.save(upload_dir / final_name)
-    url = f"/api/ai/uploads/{final_name}"
+    url = f"/api/ai/uploads/{stored.filename}"
     return jsonify(
         {
-            "file_name": final_name,
+            "file_name": stored.original_name,
             "url": url,
-            "mime": file.mimetype,
-            "size": (upload_dir / final_name).stat().st_size,
+            "mime": stored.mimetype or mimetypes.guess_type(stored.original_name)[0],
+            "size": stored.size,
         }
     )
 
 
 @ai_bp.get("/uploads/<path:filename>")
 def serve_upload(filename: str):
-    upload_dir = _ensure_upload_dir()
-    return send_from_directory(upload_dir, filename, as_attachment=False)
+    return serve_upload_file(_ensure_upload_dir(), filename)
 
 
 __all__ = [
@@ -3,62 +3,26 @@
 from __future__ import annotations
 
 import json
-import os
-from functools import lru_cache
+import time
 
-from dotenv import load_dotenv
 from flask import Blueprint, current_app, jsonify, request
 
-try:
-    import google.generativeai as genai
-except Exception:  # pragma: no cover - optional dependency
-    genai = None
-
+from app.services import llm_client
+from app.services.quiz_batch import (
+    BATCH_DEADLINE, LESSON_TIMEOUT, clamp_concurrency, get_job, run_batch, submit_job,
+)
+from app.services.quiz_cache import quiz_cache, quiz_cache_key
 
 ai_quiz_bp = Blueprint("ai_quiz", __name__, url_prefix="/api/ai/quiz")
 
-
-def _missing_dependency() -> RuntimeError:
-    return RuntimeError(
-        "google-generativeai is not installed. "
-        "Run `pip install google-generativeai` inside the backend environment."
-    )
-
-
-@lru_cache(maxsize=1)
-def _configure_client() -> None:
-    """Configure the Generative AI client once."""
-    load_dotenv()
-    if genai is None:
-        raise _missing_dependency()
-
-    api_key = (
-        os.getenv("GEMINI_API_KEY")
-        or os.getenv("GOOGLE_API_KEY")
-        or os.getenv("GOOGLE_GEMINI_KEY")
-    )
-    if not api_key:
-        raise RuntimeError("Missing GEMINI_API_KEY / GOOGLE_API_KEY in environment.")
-
-    genai.configure(api_key=api_key)
+DEFAULT_QUIZ_MODEL = "gemini-2.5-flash"
+# Part of the quiz cache key: bump when _generate_quiz_prompt or _parse_quiz_questions changes
+QUIZ_PROMPT_VERSION = "1"
 
 
 def _prompt_gemini_quiz(prompt: str, model_name: str | None = None) -> str:
-    """Call Gemini API to generate quiz questions."""
-    _configure_client()
-    name = model_name or "gemini-2.5-flash"
-    model = genai.GenerativeModel(name)
-    response = model.generate_content(prompt)
-    text = getattr(response, "text", None)
-    if text:
-        return text.strip()
-    # Fallback to concatenating individual parts if .text is empty
-    return " ".join(
-        part.text.strip()
-        for part in getattr(response, "candidates", [])  # type: ignore[attr-defined]
-        for part in getattr(getattr(part, "content", None), "parts", []) or []  # type: ignore[arg-type]
-        if hasattr(part, "text") and part.text
-    ).strip()
+    """Call Gemini API (through the shared LLM client) to generate quiz questions."""
+    return llm_client.generate_text(prompt, model_name or DEFAULT_QUIZ_MODEL)
 
 
 def _parse_quiz_questions(ai_response: str) -> list[dict]:
@@ -118,6 +82,39 @@ Make sure:
     return prompt
 
 
+def _wants_regenerate(payload) -> bool:
+    flag = payload.get("regenerate")
+    if flag is None:
+        flag = request.args.get("regenerate")
+    if isinstance(flag, bool):
+        return flag
+    return str(flag or "").lower() in ("1", "true", "yes")
+
+
+def _generate_questions(lesson_title: str, num_questions: int, difficulty: str, model: str | None,
+                        regenerate: bool = False) -> tuple[list[dict], bool, str]:
+    """Questions for one lesson from the quiz cache, or from Gemini (then cached).
+
+    Returns (questions, cached, raw AI response); ``regenerate`` skips the lookup
+    and replaces the cached entry.
+    """
+    model_name = model or DEFAULT_QUIZ_MODEL
+    key = quiz_cache_key(QUIZ_PROMPT_VERSION, lesson_title, num_questions, difficulty, model_name)
+    if regenerate:
+        quiz_cache.record_bypass()
+    else:
+        questions = quiz_cache.get(key)
+        if questions:
+            return questions, True, ""
+
+    prompt = _generate_quiz_prompt(lesson_title, num_questions, difficulty)
+    ai_response = _prompt_gemini_quiz(prompt, model)
+    questions = _parse_quiz_questions(ai_response)
+    if questions:
+        quiz_cache.put(key, questions, QUIZ_PROMPT_VERSION, lesson_title, num_questions, difficulty, model_name)
+    return questions, False, ai_response
+
+
 @ai_quiz_bp.post("/generate")
 def generate_quiz():
     """
@@ -128,8 +125,10 @@ def generate_quiz():
         "lesson_title": "string",
         "num_questions": int (optional, default 5),
         "difficulty": "easy|medium|hard" (optional, default "medium"),
-        "model": "string" (optional, Gemini model name)
+        "model": "string" (optional, Gemini model name),
+        "regenerate": bool (optional, skip the quiz cache and replace its entry)
     }
+    Identical requests are answered from the quiz cache ("cached": true).
     """
     payload = request.get_json(silent=True) or {}
     lesson_title = (payload.get("lesson_title") or "").strip()
@@ -148,16 +147,14 @@ def generate_quiz():
         return jsonify({"error": "difficulty must be 'easy', 'medium', or 'hard'"}), 400
 
     questions = []
+    cached = False
     error_msg = None
 
     try:
-        # Generate prompt and call Gemini
-        prompt = _generate_quiz_prompt(lesson_title, num_questions, difficulty)
-        ai_response = _prompt_gemini_quiz(prompt, model)
-        
-        # Parse response
-        questions = _parse_quiz_questions(ai_response)
-        
+        questions, cached, ai_response = _generate_questions(
+            lesson_title, num_questions, difficulty, model, regenerate=_wants_regenerate(payload)
+        )
+
         if not questions:
             error_msg = "Failed to parse AI response as valid quiz questions"
             current_app.logger.error("No questions parsed from: %s", ai_response)
@@ -173,16 +170,113 @@ def generate_quiz():
             "count": len(questions),
             "requested_count": num_questions,
             "difficulty": difficulty,
-            "model": model or "gemini-2.5-flash",
+            "model": model or DEFAULT_QUIZ_MODEL,
+            "cached": cached,
             "error": error_msg,
         }
     ), 200 if not error_msg or questions else 206
 
 
+def _generate_lesson_quiz(app, lesson, num_questions, difficulty, model, regenerate=False):
+    """Generate questions for one lesson of a batch (runs on a worker thread)."""
+    lesson_id = lesson.get("id")
+    lesson_title = (lesson.get("title") or "").strip()
+
+    if not lesson_title:
+        return {
+            "lesson_id": lesson_id,
+            "lesson_title": lesson_title,
+            "questions": [],
+            "error": "lesson_title is required"
+        }
+
+    questions = []
+    cached = False
+    error_msg = None
+
+    with app.app_context():
+        try:
+            questions, cached, _ = _generate_questions(
+                lesson_title, num_questions, difficulty, model, regenerate=regenerate
+            )
+
+            if not questions:
+                error_msg = "Failed to parse AI response"
+        except Exception as exc:
+            current_app.logger.error("Quiz generation failed for lesson %s: %s", lesson_id, exc)
+            error_msg = str(exc)
+
+    return {
+        "lesson_id": lesson_id,
+        "lesson_title": lesson_title,
+        "questions": questions,
+        "count": len(questions),
+        "cached": cached,
+        "error": error_msg
+    }
+
+
+def _lesson_not_finished(lesson, reason):
+    return {
+        "lesson_id": lesson.get("id"),
+        "lesson_title": (lesson.get("title") or "").strip(),
+        "questions": [],
+        "count": 0,
+        "error": reason,
+        "timed_out": True,
+    }
+
+
+def _parse_batch_request():
+    """Validate a batch payload; returns (options, None) or (None, error response)."""
+    payload = request.get_json(silent=True) or {}
+    lessons = payload.get("lessons", [])
+    num_questions = payload.get("num_questions", 5)
+    difficulty = (payload.get("difficulty") or "medium").strip().lower()
+    model = (payload.get("model") or "").strip() or None
+
+    # Validate inputs
+    if not lessons or not isinstance(lessons, list) or not all(isinstance(l, dict) for l in lessons):
+        return None, (jsonify({"error": "lessons array is required"}), 400)
+
+    if not isinstance(num_questions, int) or num_questions < 1 or num_questions > 20:
+        return None, (jsonify({"error": "num_questions must be between 1 and 20"}), 400)
+
+    if difficulty not in ("easy", "medium", "hard"):
+        return None, (jsonify({"error": "difficulty must be 'easy', 'medium', or 'hard'"}), 400)
+
+    lesson_timeout = payload.get("lesson_timeout")
+    if lesson_timeout is not None and (not isinstance(lesson_timeout, (int, float)) or lesson_timeout <= 0):
+        return None, (jsonify({"error": "lesson_timeout must be a positive number of seconds"}), 400)
+
+    app = current_app._get_current_object()
+    regenerate = _wants_regenerate(payload)
+    return {
+        "lessons": lessons,
+        "fn": lambda lesson: _generate_lesson_quiz(app, lesson, num_questions, difficulty, model, regenerate),
+        "concurrency": clamp_concurrency(payload.get("concurrency")),
+        "item_timeout": min(float(lesson_timeout or LESSON_TIMEOUT), LESSON_TIMEOUT),
+        "model": model or DEFAULT_QUIZ_MODEL,
+    }, None
+
+
+def _batch_summary(results, total, model):
+    return {
+        "results": results,
+        "total_lessons": total,
+        "successful": sum(1 for r in results if not r.get("error")),
+        "timed_out": sum(1 for r in results if r.get("timed_out")),
+        "model": model,
+    }
+
+
 @ai_quiz_bp.post("/generate-batch")
 def generate_batch_quiz():
     """
     Generate quiz questions for multiple lessons.
+    Lessons are generated concurrently; a lesson that does not finish within
+    lesson_timeout (or before the batch deadline) is returned with an error
+    and "timed_out": true while the other results are kept.
     
     Request body:
     {
@@ -194,70 +288,69 @@ def generate_batch_quiz():
         ],
         "num_questions": int (optional, default 5),
         "difficulty": "easy|medium|hard" (optional, default "medium"),
-        "model": "string" (optional, Gemini model name)
+        "model": "string" (optional, Gemini model name),
+        "concurrency": int (optional, capped by QUIZ_BATCH_MAX_CONCURRENCY),
+        "lesson_timeout": seconds (optional, capped by QUIZ_LESSON_TIMEOUT),
+        "regenerate": bool (optional, skip the quiz cache)
     }
+    For very large batches use POST /generate-batch/jobs.
     """
-    payload = request.get_json(silent=True) or {}
-    lessons = payload.get("lessons", [])
-    num_questions = payload.get("num_questions", 5)
-    difficulty = (payload.get("difficulty") or "medium").strip().lower()
-    model = (payload.get("model") or "").strip() or None
-
-    # Validate inputs
-    if not lessons or not isinstance(lessons, list):
-        return jsonify({"error": "lessons array is required"}), 400
-    
-    if not isinstance(num_questions, int) or num_questions < 1 or num_questions > 20:
-        return jsonify({"error": "num_questions must be between 1 and 20"}), 400
-    
-    if difficulty not in ("easy", "medium", "hard"):
-        return jsonify({"error": "difficulty must be 'easy', 'medium', or 'hard'"}), 400
-
-    results = []
-
-    for lesson in lessons:
-        lesson_id = lesson.get("id")
-        lesson_title = (lesson.get("title") or "").strip()
-        
-        if not lesson_title:
-            results.append({
-                "lesson_id": lesson_id,
-                "lesson_title": lesson_title,
-                "questions": [],
-                "error": "lesson_title is required"
-            })
-            continue
-        
-        questions = []
-        error_msg = None
-
-        try:
-            prompt = _generate_quiz_prompt(lesson_title, num_questions, difficulty)
-            ai_response = _prompt_gemini_quiz(prompt, model)
-            questions = _parse_quiz_questions(ai_response)
-            
-            if not questions:
-                error_msg = "Failed to parse AI response"
-        except Exception as exc:
-            current_app.logger.error("Quiz generation failed for lesson %s: %s", lesson_id, exc)
-            error_msg = str(exc)
-        
-        results.append({
-            "lesson_id": lesson_id,
-            "lesson_title": lesson_title,
-            "questions": questions,
-            "count": len(questions),
-            "error": error_msg
-        })
-
-    return jsonify(
-        {
-            "results": results,
-            "total_lessons": len(lessons),
-            "successful": sum(1 for r in results if not r.get("error")),
-            "model": model or "gemini-2.5-flash"
-        }
-    ), 200
+    options, error = _parse_batch_request()
+    if error:
+        return error
+
+    lessons = options["lessons"]
+    results = run_batch(
+        lessons,
+        options["fn"],
+        _lesson_not_finished,
+        concurrency=options["concurrency"],
+        item_timeout=options["item_timeout"],
+        deadline=time.monotonic() + BATCH_DEADLINE,
+    )
+    return jsonify(_batch_summary(results, len(lessons), options["model"])), 200
+
+
+@ai_quiz_bp.post("/generate-batch/jobs")
+def submit_batch_quiz_job():
+    """Start a background batch generation; same body as /generate-batch. Poll the returned status_url."""
+    options, error = _parse_batch_request()
+    if error:
+        return error
+
+    job = submit_job(
+        options["lessons"],
+        options["fn"],
+        _lesson_not_finished,
+        concurrency=options["concurrency"],
+        item_timeout=options["item_timeout"],
+        meta={"model": options["model"]},
+    )
+    return jsonify({
+        **job.to_status(),
+        "status_url": f"{ai_quiz_bp.url_prefix}/generate-batch/jobs/{job.id}",
+        "results_url": f"{ai_quiz_bp.url_prefix}/generate-batch/jobs/{job.id}/results",
+    }), 202
+
+
+@ai_quiz_bp.get("/generate-batch/jobs/<job_id>")
+def get_batch_quiz_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "job not found or expired"}), 404
+    return jsonify(job.to_status()), 200
+
+
+@ai_quiz_bp.get("/generate-batch/jobs/<job_id>/results")
+def get_batch_quiz_job_results(job_id):
+    """Results of a job; 202 with the lessons finished so far while it is still running."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "job not found or expired"}), 404
+    status = job.to_status()
+    body = _batch_summary(job.finished_results(), job.total, job.meta.get("model"))
+    body.update({"job_id": job.id, "status": status["status"], "completed": status["completed"]})
+    return jsonify(body), 200 if status["status"] in ("done", "failed") else 202
 
 
 @ai_quiz_bp.post("/validate")
@@ -19,6 +19,9 @@ from app.models.model import (
     Message,
 )
 from werkzeug.security import generate_password_hash
+from app.services.course_sync import on_course_saved, on_course_deleted
+from app.services.llm_client import llm_stats
+from app.utils.cache import cache_stats
 
 # Prefix API cho admin
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
@@ -190,6 +193,18 @@ def _role_counts():
     return admin_cnt, instructor_cnt, student_cnt, len(roles_set)
 
 
+@admin_bp.get("/cache/stats")
+def get_cache_stats():
+    """Size, hit/miss and eviction counters of every in-process cache of this worker."""
+    return jsonify({"caches": cache_stats()})
+
+
+@admin_bp.get("/llm/stats")
+def get_llm_stats():
+    """Calls, errors, retries, latency percentiles and token counts per LLM model of this worker."""
+    return jsonify({"models": llm_stats()})
+
+
 @admin_bp.get("/roles/summary")
 def roles_summary():
     admin_cnt, instructor_cnt, student_cnt, total_roles = _role_counts()
@@ -543,6 +558,7 @@ def create_course():
         )
         db.session.add(course)
         db.session.commit()
+        on_course_saved(course)
 
         instructor_name = instructor.user.full_name if instructor.user else None
         result = {
@@ -575,6 +591,7 @@ def delete_course(course_id: int):
         Invoice.query.filter_by(course_id=course.id).delete()
         db.session.delete(course)
         db.session.commit()
+        on_course_deleted(course_id)
         return jsonify({"message": "Đã xóa course"}), 200
     except Exception as e:
         db.session.rollback()
@@ -1,12 +1,19 @@
 from datetime import datetime
+import base64
+import json
 import os
+import time
 from pathlib import Path
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from sqlalchemy import or_, and_
-from werkzeug.utils import secure_filename
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import joinedload
 
 from app.models import db
+from app.services.ai_streaming import sse_event, sse_response
+from app.services.chat_events import publish_message, subscribe_conversation
+from app.utils.cache import BoundedCache
+from app.utils.uploads import UploadError, receive_upload, serve_upload_file
 from app.models.model import (
     User,
     Student,
@@ -61,9 +68,78 @@ def _serialize_message(msg: Message):
     }
 
 
+def _thread_summaries(user_id: int, course_ids):
+    """Last message and unread count of every thread of ``user_id`` in ``course_ids``.
+
+    Two grouped queries whatever the number of threads; keys are
+    ``(course_id, other_user_id)``. Backed by idx_messages_course_from_to_created
+    and idx_messages_to_read.
+    """
+    if not course_ids:
+        return {}, {}
+    other_user = case(
+        (Message.from_user_id == user_id, Message.to_user_id),
+        else_=Message.from_user_id,
+    )
+    ranked = (
+        db.session.query(
+            Message.id.label("id"),
+            Message.course_id.label("course_id"),
+            other_user.label("other_user_id"),
+            func.row_number()
+            .over(
+                partition_by=(Message.course_id, other_user),
+                order_by=(Message.created_at.desc(), Message.id.desc()),
+            )
+            .label("rn"),
+        )
+        .filter(
+            Message.course_id.in_(course_ids),
+            or_(Message.from_user_id == user_id, Message.to_user_id == user_id),
+        )
+        .subquery()
+    )
+    last_rows = (
+        db.session.query(ranked.c.course_id, ranked.c.other_user_id, Message.content, Message.created_at)
+        .join(Message, Message.id == ranked.c.id)
+        .filter(ranked.c.rn == 1)
+        .all()
+    )
+    last_messages = {
+        (course_id, other_id): (content, created_at)
+        for course_id, other_id, content, created_at in last_rows
+    }
+
+    unread_rows = (
+        db.session.query(Message.course_id, Message.from_user_id, func.count(Message.id))
+        .filter(
+            Message.to_user_id == user_id,
+            Message.read_at.is_(None),
+            Message.course_id.in_(course_ids),
+        )
+        .group_by(Message.course_id, Message.from_user_id)
+        .all()
+    )
+    unread = {(course_id, from_id): count for course_id, from_id, count in unread_rows}
+    return last_messages, unread
+
+
+def _thread_payload(course, summary_key, last_messages, unread, **fields):
+    content, created_at = last_messages.get(summary_key, (None, None))
+    return {
+        "courseId": course.id,
+        "courseTitle": course.title,
+        **fields,
+        "lastMessage": content,
+        "lastAt": created_at.isoformat() if created_at else None,
+        "unread": unread.get(summary_key, 0),
+    }
+
+
 @chat_bp.get("/threads")
 @jwt_required()
 def list_threads():
+    """One thread per (course, student) pair; a constant number of queries whatever the inbox size."""
     user, role = _current_user()
     if not user:
         return jsonify({"error": "Unauthorized"}), 401
@@ -74,52 +150,31 @@ def list_threads():
             return jsonify([])
         enrollments = Enrollment.query.filter_by(student_id=student.id).all()
         course_ids = [e.course_id for e in enrollments]
-        courses = Course.query.filter(Course.id.in_(course_ids)).all()
+        courses = (
+            Course.query.options(joinedload(Course.instructor).joinedload(Instructor.user))
+            .filter(Course.id.in_(course_ids))
+            .all()
+            if course_ids
+            else []
+        )
         course_map = {c.id: c for c in courses}
+        last_messages, unread = _thread_summaries(user.id, course_ids)
         threads = []
         for e in enrollments:
             course = course_map.get(e.course_id)
             if not course or not course.instructor:
                 continue
-            inst_user = course.instructor.user if course.instructor else None
-            # Last message between this student and instructor for the course
-            last_msg = (
-                Message.query.filter(
-                    Message.course_id == course.id,
-                    or_(
-                        and_(
-                            Message.from_user_id == user.id,
-                            Message.to_user_id == inst_user.id if inst_user else None,
-                        ),
-                        and_(
-                            Message.from_user_id == inst_user.id if inst_user else None,
-                            Message.to_user_id == user.id,
-                        ),
-                    ),
-                )
-                .order_by(Message.created_at.desc())
-                .first()
-            )
-            unread = (
-                Message.query.filter(
-                    Message.course_id == course.id,
-                    Message.to_user_id == user.id,
-                    Message.read_at.is_(None),
-                ).count()
-            )
+            inst_user = course.instructor.user
             threads.append(
-                {
-                    "courseId": course.id,
-                    "courseTitle": course.title,
-                    "instructorId": inst_user.id if inst_user else None,
-                    "instructorName": inst_user.full_name if inst_user else None,
-                    "studentId": student.id,
-                    "lastMessage": last_msg.content if last_msg else None,
-                    "lastAt": last_msg.created_at.isoformat()
-                    if last_msg and last_msg.created_at
-                    else None,
-                    "unread": unread,
-                }
+                _thread_payload(
+                    course,
+                    (course.id, inst_user.id if inst_user else None),
+                    last_messages,
+                    unread,
+                    instructorId=inst_user.id if inst_user else None,
+                    instructorName=inst_user.full_name if inst_user else None,
+                    studentId=student.id,
+                )
             )
         return jsonify(threads)
 
@@ -128,142 +183,341 @@ def list_threads():
         if not inst:
             return jsonify([])
         # Students enrolled in instructor's courses
-        course_ids = [c.id for c in inst.courses]
+        course_map = {c.id: c for c in inst.courses}
+        course_ids = list(course_map)
         enrollments = (
             Enrollment.query.filter(Enrollment.course_id.in_(course_ids)).all()
             if course_ids
             else []
         )
-        # Map student_id -> student record
+        # Map student_id -> student record (with its user)
         student_ids = list({e.student_id for e in enrollments})
         students = (
-            Student.query.filter(Student.id.in_(student_ids)).all() if student_ids else []
+            Student.query.options(joinedload(Student.user)).filter(Student.id.in_(student_ids)).all()
+            if student_ids
+            else []
         )
         student_map = {s.id: s for s in students}
+        last_messages, unread = _thread_summaries(user.id, course_ids)
         threads = []
         for e in enrollments:
             st = student_map.get(e.student_id)
             if not st or not st.user:
                 continue
-            course = next((c for c in inst.courses if c.id == e.course_id), None)
+            course = course_map.get(e.course_id)
             if not course:
                 continue
-            last_msg = (
-                Message.query.filter(
-                    Message.course_id == course.id,
-                    or_(
-                        and_(
-                            Message.from_user_id == user.id,
-                            Message.to_user_id == st.user.id,
-                        ),
-                        and_(
-                            Message.from_user_id == st.user.id,
-                            Message.to_user_id == user.id,
-                        ),
-                    ),
-                )
-                .order_by(Message.created_at.desc())
-                .first()
-            )
-            unread = (
-                Message.query.filter(
-                    Message.course_id == course.id,
-                    Message.to_user_id == user.id,
-                    Message.read_at.is_(None),
-                ).count()
-            )
             threads.append(
-                {
-                    "courseId": course.id,
-                    "courseTitle": course.title,
-                    "studentId": st.id,
-                    "studentName": st.user.full_name,
-                    "studentUserId": st.user.id,
-                    "instructorId": inst.id,
-                    "lastMessage": last_msg.content if last_msg else None,
-                    "lastAt": last_msg.created_at.isoformat()
-                    if last_msg and last_msg.created_at
-                    else None,
-                    "unread": unread,
-                }
+                _thread_payload(
+                    course,
+                    (course.id, st.user.id),
+                    last_messages,
+                    unread,
+                    studentId=st.id,
+                    studentName=st.user.full_name,
+                    studentUserId=st.user.id,
+                    instructorId=inst.id,
+                )
             )
         return jsonify(threads)
 
     return jsonify({"error": "Role not supported"}), 403
 
 
-@chat_bp.get("/messages")
-@jwt_required()
-def list_messages():
-    user, role = _current_user()
-    if not user:
-        return jsonify({"error": "Unauthorized"}), 401
+# (user_id, role, course_id, student_id) -> other participant's user id; only granted access is cached
+_ACCESS_CACHE = BoundedCache(
+    "chat.conversation_access", maxsize=4096, ttl=int(os.getenv("CHAT_ACCESS_TTL", "60"))
+)
 
-    course_id = request.args.get("course_id", type=int)
-    student_id = request.args.get("student_id", type=int)
-    since_iso = request.args.get("since")
 
-    if not course_id:
-        return jsonify({"error": "course_id is required"}), 400
+def _check_conversation(user: User, role, course_id, student_id=None):
+    """Access checks of a course conversation.
 
+    Returns ``(other_user_id, None)`` or ``(None, error_response)``.
+    """
     course = Course.query.filter_by(id=course_id).first()
     if not course:
-        return jsonify({"error": "Course not found"}), 404
+        return None, (jsonify({"error": "Course not found"}), 404)
 
     if role == "student":
         student = _student_record(user)
         if not student:
-            return jsonify({"error": "Student profile not found"}), 404
-        student_id = student.id
+            return None, (jsonify({"error": "Student profile not found"}), 404)
         if not _enrollment_for(student.id, course_id):
-            return jsonify({"error": "Not enrolled in this course"}), 403
+            return None, (jsonify({"error": "Not enrolled in this course"}), 403)
         other_user_id = course.instructor.user.id if course.instructor and course.instructor.user else None
     elif role == "instructor":
         inst = _instructor_record(user)
         if not inst or inst.id != course.instructor_id:
-            return jsonify({"error": "Not allowed"}), 403
+            return None, (jsonify({"error": "Not allowed"}), 403)
         if not student_id:
-            return jsonify({"error": "student_id is required"}), 400
+            return None, (jsonify({"error": "student_id is required"}), 400)
         if not _enrollment_for(student_id, course_id):
-            return jsonify({"error": "Student not enrolled in this course"}), 403
+            return None, (jsonify({"error": "Student not enrolled in this course"}), 403)
         student_row = Student.query.filter_by(id=student_id).first()
         other_user_id = student_row.user.id if student_row and student_row.user else None
     else:
-        return jsonify({"error": "Role not supported"}), 403
+        return None, (jsonify({"error": "Role not supported"}), 403)
+    return other_user_id, None
+
+
+def _conversation_peer(user: User, role, course_id, student_id=None, fresh=False):
+    """``_check_conversation`` with the granted decision cached for CHAT_ACCESS_TTL seconds,
+    so paging through a conversation does not repeat the enrollment checks.
+
+    Reads use the cache; writes pass ``fresh=True`` so an unenrolled student or
+    a replaced instructor is refused at once (and the cached grant is dropped).
+    """
+    key = (user.id, role, course_id, student_id if role == "instructor" else None)
+    if not fresh:
+        other_user_id = _ACCESS_CACHE.get(key)
+        if other_user_id is not None:
+            return other_user_id, None
+    other_user_id, error = _check_conversation(user, role, course_id, student_id)
+    if other_user_id is not None:
+        _ACCESS_CACHE.set(key, other_user_id)
+    else:
+        _ACCESS_CACHE.pop(key)
+    return other_user_id, error
 
-    if not other_user_id:
-        return jsonify({"error": "Participant not found"}), 404
 
-    since_dt = None
-    if since_iso:
-        try:
-            since_dt = datetime.fromisoformat(since_iso)
-        except Exception:
-            since_dt = None
+def _parse_since(since_iso):
+    if not since_iso:
+        return None
+    try:
+        return datetime.fromisoformat(since_iso)
+    except Exception:
+        return None
 
+
+MESSAGES_MAX_LIMIT = 200
+
+
+def _encode_message_cursor(msg: Message):
+    raw = json.dumps([msg.created_at.isoformat() if msg.created_at else None, msg.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_message_cursor(cursor):
+    """(created_at, id) of a cursor; raises ValueError when it is malformed."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_iso, message_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    created_at = datetime.fromisoformat(created_iso) if created_iso else None
+    return created_at, int(message_id)
+
+
+def _mark_read(user_id, other_user_id, course_id, newest, payloads):
+    """One bulk UPDATE for the unread messages addressed to ``user_id`` up to ``newest``.
+
+    ``payloads`` are the returned messages, serialized before the commit (which
+    expires the loaded rows); the unread ones get the same readAt.
+    """
+    unread = [p for p in payloads if p["toUserId"] == user_id and p["readAt"] is None]
+    if not unread:
+        return
+    now = datetime.utcnow()
+    Message.query.filter(
+        Message.course_id == course_id,
+        Message.from_user_id == other_user_id,
+        Message.to_user_id == user_id,
+        Message.read_at.is_(None),
+        Message.created_at <= newest,
+    ).update({Message.read_at: now}, synchronize_session=False)
+    db.session.commit()
+    for p in unread:
+        p["readAt"] = now.isoformat()
+
+
+def _conversation_messages(user_id, other_user_id, course_id, since_dt=None, limit=None, before=None):
+    """Serialized messages of the conversation, oldest first; those addressed to ``user_id`` are marked read.
+
+    With ``limit`` only the latest ``limit`` messages (older than the ``before``
+    (created_at, id) cursor, if any) are returned; the second value is the cursor
+    of the next older page, or None.
+    """
     q = Message.query.filter(
         Message.course_id == course_id,
         or_(
-            and_(Message.from_user_id == user.id, Message.to_user_id == other_user_id),
-            and_(Message.from_user_id == other_user_id, Message.to_user_id == user.id),
+            and_(Message.from_user_id == user_id, Message.to_user_id == other_user_id),
+            and_(Message.from_user_id == other_user_id, Message.to_user_id == user_id),
         ),
-    ).order_by(Message.created_at.asc())
+    )
     if since_dt:
         q = q.filter(Message.created_at > since_dt)
 
-    messages = q.all()
+    next_cursor = None
+    if limit:
+        if before:
+            cur_created, cur_id = before
+            q = q.filter(or_(
+                Message.created_at < cur_created,
+                and_(Message.created_at == cur_created, Message.id < cur_id),
+            ))
+        messages = q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        if len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = _encode_message_cursor(messages[-1])
+        messages.reverse()
+    else:
+        messages = q.order_by(Message.created_at.asc(), Message.id.asc()).all()
+
+    payloads = [_serialize_message(m) for m in messages]
+    if messages:
+        _mark_read(user_id, other_user_id, course_id, max(m.created_at for m in messages), payloads)
+    return payloads, next_cursor
 
-    # Mark unread messages addressed to current user as read
-    unread = [
-        m for m in messages if m.to_user_id == user.id and m.read_at is None
-    ]
-    if unread:
-        now = datetime.utcnow()
-        for m in unread:
-            m.read_at = now
+
+# Long-poll (GET /messages?wait=) and SSE (GET /messages/stream) limits, in seconds
+MAX_WAIT_SECONDS = float(os.getenv("CHAT_MAX_WAIT_SECONDS", "30"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("CHAT_STREAM_KEEPALIVE_SECONDS", "15"))
+STREAM_MAX_SECONDS = float(os.getenv("CHAT_STREAM_MAX_SECONDS", "300"))
+
+
+def _seconds_arg(name, upper):
+    value = request.args.get(name, type=float)
+    if value is None:
+        return None
+    return max(0.0, min(value, upper))
+
+
+@chat_bp.get("/messages")
+@jwt_required()
+def list_messages():
+    """Messages of a conversation, oldest first.
+
+    Query params:
+      - limit: only the latest ``limit`` messages (max 200); header X-Next-Cursor
+        then holds the cursor of the next older page (absent on the oldest page)
+      - cursor: X-Next-Cursor of the previous page (keyset on createdAt, id)
+      - since: only messages newer than this ISO datetime
+      - wait: with ``since``, long-poll: park (without a DB connection) until a
+        new message arrives or ``wait`` seconds pass
+    Without limit/cursor the whole history is returned.
+    """
+    user, role = _current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    course_id = request.args.get("course_id", type=int)
+    student_id = request.args.get("student_id", type=int)
+    since_dt = _parse_since(request.args.get("since"))
+    wait = _seconds_arg("wait", MAX_WAIT_SECONDS)
+    limit = request.args.get("limit", type=int)
+    cursor = (request.args.get("cursor") or "").strip()
+
+    if not course_id:
+        return jsonify({"error": "course_id is required"}), 400
+
+    before = None
+    if cursor:
+        try:
+            before = _decode_message_cursor(cursor)
+        except Exception:
+            return jsonify({"error": "Invalid cursor"}), 400
+    if limit or cursor:
+        limit = max(1, min(limit or MESSAGES_MAX_LIMIT, MESSAGES_MAX_LIMIT))
+
+    other_user_id, error = _conversation_peer(user, role, course_id, student_id)
+    if error:
+        return error
+
+    if not other_user_id:
+        return jsonify({"error": "Participant not found"}), 404
+
+    user_id = user.id
+    if not (wait and since_dt):
+        messages, next_cursor = _conversation_messages(
+            user_id, other_user_id, course_id, since_dt, limit=limit, before=before
+        )
+    else:
+        # Subscribe before querying so a message sent in between is not missed
+        with subscribe_conversation(course_id, user_id, other_user_id) as sub:
+            messages, next_cursor = _conversation_messages(
+                user_id, other_user_id, course_id, since_dt, limit=limit, before=before
+            )
+            if not messages:
+                db.session.close()  # give the connection back while parked
+                if sub.get(timeout=wait) is not None:
+                    messages, next_cursor = _conversation_messages(
+                        user_id, other_user_id, course_id, since_dt, limit=limit, before=before
+                    )
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return jsonify(messages), 200, headers
+
+
+def _mark_pushed_read(message_payload, user_id):
+    """Messages pushed to their recipient count as read, like the ones returned by list_messages."""
+    if message_payload.get("toUserId") != user_id or message_payload.get("readAt"):
+        return message_payload
+    now = datetime.utcnow()
+    try:
+        Message.query.filter(Message.id == message_payload["id"], Message.read_at.is_(None)).update(
+            {Message.read_at: now}, synchronize_session=False
+        )
         db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error marking pushed message read: {e}")
+        return message_payload
+    finally:
+        db.session.close()
+    return {**message_payload, "readAt": now.isoformat()}
+
+
+def _stream_conversation(sub, user_id, backlog, max_seconds):
+    """SSE generator: backlog, then pushed messages, keep-alive comments while idle."""
+    try:
+        yield sse_event("ready", {"channel": sub.channel})
+        for payload in backlog:
+            yield sse_event("message", payload)
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = sub.get(timeout=min(STREAM_KEEPALIVE_SECONDS, remaining))
+            if event is None:
+                yield ": keepalive\n\n"
+            elif event.get("type") == "message":
+                yield sse_event("message", _mark_pushed_read(event["message"], user_id))
+    finally:
+        sub.close()
+
+
+@chat_bp.get("/messages/stream")
+@jwt_required()
+def stream_messages():
+    """SSE push channel of a conversation; the access checks run once per connection.
+
+    Events: ``ready``, then ``message`` (same payload as GET /messages) for every
+    message sent after ``since``. The stream ends after ``timeout`` seconds
+    (at most CHAT_STREAM_MAX_SECONDS); EventSource clients reconnect with ``since``.
+    """
+    user, role = _current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    course_id = request.args.get("course_id", type=int)
+    student_id = request.args.get("student_id", type=int)
+    if not course_id:
+        return jsonify({"error": "course_id is required"}), 400
+
+    other_user_id, error = _conversation_peer(user, role, course_id, student_id)
+    if error:
+        return error
+    if not other_user_id:
+        return jsonify({"error": "Participant not found"}), 404
 
-    return jsonify([_serialize_message(m) for m in messages])
+    user_id = user.id
+    since_dt = _parse_since(request.args.get("since"))
+    max_seconds = _seconds_arg("timeout", STREAM_MAX_SECONDS) or STREAM_MAX_SECONDS
+    sub = subscribe_conversation(course_id, user_id, other_user_id)
+    backlog = []
+    if since_dt:
+        backlog, _ = _conversation_messages(user_id, other_user_id, course_id, since_dt)
+    db.session.close()  # idle streams hold no DB connection
+    return sse_response(_stream_conversation(sub, user_id, backlog, max_seconds))
 
 
 @chat_bp.post("/messages")
@@ -287,32 +541,9 @@ def send_message():
     if not content and not attachment_url:
         return jsonify({"error": "content or attachment is required"}), 400
 
-    course = Course.query.filter_by(id=course_id).first()
-    if not course:
-        return jsonify({"error": "Course not found"}), 404
-
-    if role == "student":
-        student = _student_record(user)
-        if not student:
-            return jsonify({"error": "Student profile not found"}), 404
-        if not _enrollment_for(student.id, course_id):
-            return jsonify({"error": "Not enrolled in this course"}), 403
-        receiver_id = (
-            course.instructor.user.id if course.instructor and course.instructor.user else None
-        )
-        student_id = student.id
-    elif role == "instructor":
-        inst = _instructor_record(user)
-        if not inst or inst.id != course.instructor_id:
-            return jsonify({"error": "Not allowed"}), 403
-        if not student_id:
-            return jsonify({"error": "student_id is required"}), 400
-        if not _enrollment_for(student_id, course_id):
-            return jsonify({"error": "Student not enrolled in this course"}), 403
-        student_row = Student.query.filter_by(id=student_id).first()
-        receiver_id = student_row.user.id if student_row and student_row.user else None
-    else:
-        return jsonify({"error": "Role not supported"}), 403
+    receiver_id, error = _conversation_peer(user, role, course_id, student_id, fresh=True)
+    if error:
+        return error
 
     if not receiver_id:
         return jsonify({"error": "Receiver not found"}), 404
@@ -340,7 +571,9 @@ def send_message():
     db.session.add(msg)
     db.session.commit()
 
-    return jsonify(_serialize_message(msg)), 201
+    payload = _serialize_message(msg)
+    publish_message(payload)
+    return jsonify(payload), 201
 
 
 UPLOAD_DIR = Path(__file__).resolve().parents[2] / "uploads" / "chat"
@@ -353,34 +586,25 @@ FILE_EXTS = {"pdf", "docx", "zip", "txt"}
 @chat_bp.post("/upload")
 @jwt_required()
 def upload_attachment():
-    if "file" not in request.files:
-        return jsonify({"error": "No file provided"}), 400
-    f = request.files["file"]
-    if not f.filename:
-        return jsonify({"error": "Empty filename"}), 400
-    ext = f.filename.rsplit(".", 1)[-1].lower()
-    if not (ext in IMAGE_EXTS or ext in FILE_EXTS):
-        return jsonify({"error": "Unsupported file type"}), 400
-    f.seek(0, os.SEEK_END)
-    size = f.tell()
-    f.seek(0)
-    if size > MAX_SIZE:
-        return jsonify({"error": "File too large (max 10MB)"}), 400
-    safe_name = secure_filename(f.filename)
-    filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}_{safe_name}"
-    dest = UPLOAD_DIR / filename
-    f.save(dest)
-    attachment_type = "image" if ext in IMAGE_EXTS else "file"
-    url = f"/api/chat/uploads/{filename}"
+    """Stream the file to disk (multipart ``file`` field or raw body with ``?filename=``),
+    stopping at MAX_SIZE; the stored name is the content hash."""
+    try:
+        stored = receive_upload(
+            UPLOAD_DIR, IMAGE_EXTS | FILE_EXTS, MAX_SIZE, too_large_message="File too large (max 10MB)"
+        )
+    except UploadError as e:
+        return jsonify({"error": e.message}), e.status
+    attachment_type = "image" if stored.extension in IMAGE_EXTS else "file"
+    url = f"/api/chat/uploads/{stored.filename}"
     return jsonify(
         {
             "message_type": attachment_type,
             "content": url,
-            "original_filename": safe_name,
+            "original_filename": stored.original_name,
         }
     )
 
 
 @chat_bp.get("/uploads/<path:filename>")
 def serve_chat_upload(filename):
-    return send_from_directory(UPLOAD_DIR, filename, as_attachment=False)
+    return serve_upload_file(UPLOAD_DIR, filename)
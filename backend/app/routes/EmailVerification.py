@@ -10,16 +10,22 @@ from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
 
+from app.utils.session_store import SessionStore
+
 load_dotenv()
 
 email_verification_bp = Blueprint('email_verification', __name__, url_prefix='/api/auth')
 
-# In-memory storage for OTP codes (in production, use Redis or database)
-# Format: { email: { code: "123456", expires_at: datetime, verified: bool } }
-_OTP_STORAGE = {}
-
 # OTP expiration time (5 minutes)
 OTP_EXPIRATION_MINUTES = 5
+# Expired codes are kept a little longer to answer "expired" instead of "not found"
+OTP_GRACE_SECONDS = 600
+# A verified e-mail has this long to finish registration
+OTP_VERIFIED_TTL_SECONDS = 1800
+
+# OTP codes, shared across workers (app.utils.session_store)
+# Format: { email: { code: "123456", expires_at: ISO datetime, verified: bool, attempts: int } }
+_OTP_STORAGE = SessionStore('email_otp', ttl=OTP_EXPIRATION_MINUTES * 60 + OTP_GRACE_SECONDS)
 
 def generate_otp(length=6):
     """Generate a random 6-digit OTP code"""
@@ -133,12 +139,12 @@ def send_otp():
         expires_at = datetime.utcnow() + timedelta(minutes=OTP_EXPIRATION_MINUTES)
         
         # Store OTP
-        _OTP_STORAGE[email] = {
+        _OTP_STORAGE.set(email, {
             'code': otp_code,
-            'expires_at': expires_at,
+            'expires_at': expires_at.isoformat(),
             'verified': False,
             'attempts': 0
-        }
+        })
         
         # Send email
         try:
@@ -172,25 +178,29 @@ def verify_otp():
             return jsonify({'error': 'Email and code are required'}), 400
         
         # Check if OTP exists
-        if email not in _OTP_STORAGE:
+        otp_data = _OTP_STORAGE.get(email)
+        if otp_data is None:
             return jsonify({'error': 'No OTP found for this email. Please request a new one.'}), 404
         
-        otp_data = _OTP_STORAGE[email]
-        
         # Check expiration
-        if datetime.utcnow() > otp_data['expires_at']:
-            del _OTP_STORAGE[email]
+        expires_at = datetime.fromisoformat(otp_data['expires_at'])
+        if datetime.utcnow() > expires_at:
+            _OTP_STORAGE.delete(email)
             return jsonify({'error': 'OTP code has expired. Please request a new one.'}), 410
         
         # Check attempts (max 5 attempts)
         if otp_data['attempts'] >= 5:
-            del _OTP_STORAGE[email]
+            _OTP_STORAGE.delete(email)
             return jsonify({'error': 'Too many failed attempts. Please request a new code.'}), 429
         
         # Verify code
         if code != otp_data['code']:
             otp_data['attempts'] += 1
             remaining = 5 - otp_data['attempts']
+            _OTP_STORAGE.set(
+                email, otp_data,
+                ttl=(expires_at - datetime.utcnow()).total_seconds() + OTP_GRACE_SECONDS,
+            )
             return jsonify({
                 'error': f'Invalid OTP code. {remaining} attempts remaining.',
                 'remaining': remaining
@@ -198,6 +208,7 @@ def verify_otp():
         
         # Mark as verified
         otp_data['verified'] = True
+        _OTP_STORAGE.set(email, otp_data, ttl=OTP_VERIFIED_TTL_SECONDS)
         
         return jsonify({
             'success': True,
@@ -223,8 +234,8 @@ def resend_otp():
             return jsonify({'error': 'Email is required'}), 400
         
         # Check if there's an existing OTP
-        if email in _OTP_STORAGE:
-            old_otp = _OTP_STORAGE[email]
+        old_otp = _OTP_STORAGE.get(email)
+        if old_otp is not None:
             # Check if already verified
             if old_otp.get('verified'):
                 return jsonify({'error': 'Email already verified'}), 400
@@ -234,12 +245,12 @@ def resend_otp():
         expires_at = datetime.utcnow() + timedelta(minutes=OTP_EXPIRATION_MINUTES)
         
         # Store new OTP
-        _OTP_STORAGE[email] = {
+        _OTP_STORAGE.set(email, {
             'code': otp_code,
-            'expires_at': expires_at,
+            'expires_at': expires_at.isoformat(),
             'verified': False,
             'attempts': 0
-        }
+        })
         
         # Send email
         try:
@@ -261,14 +272,14 @@ def resend_otp():
 def is_email_verified(email):
     """Check if email has been verified"""
     email = email.strip().lower()
-    if email not in _OTP_STORAGE:
+    otp_data = _OTP_STORAGE.get(email)
+    if otp_data is None:
         return False
-    return _OTP_STORAGE[email].get('verified', False)
+    return otp_data.get('verified', False)
 
 def clear_otp(email):
     """Clear OTP data after successful registration"""
     email = email.strip().lower()
-    if email in _OTP_STORAGE:
-        del _OTP_STORAGE[email]
+    _OTP_STORAGE.delete(email)
 
 __all__ = ['email_verification_bp', 'is_email_verified', 'clear_otp']
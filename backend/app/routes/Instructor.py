@@ -1,8 +1,21 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from datetime import datetime
 # Import db và các Models cần thiết
-from ..models.model import db, Course, Instructor, CourseSection, Lesson, Test, Question, Choice, Enrollment, User
+from ..models.model import db, Course, Instructor, CourseSection, Lesson, Test, Question, Choice, Enrollment, User, Answer
+from ..services.course_outline import invalidate_course_outline, course_id_for
+from ..services.grading import delete_test_attempts, invalidate_answer_key
+from ..services.course_sync import on_course_saved, on_course_deleted
+from ..services.video_uploads import (
+    UploadSession,
+    append_chunk,
+    create_session,
+    discard_session,
+    push_session,
+    retry_push,
+    start_push,
+)
+from ..utils.uploads import UploadError
 import re
 import os
 
@@ -164,6 +177,7 @@ def create_course():
         )
         db.session.add(new_course)
         db.session.commit()
+        on_course_saved(new_course)
         return jsonify({
             "message": "Khóa học đã được tạo thành công",
             "id": new_course.id,
@@ -253,6 +267,8 @@ def update_course(course_id):
             course.image_url = data.get('image_url') or data.get('thumbnail')
         course.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_course_outline(course.id)
+        on_course_saved(course)
         return jsonify({
             "message": "Khóa học đã được cập nhật thành công",
             "id": course.id,
@@ -286,6 +302,8 @@ def delete_course(course_id):
             return jsonify({"message": "Không thể xóa khóa học có học viên đang tham gia"}), 400
         db.session.delete(course)
         db.session.commit()
+        invalidate_course_outline(course_id)
+        on_course_deleted(course_id)
         return jsonify({"message": "Khóa học đã được xóa thành công"}), 200
     except Exception as e:
         db.session.rollback()
@@ -318,6 +336,8 @@ def archive_course(course_id):
             course.is_public = not data['is_archived']
         course.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_course_outline(course.id)
+        on_course_saved(course)
         status = 'active' if course.is_public else 'archived'
         return jsonify({
             "message": "Trạng thái khóa học đã được cập nhật",
@@ -421,6 +441,7 @@ def create_section(course_id):
         section = CourseSection(course_id=course_id, title=title, sort_order=sort_order)
         db.session.add(section)
         db.session.commit()
+        invalidate_course_outline(course_id)
         return jsonify(_serialize_section(section)), 201
     except Exception as e:
         db.session.rollback()
@@ -442,6 +463,7 @@ def update_section(section_id):
         if 'sort_order' in data and data['sort_order'] is not None:
             section.sort_order = int(data['sort_order'])
         db.session.commit()
+        invalidate_course_outline(section.course_id)
         return jsonify(_serialize_section(section)), 200
     except Exception as e:
         db.session.rollback()
@@ -459,8 +481,10 @@ def delete_section(section_id):
             return jsonify({"message": "Chương không tồn tại"}), 404
         # Xóa lessons trước để tránh lỗi FK nếu DB không cascade
         Lesson.query.filter_by(section_id=section.id).delete()
+        outline_course_id = section.course_id
         db.session.delete(section)
         db.session.commit()
+        invalidate_course_outline(outline_course_id)
         return jsonify({"message": "Đã xóa chương"}), 200
     except Exception as e:
         db.session.rollback()
@@ -523,6 +547,7 @@ def create_lesson(section_id):
         )
         db.session.add(lesson)
         db.session.commit()
+        invalidate_course_outline(section.course_id)
         return jsonify({
             "id": lesson.id,
             "sectionId": lesson.section_id,
@@ -567,6 +592,7 @@ def update_lesson(lesson_id):
             lesson.is_preview = bool(data.get('is_preview') or data.get('isPreview'))
         lesson.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_course_outline(course_id_for(lesson))
         return jsonify({
             "id": lesson.id,
             "sectionId": lesson.section_id,
@@ -608,15 +634,15 @@ def delete_lesson(lesson_id):
                 return jsonify({"message": "Unauthorized: Lesson does not belong to you"}), 403
         
         # Import models cần thiết
-        from ..models.model import LessonProgress, TestAttempt
+        from ..models.model import LessonProgress
         
         # Delete all related data first to avoid foreign key constraint errors
         
-        # 1. Delete all test attempts related to tests in this lesson
+        # 1. Delete all test attempts (and their answers) related to tests in this lesson
         tests = Test.query.filter_by(lesson_id=lesson_id).all()
+        test_ids = [test.id for test in tests]
+        delete_test_attempts(test_ids)
         for test in tests:
-            # Delete test attempts
-            TestAttempt.query.filter_by(test_id=test.id).delete()
             # Delete choices for all questions in this test
             questions = Question.query.filter_by(test_id=test.id).all()
             for question in questions:
@@ -631,8 +657,12 @@ def delete_lesson(lesson_id):
         LessonProgress.query.filter_by(lesson_id=lesson_id).delete()
         
         # 4. Finally delete the lesson itself
+        outline_course_id = course_id_for(lesson)
         db.session.delete(lesson)
         db.session.commit()
+        invalidate_course_outline(outline_course_id)
+        for test_id in test_ids:
+            invalidate_answer_key(test_id)
         
         return jsonify({"message": "Đã xóa bài học"}), 200
     except Exception as e:
@@ -740,6 +770,7 @@ def create_test(lesson_id):
         )
         db.session.add(test)
         db.session.commit()
+        invalidate_course_outline(course_id_for(lesson))
         return jsonify(_serialize_test(test)), 201
     except Exception as e:
         db.session.rollback()
@@ -779,6 +810,7 @@ def update_test(test_id):
             t.attempts_allowed = data.get('attempts_allowed') or data.get('attemptsAllowed') or 1
         t.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_course_outline(course_id_for(t))
         return jsonify(_serialize_test(t)), 200
     except Exception as e:
         db.session.rollback()
@@ -808,13 +840,10 @@ def delete_test(test_id):
                 if not course:
                     return jsonify({"message": "Unauthorized: Test does not belong to you"}), 403
         
-        # Import TestAttempt if not already imported
-        from ..models.model import TestAttempt
-        
         # Delete all related data first to avoid foreign key constraint errors
         
-        # 1. Delete all test attempts for this test
-        TestAttempt.query.filter_by(test_id=t.id).delete()
+        # 1. Delete all test attempts (and their answers) for this test
+        delete_test_attempts([t.id])
         
         # 2. Delete choices and questions
         questions = Question.query.filter_by(test_id=t.id).all()
@@ -823,8 +852,11 @@ def delete_test(test_id):
         Question.query.filter_by(test_id=t.id).delete()
         
         # 3. Finally delete the test itself
+        outline_course_id = course_id_for(t)
         db.session.delete(t)
         db.session.commit()
+        invalidate_course_outline(outline_course_id)
+        invalidate_answer_key(test_id)
         return jsonify({"message": "Đã xóa bài test"}), 200
     except Exception as e:
         db.session.rollback()
@@ -878,6 +910,8 @@ def create_question(test_id):
                 )
                 db.session.add(ch)
         db.session.commit()
+        invalidate_course_outline(course_id_for(t))
+        invalidate_answer_key(test_id)
         return jsonify(_serialize_question(question)), 201
     except Exception as e:
         db.session.rollback()
@@ -904,6 +938,8 @@ def update_question(question_id):
             q.sort_order = data.get('sort_order') or data.get('sortOrder')
         # Optional: replace all choices if provided
         if 'choices' in data and isinstance(data['choices'], list):
+            # Bài đã nộp giữ điểm, chỉ bỏ tham chiếu tới các lựa chọn cũ (FK Answers.ChoiceId)
+            Answer.query.filter_by(question_id=q.id).update({Answer.choice_id: None}, synchronize_session=False)
             Choice.query.filter_by(question_id=q.id).delete()
             for idx, c in enumerate(data['choices']):
                 choice_text = c.get('text', '').strip() or c.get('content', '').strip()
@@ -916,6 +952,8 @@ def update_question(question_id):
                     )
                     db.session.add(ch)
         db.session.commit()
+        invalidate_course_outline(course_id_for(q))
+        invalidate_answer_key(q.test_id)
         return jsonify(_serialize_question(q)), 200
     except Exception as e:
         db.session.rollback()
@@ -931,9 +969,14 @@ def delete_question(question_id):
         q = Question.query.filter_by(id=question_id).first()
         if not q:
             return jsonify({"message": "Câu hỏi không tồn tại"}), 404
+        Answer.query.filter_by(question_id=q.id).delete()
         Choice.query.filter_by(question_id=q.id).delete()
+        outline_course_id = course_id_for(q)
+        test_id = q.test_id
         db.session.delete(q)
         db.session.commit()
+        invalidate_course_outline(outline_course_id)
+        invalidate_answer_key(test_id)
         return jsonify({"message": "Đã xóa câu hỏi"}), 200
     except Exception as e:
         db.session.rollback()
@@ -1415,7 +1458,7 @@ def get_course(course_id):
 
 
 # Đã có hàm create_course ở trên (dòng 63) với đầy đủ validation
-# ========== New: Google Drive upload ==========
+# ========== Video upload (Cloudinary) ==========
 @instructor_bp.route('/api/upload/video', methods=['POST'])
 def upload_video_to_cloudinary():
     """
@@ -1423,8 +1466,23 @@ def upload_video_to_cloudinary():
     Form-Data:
       - file: binary file
     Response: { publicId, url }
+    The file is spooled to disk and pushed in chunks with retries
+    (app.services.video_uploads). With ?async=1 (needs a JWT) the push runs in
+    the background: 202 + the job status, readable by the same user at
+    GET /api/upload/video/sessions/<upload_id>.
+
+    Without ?async=1 the push stays synchronous on purpose: it is a
+    compatibility shim for the current lesson editor, which posts here without
+    a token and reads `url` from the response. It holds the worker for the
+    whole push, so large files should use ?async=1 or the resumable sessions below.
     """
     from flask import request, jsonify
+    session = None
+    run_async = request.args.get('async') in ('1', 'true')
+    verify_jwt_in_request(optional=True)
+    owner_id = get_jwt_identity()
+    if run_async and not owner_id:
+        return jsonify({'message': 'Unauthorized'}), 401
     try:
         if 'file' not in request.files:
             return jsonify({'message': 'Missing file field'}), 400
@@ -1432,16 +1490,118 @@ def upload_video_to_cloudinary():
         if f.filename == '':
             return jsonify({'message': 'Empty filename'}), 400
 
-        from app.utils.cloudinary_upload import upload_video
-        public_id, secure_url = upload_video(f.stream, f.filename)
-
-        return jsonify({'publicId': public_id, 'url': secure_url}), 200
+        f.stream.seek(0, os.SEEK_END)
+        size = f.stream.tell()
+        f.stream.seek(0)
+        session = create_session(f.filename, size, owner_id=owner_id)
+        append_chunk(session.id, 0, f.stream)
+        if run_async:
+            start_push(session.id)
+            return jsonify(UploadSession.load(session.id).to_status()), 202
+
+        # Đồng bộ (tương thích client cũ): không ai retry được session này, nên luôn dọn spool
+        session = push_session(session.id)
+        discard_session(session.id)
+        if session.status != 'done':
+            return jsonify({'message': f'Upload failed: {session.error}'}), 500
+        return jsonify({'publicId': session.public_id, 'url': session.url}), 200
+    except UploadError as e:
+        if session is not None:
+            discard_session(session.id)
+        return jsonify({'message': e.message}), e.status
     except Exception as e:
         import traceback
         print(f"❌ Cloudinary upload error: {e}\n{traceback.format_exc()}")
+        if session is not None and not run_async:
+            discard_session(session.id)
         return jsonify({'message': f'Upload failed: {str(e)}'}), 500
 
 
+def _upload_offset():
+    """Offset of a PUT part: ``Content-Range: bytes <start>-<end>/<total>`` or ``?offset=``."""
+    content_range = request.headers.get('Content-Range') or ''
+    match = re.match(r'^bytes (\d+)-\d+/(\d+|\*)$', content_range.strip())
+    if match:
+        return int(match.group(1))
+    return request.args.get('offset', type=int)
+
+
+def _owned_upload_session(upload_id):
+    session = UploadSession.load(upload_id)
+    if session is None or str(session.owner_id) != str(get_jwt_identity()):
+        return None
+    return session
+
+
+@instructor_bp.route('/api/upload/video/sessions', methods=['POST'])
+@jwt_required()
+def create_video_upload_session():
+    """
+    Start a resumable video upload.
+    Body: { filename, size }
+    Response 201: job status + upload_url. Send the bytes in order with
+    PUT upload_url (Content-Range or ?offset=); after a dropped connection,
+    GET the status and continue from `received`.
+    """
+    try:
+        data = request.get_json() or {}
+        session = create_session(data.get('filename'), data.get('size'), owner_id=get_jwt_identity())
+    except UploadError as e:
+        return jsonify({'message': e.message}), e.status
+    return jsonify({
+        **session.to_status(),
+        'upload_url': f'/api/upload/video/sessions/{session.id}',
+    }), 201
+
+
+@instructor_bp.route('/api/upload/video/sessions/<upload_id>', methods=['PUT'])
+@jwt_required()
+def put_video_upload_part(upload_id):
+    """Append one part; 200 while receiving, 202 once complete (push queued), 409 + `received` on a wrong offset."""
+    if _owned_upload_session(upload_id) is None:
+        return jsonify({'message': 'Upload session not found'}), 404
+    offset = _upload_offset()
+    if offset is None:
+        return jsonify({'message': 'Content-Range or offset is required'}), 400
+    try:
+        session = append_chunk(upload_id, offset, request.stream)
+    except UploadError as e:
+        current = UploadSession.load(upload_id)
+        return jsonify({'message': e.message, **(current.to_status() if current else {})}), e.status
+    except Exception as e:
+        print(f"❌ Video part upload error: {e}")
+        current = UploadSession.load(upload_id)
+        return jsonify({'message': 'Upload interrupted', **(current.to_status() if current else {})}), 500
+
+    if session.status == 'queued':
+        start_push(upload_id)
+        return jsonify(session.to_status()), 202
+    return jsonify(session.to_status()), 200
+
+
+@instructor_bp.route('/api/upload/video/sessions/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_video_upload_session(upload_id):
+    """Job status: receiving -> queued -> uploading -> done | failed, with received/pushed bytes and progress."""
+    session = _owned_upload_session(upload_id)
+    if session is None:
+        return jsonify({'message': 'Upload session not found'}), 404
+    return jsonify(session.to_status()), 200
+
+
+@instructor_bp.route('/api/upload/video/sessions/<upload_id>/retry', methods=['POST'])
+@jwt_required()
+def retry_video_upload_session(upload_id):
+    """Resume a failed push from the last part Cloudinary accepted."""
+    session = _owned_upload_session(upload_id)
+    if session is None:
+        return jsonify({'message': 'Upload session not found'}), 404
+    if session.status != 'failed':
+        return jsonify({'message': f'Upload is {session.status}', **session.to_status()}), 409
+    session = retry_push(upload_id)
+    return jsonify(session.to_status()), 202
+
+
 @instructor_bp.route('/upload/thumbnail', methods=['POST'])
 @instructor_bp.route('/api/instructor/upload/thumbnail', methods=['POST'])
 @jwt_required()
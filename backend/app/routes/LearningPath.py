@@ -1,19 +1,27 @@
 from flask import Blueprint, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
 
-from app.models import LearningPath, LearningPathItem, SkillProfile
-from app.models.model import Course
-from app.services.ai_learning_path import generate_week_description
+from app.models import db, SkillProfile
+from app.services.learning_path_timeline import (
+    build_timeline,
+    create_learning_path,
+    latest_path_items,
+    lookup_courses,
+    unresolved_course_ids,
+)
 
 learning_path_bp = Blueprint("learning_path", __name__, url_prefix="/api/learning-path")
 
 
-@learning_path_bp.get("/<int:user_id>")
-def get_learning_path(user_id):
-    profile = (
+def _latest_profile(user_id):
+    return (
         SkillProfile.query.filter_by(user_id=user_id)
         .order_by(SkillProfile.created_at.desc())
         .first()
     )
+
+
+def _profile_payload(profile, course_lookup):
     skill_profile_payload = {
         "level": "pending",
         "strengths": [],
@@ -21,66 +29,64 @@ def get_learning_path(user_id):
         "recommended_courses": [],
         "language": "general",
     }
-    course_ids = []
     if profile:
         skill_profile_payload["level"] = profile.level
         skill_profile_payload["strengths"] = profile.strengths or []
         skill_profile_payload["weaknesses"] = profile.weaknesses or []
         skill_profile_payload["language"] = profile.language or "general"
-        course_ids = profile.recommended_course_ids or []
-    course_lookup = {}
-    if course_ids:
-        courses = Course.query.filter(Course.id.in_(course_ids)).all()
-        course_lookup = {c.id: c for c in courses}
-        ordered_courses = []
-        for cid in course_ids:
-            course = course_lookup.get(cid)
-            if course:
-                ordered_courses.append(
-                    {
-                        "id": course.id,
-                        "title": course.title,
-                        "slug": course.slug,
-                        "level": course.level,
-                        "language": course.language,
-                    }
-                )
-        skill_profile_payload["recommended_courses"] = ordered_courses
+        skill_profile_payload["recommended_courses"] = [
+            course_lookup[cid] for cid in profile.recommended_course_ids or [] if cid in course_lookup
+        ]
+    return skill_profile_payload
 
-    path = (
-        LearningPath.query.filter_by(user_id=user_id)
-        .order_by(LearningPath.created_at.desc())
-        .first()
-    )
-    timeline = []
-    if path:
-        items = (
-            LearningPathItem.query.filter_by(learning_path_id=path.id)
-            .order_by(LearningPathItem.week_number)
-            .all()
-        )
-        for idx, item in enumerate(items, start=1):
-            course_ids_for_week = item.course_ids or []
-            courses_for_week = []
-            for weekly_course_id in course_ids_for_week:
-                course = course_lookup.get(weekly_course_id)
-                if course:
-                    courses_for_week.append({"title": course.title, "slug": course.slug})
-            description = generate_week_description(
-                level=skill_profile_payload["level"] or "beginner",
-                strengths=skill_profile_payload["strengths"] or [],
-                weaknesses=skill_profile_payload["weaknesses"] or [],
-                week_index=idx,
-            )
-            timeline.append(
-                {
-                    "week": item.week_number,
-                    "title": item.title,
-                    "description": description,
-                    "strengths": skill_profile_payload["strengths"] or [],
-                    "weaknesses": skill_profile_payload["weaknesses"] or [],
-                    "course_ids": course_ids_for_week,
-                }
-            )
 
+@learning_path_bp.get("/<int:user_id>")
+def get_learning_path(user_id):
+    """Skill profile + the timeline materialized when the latest path was created.
+
+    Queries: latest profile, items of the latest path, one batched course lookup.
+    """
+    profile = _latest_profile(user_id)
+    items = latest_path_items(user_id)
+    course_ids = set(profile.recommended_course_ids or []) if profile else set()
+    course_lookup = lookup_courses(course_ids | unresolved_course_ids(items))
+
+    skill_profile_payload = _profile_payload(profile, course_lookup)
+    timeline = build_timeline(
+        items,
+        course_lookup,
+        level=skill_profile_payload["level"] or "beginner",
+        strengths=skill_profile_payload["strengths"],
+        weaknesses=skill_profile_payload["weaknesses"],
+    )
     return jsonify({"skill_profile": skill_profile_payload, "timeline": timeline})
+
+
+@learning_path_bp.post("/<int:user_id>")
+@jwt_required()
+def create_path(user_id):
+    """(Re)generate the learning path from the latest skill profile; week descriptions
+    and course titles are computed here once and stored with the items.
+    Only the user themself or an admin may do this."""
+    if str(get_jwt_identity()) != str(user_id) and get_jwt().get("role") != "admin":
+        return jsonify({"error": "Forbidden"}), 403
+    profile = _latest_profile(user_id)
+    if not profile:
+        return jsonify({"error": "Chưa có skill profile cho người dùng này."}), 404
+    try:
+        path = create_learning_path(profile)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating learning path: {e}")
+        return jsonify({"error": "Không tạo được lộ trình học."}), 500
+
+    items = sorted(path.items, key=lambda item: item.week_number)
+    timeline = build_timeline(
+        items,
+        {},
+        level=profile.level or "beginner",
+        strengths=profile.strengths or [],
+        weaknesses=profile.weaknesses or [],
+    )
+    return jsonify({"learning_path_id": path.id, "timeline": timeline}), 201
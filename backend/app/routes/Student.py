@@ -4,56 +4,69 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_j
 from datetime import datetime
 from app.models import db, Course, Enrollment, StudyPlan, PlanItem, Student
 from app.models.model import User, LessonProgress, Instructor, Category, Topic
+from sqlalchemy.orm import joinedload, selectinload, defer
 from app.services.recommender import semantic_recommend, recommend_courses  # new import
+from app.services.course_outline import get_course_outline, build_student_outline
+from app.services import llm_client
+from app.services.course_context import get_course_context
+from app.services.ai_streaming import (
+    wants_stream, sse_event, sse_response, stream_text, parse_reply_json, ReplyStreamParser,
+)
+from app.services.grading import (
+    get_answer_key, grade_submission, record_attempt, AttemptLimitReached, get_student_test_metrics,
+)
+from app.utils.session_store import SessionStore
 from app.utils.cloudinary_upload import upload_video  # placeholder import if using cloudinary for images too
 import traceback
 import os, uuid, time, logging
+import base64
 import json
-try:
-    import google.generativeai as genai  # type: ignore
-except Exception:
-    genai = None
-
-_AI_CHAT_SESSIONS = {}  # (user_id, session_id) -> {history:[{"role":"user"|"assistant","text":...}], created_at}
 _GEMINI_MODEL_NAME = os.getenv('GEMINI_RECO_MODEL', 'gemini-2.5-flash')
 _SESSION_TIMEOUT = 3600  # 1 hour in seconds
+# (user_id, session_id) -> {history:[{"role":"user"|"assistant","text":...}], created_at}; shared across workers
+_AI_CHAT_SESSIONS = SessionStore('ai_chat', ttl=_SESSION_TIMEOUT)
+# user_id -> [[session_id, created_at], ...] oldest first; bounds the sessions of one user
+_AI_CHAT_USER_SESSIONS = SessionStore('ai_chat_user', ttl=_SESSION_TIMEOUT)
+_MAX_SESSIONS_PER_USER = int(os.getenv('AI_CHAT_MAX_SESSIONS_PER_USER', '5'))
+_MAX_HISTORY_MESSAGES = int(os.getenv('AI_CHAT_MAX_HISTORY', '40'))
 
-def _configure_client():
-    """Configure Gemini client similar to AIQuiz flow."""
-    from dotenv import load_dotenv
-    load_dotenv()
-    if genai is None:
-        return False
-    api_key = (
-        os.getenv("GEMINI_API_KEY")
-        or os.getenv("GOOGLE_API_KEY")
-        or os.getenv("GOOGLE_GEMINI_KEY")
-    )
-    if not api_key:
-        return False
-    try:
-        genai.configure(api_key=api_key)
-        return True
-    except Exception:
-        return False
-
-def _serialize_courses(limit=40):
-    # Provide condensed course info for AI context
-    rows = Course.query.order_by(Course.created_at.desc()).limit(limit).all()
-    payload = []
-    for c in rows:
-        cats = [cat.name for cat in getattr(c,'categories',[]) if getattr(cat,'name',None)]
-        tops = [t.name for t in getattr(c,'topics',[]) if getattr(t,'name',None)]
-        payload.append({
-            'id': c.id,
-            'title': c.title,
-            'level': c.level,
-            'price': float(c.price) if c.price else 0,
-            'categories': cats,
-            'topics': tops,
-            'description': (c.description or '')[:400]
-        })
-    return payload
+
+def _save_chat_session(session_key, sess):
+    """Write a chat session back; it still expires _SESSION_TIMEOUT after it was created."""
+    remaining = _SESSION_TIMEOUT - (time.time() - sess.get('created_at', 0))
+    _AI_CHAT_SESSIONS.set(session_key, sess, ttl=remaining)
+
+
+def _append_history(sess, role, text):
+    """Append a chat turn, keeping only the last _MAX_HISTORY_MESSAGES turns."""
+    history = sess['history']
+    history.append({'role': role, 'text': text})
+    if len(history) > _MAX_HISTORY_MESSAGES:
+        del history[:len(history) - _MAX_HISTORY_MESSAGES]
+
+
+def _register_chat_session(user_id, session_id, created_at):
+    """Add a session to the user's index; the oldest ones beyond the cap are dropped.
+
+    Work is bounded by _MAX_SESSIONS_PER_USER, not by the number of live sessions.
+    """
+    threshold = created_at - _SESSION_TIMEOUT
+    entries = [e for e in _AI_CHAT_USER_SESSIONS.get(user_id, []) if e[1] > threshold]
+    entries.append([session_id, created_at])
+    while len(entries) > _MAX_SESSIONS_PER_USER:
+        old_id, _ = entries.pop(0)
+        _AI_CHAT_SESSIONS.delete((user_id, old_id))
+    _AI_CHAT_USER_SESSIONS.set(user_id, entries)
+
+
+def _unregister_chat_session(user_id, session_id):
+    entries = _AI_CHAT_USER_SESSIONS.get(user_id)
+    if entries:
+        remaining = [e for e in entries if e[0] != session_id]
+        if remaining:
+            _AI_CHAT_USER_SESSIONS.set(user_id, remaining, ttl=remaining[-1][1] + _SESSION_TIMEOUT - time.time())
+        else:
+            _AI_CHAT_USER_SESSIONS.delete(user_id)
 
 def _build_system_instruction():
     return (
@@ -63,9 +76,8 @@ def _build_system_instruction():
         "If the user writes Vietnamese, respond in Vietnamese; otherwise match their language."
     )
 
-def _build_course_system_instruction(course_context):
-    """Build system instruction for course recommendation with course catalog."""
-    courses_json = json.dumps(course_context, ensure_ascii=False, indent=2)
+def _build_course_system_instruction(courses_json):
+    """Build system instruction for course recommendation with course catalog (prebuilt JSON string)."""
     return (
         "You are CourseAI, a friendly bilingual course recommendation assistant (Vietnamese and English).\n"
         "Help users find the best courses based on their goals, interests, skill level, and preferences.\n\n"
@@ -93,57 +105,31 @@ def _build_course_system_instruction(course_context):
         "If the user writes Vietnamese, respond in Vietnamese; otherwise match their language."
     )
 
-def _ai_generate_reply(history, course_context=None):
-    ready = _configure_client()
-    if not ready:
+def _build_reply_prompt(history, courses_json=None):
+    # Build system instruction based on whether we have course context
+    if courses_json:
+        sys = _build_course_system_instruction(courses_json)
+    else:
+        sys = _build_system_instruction()
+    convo = "\n".join(
+        ("User: " + m['text']) if m['role'] == 'user' else ("Assistant: " + m['text'])
+        for m in history
+    )
+    return (
+        f"{sys}\n\n"
+        f"Conversation so far:\n{convo}\n\n"
+        "Respond to the latest user message with a helpful answer."
+    )
+
+def _ai_generate_reply(history, courses_json=None):
+    if not llm_client.available():
         return { 'text': 'AI is unavailable, please try again later.' }
     try:
-        # Build system instruction based on whether we have course context
-        if course_context:
-            sys = _build_course_system_instruction(course_context)
-        else:
-            sys = _build_system_instruction()
-            
-        convo = "\n".join(
-            ("User: " + m['text']) if m['role'] == 'user' else ("Assistant: " + m['text'])
-            for m in history
-        )
-        prompt = (
-            f"{sys}\n\n"
-            f"Conversation so far:\n{convo}\n\n"
-            "Respond to the latest user message with a helpful answer."
-        )
-        msgs = [{ 'role': 'user', 'parts': [prompt] }]
-        model = genai.GenerativeModel(_GEMINI_MODEL_NAME)
-        resp = model.generate_content(msgs)
-        text = getattr(resp, 'text', None)
-        if not text:
-            parts = []
-            for cand in getattr(resp, 'candidates', []):
-                content = getattr(cand, 'content', None)
-                for part in getattr(content, 'parts', []) or []:
-                    if hasattr(part, 'text') and part.text:
-                        parts.append(part.text)
-            text = " ".join(parts)
-        
+        prompt = _build_reply_prompt(history, courses_json)
+        text = llm_client.generate_text(prompt, _GEMINI_MODEL_NAME)
+
         # Parse JSON recommendations if present
-        result = { 'text': (text or '').strip(), 'courses': [], 'follow_up': None }
-        if text and '```json' in text:
-            try:
-                # Extract JSON block
-                json_start = text.find('```json') + 7
-                json_end = text.find('```', json_start)
-                if json_end > json_start:
-                    json_str = text[json_start:json_end].strip()
-                    json_data = json.loads(json_str)
-                    result['courses'] = json_data.get('courses', [])
-                    result['follow_up'] = json_data.get('follow_up')
-                    # Clean the JSON block from the text
-                    result['text'] = text[:text.find('```json')].strip()
-            except Exception as e:
-                print(f'JSON parse error: {e}')
-                
-        return result
+        return parse_reply_json(text)
     except Exception as e:
         print('Gemini error:', e)
         traceback.print_exc()
@@ -180,20 +166,93 @@ def _get_role_from_jwt():
 def ping():
     return {'module': 'student', 'ok': True}
 
+_CATALOG_FIELDS = (
+    'id', 'instructorId', 'instructorName', 'title', 'slug', 'description', 'level',
+    'price', 'currency', 'isPublic', 'image', 'thumbnail', 'categories', 'topics',
+    'createdAt', 'updatedAt',
+)
+_CATALOG_MAX_LIMIT = 200
+
+
+def _encode_catalog_cursor(course):
+    raw = json.dumps([course.created_at.isoformat() if course.created_at else None, course.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_catalog_cursor(cursor):
+    """Trả về (created_at, id) từ cursor; raise ValueError nếu cursor không hợp lệ."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_iso, course_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    created_at = datetime.fromisoformat(created_iso) if created_iso else None
+    return created_at, int(course_id)
+
+
+def _parse_catalog_fields(raw):
+    if not raw:
+        return _CATALOG_FIELDS
+    wanted = {f.strip() for f in raw.split(',') if f.strip()}
+    # 'id' luôn có để client có thể dùng làm key
+    return tuple(f for f in _CATALOG_FIELDS if f in wanted or f == 'id')
+
+
+def _serialize_catalog_course(c, fields):
+    item = {}
+    for f in fields:
+        if f == 'id':
+            item['id'] = c.id
+        elif f == 'instructorId':
+            item['instructorId'] = c.instructor_id
+        elif f == 'instructorName':
+            ins_user = c.instructor.user if c.instructor else None
+            item['instructorName'] = ins_user.full_name if ins_user else None
+        elif f == 'title':
+            item['title'] = c.title
+        elif f == 'slug':
+            item['slug'] = c.slug
+        elif f == 'description':
+            item['description'] = c.description
+        elif f == 'level':
+            item['level'] = c.level
+        elif f == 'price':
+            item['price'] = float(c.price) if c.price is not None else 0
+        elif f == 'currency':
+            item['currency'] = c.currency
+        elif f == 'isPublic':
+            item['isPublic'] = bool(c.is_public)
+        elif f in ('image', 'thumbnail'):
+            item[f] = None
+        elif f == 'categories':
+            item['categories'] = [cat.name for cat in c.categories if cat.name]
+        elif f == 'topics':
+            item['topics'] = [top.name for top in c.topics if top.name]
+        elif f == 'createdAt':
+            item['createdAt'] = c.created_at.isoformat() if c.created_at else None
+        elif f == 'updatedAt':
+            item['updatedAt'] = c.updated_at.isoformat() if c.updated_at else None
+    return item
+
+
 #  Lấy danh sách TẤT CẢ khóa học trong database (không lọc theo student)
 @student_bp.route('/courses', methods=['GET'])
 def get_all_courses():
     """
-    Trả về TẤT CẢ khóa học có trong database, hỗ trợ filter theo level, category, topic qua query params.
+    Trả về khóa học có trong database, hỗ trợ filter theo level, category, topic qua query params.
     Query params:
       - level: 'beginner' | 'intermediate' | 'advanced'
       - category: category name hoặc slug
       - topic: topic name hoặc slug
+      - limit: số khóa học mỗi trang (tối đa 200). Không truyền limit/cursor => trả về toàn bộ
+      - cursor: giá trị nextCursor của trang trước (keyset theo createdAt, id giảm dần)
+      - fields: danh sách field cách nhau bởi dấu phẩy, ví dụ fields=id,title,price
+    Header X-Total-Count chứa tổng số khóa học khớp filter.
     """
     try:
         level = (request.args.get('level') or '').strip().lower()
         category_q = (request.args.get('category') or '').strip().lower()
         topic_q = (request.args.get('topic') or '').strip().lower()
+        cursor = (request.args.get('cursor') or '').strip()
+        limit = request.args.get('limit', type=int)
+        fields = _parse_catalog_fields(request.args.get('fields'))
 
         q = Course.query
         # Filter by level
@@ -201,48 +260,57 @@ def get_all_courses():
             q = q.filter(db.func.lower(Course.level) == level)
         # Filter by category name/slug
         if category_q:
-            q = q.join(Course.categories).filter(
+            q = q.filter(Course.categories.any(
                 db.or_(db.func.lower(Category.name) == category_q, db.func.lower(Category.slug) == category_q)
-            )
+            ))
         # Filter by topic name/slug
         if topic_q:
-            q = q.join(Course.topics).filter(
+            q = q.filter(Course.topics.any(
                 db.or_(db.func.lower(Topic.name) == topic_q, db.func.lower(Topic.slug) == topic_q)
-            )
-        # Deduplicate if multiple joins
-        q = q.distinct()
-
-        courses = q.all()
-        data = []
-        for c in courses:
-            instructor_name = None
-            if c.instructor_id:
+            ))
+
+        # Count trên query đã filter, không kèm eager-load/order
+        total = q.with_entities(db.func.count(Course.id)).scalar() or 0
+
+        # Eager-load instructor/user and categories/topics so the catalog costs a
+        # fixed number of queries (courses + batched IN lookups) regardless of size.
+        # Chỉ load những quan hệ / cột mà fields yêu cầu.
+        options = []
+        if 'instructorName' in fields:
+            options.append(joinedload(Course.instructor).joinedload(Instructor.user))
+        if 'categories' in fields:
+            options.append(selectinload(Course.categories))
+        if 'topics' in fields:
+            options.append(selectinload(Course.topics))
+        if 'description' not in fields:
+            options.append(defer(Course.description))
+        q = q.options(*options)
+
+        paginate = bool(limit or cursor)
+        if paginate:
+            if cursor:
                 try:
-                    ins = Instructor.query.get(c.instructor_id)
-                    instructor_name = getattr(ins, 'user', None).full_name if getattr(ins, 'user', None) else None
+                    cur_created, cur_id = _decode_catalog_cursor(cursor)
                 except Exception:
-                    instructor_name = None
-            categories = [cat.name for cat in getattr(c, 'categories', []) if getattr(cat, 'name', None)]
-            topics = [top.name for top in getattr(c, 'topics', []) if getattr(top, 'name', None)]
-            data.append({
-                'id': c.id,
-                'instructorId': c.instructor_id,
-                'instructorName': instructor_name,
-                'title': c.title,
-                'slug': c.slug,
-                'description': c.description,
-                'level': c.level,
-                'price': float(c.price) if c.price is not None else 0,
-                'currency': c.currency,
-                'isPublic': bool(c.is_public),
-                'image': None,
-                'thumbnail': None,
-                'categories': categories,
-                'topics': topics,
-                'createdAt': c.created_at.isoformat() if c.created_at else None,
-                'updatedAt': c.updated_at.isoformat() if c.updated_at else None,
-            })
-        return jsonify({'courses': data}), 200
+                    return jsonify({'courses': [], 'error': 'Invalid cursor'}), 400
+                q = q.filter(db.or_(
+                    Course.created_at < cur_created,
+                    db.and_(Course.created_at == cur_created, Course.id < cur_id),
+                ))
+            limit = max(1, min(limit or _CATALOG_MAX_LIMIT, _CATALOG_MAX_LIMIT))
+            q = q.order_by(Course.created_at.desc(), Course.id.desc()).limit(limit + 1)
+
+        courses = q.all()
+        next_cursor = None
+        if paginate and len(courses) > limit:
+            courses = courses[:limit]
+            next_cursor = _encode_catalog_cursor(courses[-1])
+
+        data = [_serialize_catalog_course(c, fields) for c in courses]
+        payload = {'courses': data}
+        if paginate:
+            payload['nextCursor'] = next_cursor
+        return jsonify(payload), 200, {'X-Total-Count': str(total)}
     except Exception as e:
         print(f"❌ Lỗi trong get_all_courses: {e}")
         return jsonify({'courses': [], 'error': 'Lỗi server'}), 500
@@ -439,9 +507,10 @@ def get_study_plans(student_id):
 @student_bp.route('/course/<int:course_id>/sections-lessons', methods=['GET'])
 def get_course_sections_and_lessons(course_id):
     try:
-        # Kiểm tra khóa học có tồn tại không
-        course = Course.query.get(course_id)
-        if not course:
+        # Outline (section/lesson/test + tổng điểm) được cache theo course,
+        # invalidate khi instructor sửa curriculum
+        outline = get_course_outline(course_id)
+        if not outline:
             return jsonify({'error': 'Course not found'}), 404
 
         # Lấy student từ JWT token (optional)
@@ -451,97 +520,12 @@ def get_course_sections_and_lessons(course_id):
             ident = get_jwt_identity()
             if ident:
                 user_id = _resolve_user_id_from_identity(ident)
-                user = User.query.get(user_id) if user_id else None
-                student = Student.query.filter_by(user_id=user.id).first() if user else None
+                student = Student.query.filter_by(user_id=user_id).first() if user_id else None
         except Exception:
             pass
 
-        # Map tiến độ bài học cho student hiện tại
-        lesson_id_to_completed = set()
-        if student:
-            progresses = (
-                LessonProgress.query
-                .filter(LessonProgress.student_id == student.id)
-                .all()
-            )
-            for p in progresses:
-                lesson_id_to_completed.add(p.lesson_id)
-
-        # Lấy danh sách section theo course_id
-        sections = sorted(list(course.sections), key=lambda s: (s.sort_order or 0, s.id))
-        result = {
-            "course": {
-                "id": course.id,
-                "instructorId": course.instructor_id,
-                "title": course.title,
-                "slug": course.slug,
-                "description": course.description,
-                "level": course.level,
-                "price": float(course.price) if course.price is not None else 0,
-                "currency": course.currency,
-                "isPublic": course.is_public,
-                "createdAt": str(course.created_at),
-                "updatedAt": str(course.updated_at),
-            },
-            "sections": []
-        }
-
-        # For computing total possible per test
-        from app.models.model import Question, TestAttempt
-
-        for section in sections:
-            lessons = sorted(list(section.lessons), key=lambda l: (l.sort_order or 0, l.id))
-            lesson_payload = []
-            for lesson in lessons:
-                # Build tests with latest score if student available
-                tests_payload = []
-                for t in getattr(lesson, 'tests', []):
-                    # Sum of question points for this test
-                    questions = Question.query.filter_by(test_id=t.id).all()
-                    total_possible = sum((q.points or 1) for q in questions) if questions else 0
-                    last_score = None
-                    if student:
-                        last_attempt = (
-                            TestAttempt.query
-                            .filter_by(student_id=student.id, test_id=t.id)
-                            .order_by(TestAttempt.created_at.desc())
-                            .first()
-                        )
-                        if last_attempt and last_attempt.total_score is not None:
-                            try:
-                                last_score = float(last_attempt.total_score)
-                            except Exception:
-                                last_score = None
-                    tests_payload.append({
-                        "id": t.id,
-                        "title": t.title,
-                        "timeLimitMinutes": t.time_limit_minutes or 0,
-                        # extra fields for FE score display
-                        "lastScore": last_score,
-                        "totalScore": total_possible
-                    })
-
-                lesson_payload.append({
-                    "id": lesson.id,
-                    "sectionId": lesson.section_id,
-                    "title": lesson.title,
-                    "content": lesson.content,
-                    "type": getattr(lesson, 'type', 'video'),
-                    "videoUrl": getattr(lesson, 'video_url', None),
-                    "durationSeconds": getattr(lesson, 'duration_seconds', 0) or 0,
-                    "isPreview": getattr(lesson, 'is_preview', False) or False,
-                    "sortOrder": lesson.sort_order,
-                    "completed": lesson.id in lesson_id_to_completed,
-                    "tests": tests_payload
-                })
-
-            result["sections"].append({
-                "id": section.id,
-                "courseId": section.course_id,
-                "title": section.title,
-                "sortOrder": section.sort_order,
-                "lessons": lesson_payload
-            })
+        # Ghép tiến độ bài học + điểm lần làm gần nhất của student (2 query batch)
+        result = build_student_outline(outline, student.id if student else None)
         return jsonify(result), 200
 
     except Exception as e:
@@ -694,7 +678,7 @@ def submit_test(test_id):
         print(f"📥 POST /api/student/tests/{test_id}/submit (Scale 10)")
         print(f"{'='*80}")
         
-        from app.models.model import Test, Question, Choice, TestAttempt
+        from app.models.model import Test
         
         # Get student from JWT
         ident = get_jwt_identity()
@@ -719,48 +703,13 @@ def submit_test(test_id):
         answers_by_qid = {a.get('questionId'): a.get('choiceId') for a in answers}
         
         # --- LOGIC TÍNH ĐIỂM MỚI (THANG 10) ---
-        raw_score = 0           # Điểm thô đạt được (ví dụ: làm đúng 15 câu 1 điểm = 15)
-        total_raw_possible = 0  # Tổng điểm thô tối đa (ví dụ: 20 câu 1 điểm = 20)
-        correct_count = 0
-        
-        questions = Question.query.filter_by(test_id=test_id).all()
-        
-        # Build detailed question results for review
-        question_results = []
-        
-        for question in questions:
-            q_points = getattr(question, 'points', 1) or 1
-            total_raw_possible += q_points # Cộng dồn tổng điểm tối đa
-            
-            chosen_id = answers_by_qid.get(question.id)
-            
-            # Get all choices for this question
-            choices = Choice.query.filter_by(question_id=question.id).order_by(Choice.sort_order).all()
-            
-            # Check correctness
-            correct_choice = Choice.query.filter_by(question_id=question.id, is_correct=True).first()
-            is_correct = False
-            if correct_choice and correct_choice.id == chosen_id:
-                raw_score += q_points # Cộng điểm nếu đúng
-                correct_count += 1
-                is_correct = True
-            
-            # Build question result with all choices and correct answer info
-            question_results.append({
-                'questionId': question.id,
-                'content': getattr(question, 'content', ''),
-                'points': q_points,
-                'difficulty': getattr(question, 'difficulty', 'medium'),
-                'userChoiceId': chosen_id,
-                'correctChoiceId': correct_choice.id if correct_choice else None,
-                'isCorrect': is_correct,
-                'choices': [{
-                    'id': c.id,
-                    'text': getattr(c, 'text', '') or getattr(c, 'content', ''),
-                    'isCorrect': getattr(c, 'is_correct', False)
-                } for c in choices]
-            })
-        
+        # Đáp án của test được load 1 lần (questions + choices) và cache theo test
+        graded = grade_submission(get_answer_key(test.id), answers_by_qid)
+        raw_score = graded['rawScore']                  # Điểm thô đạt được
+        total_raw_possible = graded['totalRawScore']    # Tổng điểm thô tối đa
+        correct_count = graded['correctCount']
+        question_results = graded['questionResults']
+
         # Quy đổi sang thang điểm 10
         final_score_10 = 0
         percentage = 0
@@ -777,32 +726,24 @@ def submit_test(test_id):
         print(f"📊 Raw Score: {raw_score}/{total_raw_possible}")
         print(f"📊 Final Score (Scale 10): {final_score_10}")
         
-        # Save test attempt to database
+        # Save test attempt + answers (1 INSERT ... SELECT cấp AttemptNumber và kiểm tra
+        # attemptsAllowed, 1 bulk insert Answers)
         try:
-            attempt_number = 1
-            prev_attempt = (
-                TestAttempt.query
-                .filter_by(student_id=student.id, test_id=test.id)
-                .order_by(TestAttempt.attempt_number.desc())
-                .first()
-            )
-            if prev_attempt and isinstance(prev_attempt.attempt_number, int):
-                attempt_number = prev_attempt.attempt_number + 1
-
-            now_dt = datetime.utcnow()
-            attempt = TestAttempt(
-                student_id=student.id,
-                test_id=test.id,
-                attempt_number=attempt_number,
-                start_time=now_dt,
-                submit_time=now_dt,
-                total_score=final_score_10, # Lưu điểm hệ 10 vào database
-            )
-            db.session.add(attempt)
-            db.session.commit()
+            attempt_id = record_attempt(test, student.id, final_score_10, graded)
+        except AttemptLimitReached:
+            return jsonify({
+                'success': False,
+                'message': 'Bạn đã hết số lần làm bài cho phép',
+                'attemptsAllowed': test.attempts_allowed,
+            }), 403
         except Exception as e:
-            print(f"⚠️ Could not save TestAttempt: {e}")
+            # Bài làm chưa được lưu: không trả kết quả như đã nộp thành công
+            print(f"❌ Could not save TestAttempt: {e}")
             db.session.rollback()
+            return jsonify({
+                'success': False,
+                'message': 'Không lưu được bài làm, vui lòng nộp lại',
+            }), 500
         
         result = {
             "success": True,
@@ -810,9 +751,10 @@ def submit_test(test_id):
             "rawScore": raw_score,          # Trả về điểm thô (số câu đúng)
             "totalRawScore": total_raw_possible,
             "correctCount": correct_count,
-            "totalQuestions": len(questions),
+            "totalQuestions": graded['totalQuestions'],
             "percentage": round(percentage, 2),
             "passed": passed,
+            "attemptId": attempt_id,
             "questionResults": question_results  # Chi tiết từng câu hỏi và đáp án đúng
         }
         
@@ -828,8 +770,6 @@ def submit_test(test_id):
 @jwt_required()
 def get_test_metrics():
     try:
-        from app.models.model import TestAttempt
-
         ident = get_jwt_identity()
         user_id = _resolve_user_id_from_identity(ident)
         if not user_id:
@@ -843,8 +783,8 @@ def get_test_metrics():
         if not student:
             return jsonify({'message': 'Student not found'}), 404
 
-        attempts = TestAttempt.query.filter_by(student_id=student.id).all()
-        tests_taken = len(attempts)
+        # Tổng hợp sẵn trong student_test_stats (cập nhật khi nộp bài)
+        tests_taken, total_score_sum = get_student_test_metrics(student.id)
         
         if tests_taken == 0:
             return jsonify({
@@ -853,16 +793,7 @@ def get_test_metrics():
                 'averageScore10': 0.0
             }), 200
 
-        # Tính trung bình dựa trên thang điểm 10 đã lưu
-        total_score_sum = 0
-        for a in attempts:
-            try:
-                # Giả định dữ liệu trong DB giờ là thang 10
-                score = float(a.total_score) if a.total_score is not None else 0.0
-                total_score_sum += score
-            except Exception:
-                pass
-
+        # Điểm lưu trong DB là thang 10
         avg_score_10 = total_score_sum / tests_taken
         # Quy đổi ngược ra phần trăm: (Điểm 10 / 10) * 100
         avg_pct = (avg_score_10 / 10.0) * 100.0
@@ -912,9 +843,6 @@ def _produce_recommendations(answers):
 @student_bp.post('/recommend/chat/init')
 @jwt_required(optional=True)
 def recommend_chat_init():
-    # Clean up old sessions periodically
-    _cleanup_old_sessions()
-    
     ident = get_jwt_identity()
     user_id = _resolve_user_id_from_identity(ident) if ident else None
     
@@ -923,13 +851,69 @@ def recommend_chat_init():
     
     session_id = str(uuid.uuid4())
     session_key = (user_id, session_id)
-    _AI_CHAT_SESSIONS[session_key] = { 'history': [], 'created_at': time.time() }
+    created_at = time.time()
+    _AI_CHAT_SESSIONS.set(session_key, { 'history': [], 'created_at': created_at })
+    _register_chat_session(user_id, session_id, created_at)
     
     logging.info(f"✅ Created session {session_id} for user {user_id}")
     
     intro = 'Xin chào! Bạn muốn học gì? Hãy cho tôi biết mục tiêu (ví dụ: học backend Python, cải thiện thuật toán, chuẩn bị phỏng vấn...).'
     return jsonify({ 'success': True, 'sessionId': session_id, 'message': intro }) , 200
 
+def _courses_with_reasons(ai, snapshot):
+    """Map course ids the model suggested (with reasons) to course payloads from the snapshot."""
+    detailed = []
+    for item in ai.get('courses', [])[:8]:
+        cid = item.get('id')
+        if not cid:
+            continue
+        try:
+            course = snapshot.details.get(int(cid))
+            if not course:
+                continue
+            detailed.append({
+                'course': dict(course),
+                'reason': item.get('reason')
+            })
+        except Exception as e:
+            print(f'Error processing course {cid}: {e}')
+            continue
+    return detailed
+
+
+def _stream_recommend_reply(sess, session_key, snapshot):
+    """SSE generator: relay reply tokens, then one 'done' event with parsed course suggestions."""
+    parser = ReplyStreamParser()
+    try:
+        prompt = _build_reply_prompt(sess['history'], snapshot.catalog_json)
+        for chunk in stream_text(prompt, _GEMINI_MODEL_NAME):
+            delta = parser.feed(chunk)
+            if delta:
+                yield sse_event('token', {'text': delta})
+        tail, ai = parser.finish()
+        if tail:
+            yield sse_event('token', {'text': tail})
+    except Exception as e:
+        print('Gemini stream error:', e)
+        if not parser.text:
+            ai = { 'text': 'AI error occurred; please provide more detail.', 'courses': [], 'follow_up': None }
+            yield sse_event('token', {'text': ai['text']})
+        else:
+            # Keep what already reached the user
+            ai = parse_reply_json(parser.text)
+
+    assistant_text = (ai.get('text') or '')[:6000]
+    _append_history(sess, 'assistant', assistant_text)
+    _save_chat_session(session_key, sess)
+    yield sse_event('done', {
+        'success': True,
+        'sessionId': session_key[1],
+        'reply': assistant_text,
+        'coursesWithReasons': _courses_with_reasons(ai, snapshot),
+        'followUp': ai.get('follow_up')
+    })
+
+
 @student_bp.post('/recommend/chat/message')
 @jwt_required(optional=True)
 def recommend_chat_message():
@@ -948,52 +932,30 @@ def recommend_chat_message():
         
         # Debug logging
         logging.info(f"📨 Chat message request - User: {user_id}, Session: {session_id}")
-        logging.info(f"🔍 Active sessions for user {user_id}: {[k for k in _AI_CHAT_SESSIONS.keys() if k[0] == user_id]}")
         
-        if not session_id or session_key not in _AI_CHAT_SESSIONS:
-            logging.warning(f"⚠️ Invalid session - User: {user_id}, Session: {session_id}, Key exists: {session_key in _AI_CHAT_SESSIONS}")
+        sess = _AI_CHAT_SESSIONS.get(session_key) if session_id else None
+        if sess is None:
+            logging.warning(f"⚠️ Invalid session - User: {user_id}, Session: {session_id}")
             return jsonify({ 'success': False, 'error': 'Invalid or expired session' }), 400
         if not user_msg:
             return jsonify({ 'success': False, 'error': 'Empty message' }), 400
         
-        sess = _AI_CHAT_SESSIONS[session_key]
-        sess['history'].append({'role':'user','text': user_msg})
+        _append_history(sess, 'user', user_msg)
         
-        # Get course context for recommendation
-        course_context = _serialize_courses()
+        # Shared course snapshot: catalog JSON and course payloads are prebuilt
+        snapshot = get_course_context()
         
+        if wants_stream(data):
+            return sse_response(_stream_recommend_reply(sess, session_key, snapshot))
+
         # Generate AI reply with course context
-        ai = _ai_generate_reply(sess['history'], course_context)
-        
-        # If AI included course IDs with reasons, map to full course objects
-        detailed = []
-        for item in ai.get('courses', [])[:8]:
-            cid = item.get('id')
-            if not cid:
-                continue
-            try:
-                c = Course.query.get(int(cid))
-                if not c:
-                    continue
-                detailed.append({
-                    'course': {
-                        'id': c.id,
-                        'title': c.title,
-                        'level': c.level,
-                        'price': float(c.price) if c.price else 0,
-                        'categories': [cat.name for cat in getattr(c,'categories',[]) if getattr(cat,'name',None)],
-                        'topics': [t.name for t in getattr(c,'topics',[]) if getattr(t,'name',None)],
-                        'description': c.description
-                    },
-                    'reason': item.get('reason')
-                })
-            except Exception as e:
-                print(f'Error processing course {cid}: {e}')
-                continue
+        ai = _ai_generate_reply(sess['history'], snapshot.catalog_json)
+        detailed = _courses_with_reasons(ai, snapshot)
         
         # Append assistant message (store trimmed text to avoid growth)
         assistant_text = ai.get('text','')[:6000]
-        sess['history'].append({'role':'assistant','text': assistant_text})
+        _append_history(sess, 'assistant', assistant_text)
+        _save_chat_session(session_key, sess)
         
         return jsonify({
             'success': True,
@@ -1032,12 +994,10 @@ def recommend_chat_clear():
         
         session_key = (user_id, session_id)
         
-        # Log current state before clearing
         logging.info(f"🔍 Clear request - User: {user_id}, Session: {session_id}")
-        logging.info(f"🔍 Active sessions for user: {[k[1] for k in _AI_CHAT_SESSIONS.keys() if k[0] == user_id]}")
         
-        if session_key in _AI_CHAT_SESSIONS:
-            del _AI_CHAT_SESSIONS[session_key]
+        _unregister_chat_session(user_id, session_id)
+        if _AI_CHAT_SESSIONS.delete(session_key):
             logging.info(f"🗑️ Successfully cleared session {session_id} for user {user_id}")
             return jsonify({
                 'success': True,
@@ -1293,18 +1253,3 @@ def upload_avatar():
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
-
-def _cleanup_old_sessions():
-    """Remove sessions older than _SESSION_TIMEOUT."""
-    current_time = time.time()
-    to_remove = []
-    for session_key, session_data in _AI_CHAT_SESSIONS.items():
-        if current_time - session_data.get('created_at', 0) > _SESSION_TIMEOUT:
-            to_remove.append(session_key)
-    for session_key in to_remove:
-        user_id, session_id = session_key
-        del _AI_CHAT_SESSIONS[session_key]
-        logging.info(f"🧹 Removed expired session {session_id} for user {user_id}")
-    if to_remove:
-        logging.info(f'🧹 Cleaned up {len(to_remove)} old chat sessions')
-
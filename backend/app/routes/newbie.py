@@ -11,6 +11,7 @@ from flask import Blueprint, jsonify, request
 from werkzeug.security import generate_password_hash
 
 from app.models import db
+from app.utils.session_store import SessionStore
 from sqlalchemy import desc
 
 from app.models.model import (
@@ -27,8 +28,9 @@ from app.models.model import (
 
 newbie_bp = Blueprint("newbie", __name__, url_prefix="/api/newbie")
 
-TEST_SESSIONS = {}
 SESSION_TTL = timedelta(minutes=30)
+# test_id -> answer key + metadata of a generated test; shared across workers, expires after SESSION_TTL
+TEST_SESSIONS = SessionStore("newbie_test", ttl=SESSION_TTL.total_seconds())
 
 LEVEL_BRACKETS = [
     (2, "absolute_beginner"),
@@ -266,15 +268,6 @@ def _generate_ai_questions(track, course, difficulty, focus_topic):
     return questions
 
 
-def _cleanup_sessions():
-    threshold = datetime.utcnow() - SESSION_TTL
-    stale_keys = [
-        key for key, info in TEST_SESSIONS.items() if info.get("created_at") < threshold
-    ]
-    for key in stale_keys:
-        TEST_SESSIONS.pop(key, None)
-
-
 def _get_history_stats(user_id, limit=5):
     if not user_id:
         return {}
@@ -506,7 +499,6 @@ def test_questions():
     questions = _generate_ai_questions(track, course_context, difficulty_label, focus_topic)
 
     test_id = str(uuid4())
-    _cleanup_sessions()
     session_answers = {}
     session_meta = {}
     payload_questions = []
@@ -523,15 +515,15 @@ def test_questions():
             {"id": qid, "question": question["question"], "options": question["options"]}
         )
 
-    TEST_SESSIONS[test_id] = {
+    TEST_SESSIONS.set(test_id, {
         "answers": session_answers,
         "metadata": session_meta,
         "track": track,
         "difficulty": difficulty_label,
         "focus_topic": focus_topic,
-        "created_at": datetime.utcnow(),
+        "created_at": datetime.utcnow().isoformat(),
         "question_ids": question_ids,
-    }
+    })
     return jsonify({"test_id": test_id, "questions": payload_questions})
 
 
@@ -1,10 +1,27 @@
 import json
 import os
+import re
+import time
 from typing import Any, Dict, List, Optional
 
-import requests
+from app.services import llm_client
+from app.services.quiz_batch import clamp_concurrency, run_batch
+from app.utils.cache import BoundedCache
 
 AI_TIMEOUT = 25
+AI_MAX_TOKENS = 800
+# Batched week descriptions: JSON overhead plus ~40 Vietnamese words per week
+BATCH_BASE_TOKENS = 256
+BATCH_TOKENS_PER_WEEK = 160
+# Overall budget for the descriptions of one path (batched call + per-week fallback calls)
+DESCRIPTION_DEADLINE = float(os.getenv("LEARNING_PATH_DESCRIPTION_DEADLINE", "20"))
+DESCRIPTION_CONCURRENCY = int(os.getenv("LEARNING_PATH_DESCRIPTION_CONCURRENCY", "4"))
+# (level, strengths, weaknesses, weekly course titles) -> [description per week]
+_DESCRIPTION_CACHE = BoundedCache(
+    "learning_path.week_descriptions",
+    maxsize=int(os.getenv("LEARNING_PATH_DESCRIPTION_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("LEARNING_PATH_DESCRIPTION_CACHE_TTL", str(7 * 24 * 3600))),
+)
 
 
 def _build_prompt(test_result: Any, skill_profile: Any) -> str:
@@ -32,6 +49,16 @@ Placement summary:
     return prompt.strip()
 
 
+_CODE_FENCE = re.compile(r"^```[A-Za-z]*\s*\n?(.*?)\n?\s*```$", re.DOTALL)
+
+
+def _strip_code_fence(text: str) -> str:
+    """``text`` without a surrounding markdown fence (```json ... ```)."""
+    text = text.strip()
+    match = _CODE_FENCE.match(text)
+    return match.group(1).strip() if match else text
+
+
 def _parse_ai_response(raw_text: Any) -> Dict[str, Any]:
     if isinstance(raw_text, dict):
         return raw_text
@@ -39,58 +66,47 @@ def _parse_ai_response(raw_text: Any) -> Dict[str, Any]:
         return json.loads(raw_text)
     except Exception:
         try:
-            cleaned = raw_text.strip()
-            if cleaned.startswith("```"):
-                cleaned = cleaned.strip("`").strip()
-            return json.loads(cleaned)
+            return json.loads(_strip_code_fence(raw_text))
         except Exception:
             return {}
 
 
-def _invoke_openai(prompt: str) -> Any:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+def _invoke_openai(prompt: str, timeout: float = AI_TIMEOUT, max_tokens: int = AI_MAX_TOKENS,
+                   json_mode: bool = False) -> Any:
+    if not llm_client.available("openai"):
         return None
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    data = {
-        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-        "messages": [
-            {"role": "system", "content": "You output valid JSON only."},
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0.2,
-        "max_tokens": 800,
-    }
-    response = requests.post(url, json=data, headers=headers, timeout=AI_TIMEOUT)
-    response.raise_for_status()
-    payload = response.json()
-    return payload["choices"][0]["message"]["content"]
+    return llm_client.generate_text(
+        prompt,
+        os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        provider="openai",
+        timeout=timeout,
+        system="You output valid JSON only.",
+        temperature=0.2,
+        max_tokens=max_tokens,
+        json=json_mode,
+    )
 
 
-def _invoke_gemini(prompt: str) -> Any:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+def _invoke_gemini(prompt: str, timeout: float = AI_TIMEOUT, max_tokens: int = AI_MAX_TOKENS,
+                   json_mode: bool = False) -> Any:
+    if not llm_client.available("gemini"):
         return None
-    model = os.getenv("GEMINI_MODEL", "models/gemini-1.5-pro")
-    url = f"https://generativelanguage.googleapis.com/v1beta/{model}:generateText"
-    headers = {"Content-Type": "application/json"}
-    params = {"key": api_key}
-    body = {
-        "prompt": {"text": prompt},
-        "temperature": 0.2,
-        "maxOutputTokens": 800,
-    }
-    response = requests.post(url, headers=headers, params=params, json=body, timeout=AI_TIMEOUT)
-    response.raise_for_status()
-    payload = response.json()
-    candidates = payload.get("candidates") or []
-    if not candidates:
-        return ""
-    return candidates[0].get("output", "")
+    model = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    options = {}
+    if json_mode:
+        options["json"] = True
+        if "flash" in model:
+            # Thinking tokens count against max_tokens and would cut the JSON short
+            options["thinking_budget"] = 0
+    return llm_client.generate_text(
+        prompt,
+        model,
+        provider="gemini",
+        timeout=timeout,
+        temperature=0.2,
+        max_tokens=max_tokens,
+        **options,
+    )
 
 
 def _build_fallback(test_result: Any, skill_profile: Any) -> Dict[str, Any]:
@@ -123,21 +139,32 @@ def _humanize_list(items: Optional[List[str]]) -> Optional[str]:
 def _clean_text_output(raw_text: Any) -> str:
     if raw_text is None:
         return ""
-    text = str(raw_text).strip()
-    if text.startswith("```"):
-        text = text.strip("`").strip()
-    return text
+    return _strip_code_fence(str(raw_text)).strip("`").strip()
+
 
+def _call_description_ai(prompt: str, deadline: Optional[float] = None, json_mode: bool = False,
+                         max_tokens: int = AI_MAX_TOKENS) -> str:
+    """First non-empty answer of OpenAI then Gemini; ``deadline`` (time.monotonic()) bounds both calls.
 
-def _call_description_ai(prompt: str) -> str:
+    With ``json_mode`` the providers are asked for JSON and the raw answer is
+    returned for ``_parse_ai_response`` instead of being cleaned as prose.
+    """
     for invoker in (_invoke_openai, _invoke_gemini):
+        timeout = AI_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                break
         try:
-            raw = invoker(prompt)
+            raw = invoker(prompt, timeout=timeout, max_tokens=max_tokens, json_mode=json_mode)
         except Exception:
             continue
-        description = _clean_text_output(raw)
-        if description:
-            return description
+        if json_mode:
+            answer = str(raw).strip() if raw is not None else ""
+        else:
+            answer = _clean_text_output(raw)
+        if answer:
+            return answer
     return ""
 
 
@@ -208,6 +235,127 @@ def generate_week_description(
     if week_index == 4:
         return f'Tuần 4 áp dụng {strengths_str} vào bài tập tổng hợp và rèn luyện thêm {weaknesses_str} qua các lab thực tế.'
     return f'Tuần {week_index} tổng ôn các nội dung về {strengths_str} và {weaknesses_str}, chuẩn bị cho giai đoạn học tiếp theo.'
+
+
+def _course_titles(courses: List[Dict[str, str]]) -> List[str]:
+    return [course.get("title") for course in courses or [] if course.get("title")]
+
+
+def _build_batch_description_prompt(
+    level: str,
+    strengths: List[str],
+    weaknesses: List[str],
+    weekly_courses: List[List[Dict[str, str]]],
+) -> str:
+    weeks = [
+        {"week": idx, "courses": _course_titles(courses)}
+        for idx, courses in enumerate(weekly_courses, start=1)
+    ]
+    prompt = f"""
+You are a personalized learning advisor for a coding platform.
+Based on:
+- Current level: {level}
+- Strengths: {_humanize_list(strengths) or "available strengths"}
+- Weaknesses: {_humanize_list(weaknesses) or "areas to improve"}
+- Weeks and their scheduled courses: {json.dumps(weeks, ensure_ascii=False)}
+For every week write a single sentence (30-40 words) in Vietnamese that describes that week's goal, mentions "tuần <week>", and highlights the progress from previous weeks.
+Avoid code-style lists; keep the tone encouraging and clear.
+Return only a JSON object {{"weeks": [{{"week": <int>, "description": <string>}}]}} with one entry per week, without markdown.
+"""
+    return prompt.strip()
+
+
+def _parse_batch_descriptions(raw: Any, week_count: int) -> Dict[int, str]:
+    payload = _parse_ai_response(raw) if raw else {}
+    entries = payload.get("weeks") if isinstance(payload, dict) else None
+    descriptions = {}
+    for entry in entries or []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            week = int(entry.get("week"))
+        except (TypeError, ValueError):
+            continue
+        text = _clean_text_output(entry.get("description"))
+        if 1 <= week <= week_count and text:
+            descriptions[week] = text
+    return descriptions
+
+
+def _description_cache_key(level, strengths, weaknesses, weekly_courses):
+    return (
+        (level or "").strip().lower(),
+        tuple(sorted(str(s) for s in strengths or [])),
+        tuple(sorted(str(w) for w in weaknesses or [])),
+        tuple(tuple(_course_titles(courses)) for courses in weekly_courses),
+    )
+
+
+def generate_week_descriptions(
+    level: str,
+    strengths: List[str],
+    weaknesses: List[str],
+    weekly_courses: List[List[Dict[str, str]]],
+    deadline: float = DESCRIPTION_DEADLINE,
+) -> List[str]:
+    """Descriptions for every week of a path; ``weekly_courses[i]`` are the courses of week i + 1.
+
+    One structured LLM call asks for all weeks at once; weeks it did not cover are
+    fanned out concurrently (one prompt per week). Everything shares ``deadline``
+    seconds and any week still missing gets the deterministic
+    ``generate_week_description`` text. Fully generated results are cached per
+    (level, strengths, weaknesses, weekly course titles).
+    """
+    level = level or "beginner"
+    strengths = strengths or []
+    weaknesses = weaknesses or []
+    week_count = len(weekly_courses)
+    if not week_count:
+        return []
+    cache_key = _description_cache_key(level, strengths, weaknesses, weekly_courses)
+    cached = _DESCRIPTION_CACHE.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    descriptions: Dict[int, str] = {}
+    if llm_client.available("openai") or llm_client.available("gemini"):
+        ends_at = time.monotonic() + deadline
+        # Leave half of the budget for the per-week calls if the batched answer is unusable
+        batch_prompt = _build_batch_description_prompt(level, strengths, weaknesses, weekly_courses)
+        batch_answer = _call_description_ai(
+            batch_prompt,
+            deadline=time.monotonic() + deadline / 2,
+            json_mode=True,
+            max_tokens=BATCH_BASE_TOKENS + BATCH_TOKENS_PER_WEEK * week_count,
+        )
+        descriptions = _parse_batch_descriptions(batch_answer, week_count)
+        missing = [week for week in range(1, week_count + 1) if week not in descriptions]
+        if missing and time.monotonic() < ends_at:
+            def _describe(week):
+                prompt = _build_week_description_prompt(
+                    level, strengths, weaknesses, weekly_courses[week - 1], week
+                )
+                return _call_description_ai(prompt, deadline=ends_at) or None
+
+            results = run_batch(
+                missing,
+                _describe,
+                lambda week, reason: None,
+                concurrency=clamp_concurrency(DESCRIPTION_CONCURRENCY),
+                item_timeout=max(0.001, ends_at - time.monotonic()),
+                deadline=ends_at,
+            )
+            descriptions.update({week: text for week, text in zip(missing, results) if text})
+
+    result = [
+        descriptions.get(week) or generate_week_description(level, strengths, weaknesses, week)
+        for week in range(1, week_count + 1)
+    ]
+    if len(descriptions) == week_count:
+        _DESCRIPTION_CACHE.set(cache_key, result)
+    return list(result)
+
+
 def generate_learning_path_with_ai(test_result: Any, skill_profile: Any) -> Dict[str, Any]:
     prompt = _build_prompt(test_result, skill_profile)
     raw_output = None
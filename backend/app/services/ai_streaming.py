@@ -0,0 +1,126 @@
+"""Server-Sent Events helpers for streaming Gemini chat replies.
+
+Chat endpoints opt into streaming (``?stream=1``, ``"stream": true`` in the
+body or ``Accept: text/event-stream``) and relay text as it arrives:
+
+    event: token
+    data: {"text": "..."}
+
+followed by one ``done`` event carrying the same payload as the non-streaming
+JSON response (or an ``error`` event). The course-recommendation reply ends
+with a fenced ```json block; ``ReplyStreamParser`` keeps that block out of
+the token events and parses it once the stream is complete.
+
+Text comes from the active stream provider, Gemini through the shared LLM
+client by default. ``set_stream_provider`` swaps it for a local generator
+(tests, offline dev).
+"""
+import json
+
+from flask import Response, request, stream_with_context
+
+from app.services import llm_client
+
+JSON_BLOCK_MARKER = '```json'
+
+
+def wants_stream(payload=None):
+    """True when the client asked for an SSE response."""
+    flag = request.args.get('stream')
+    if flag is None and isinstance(payload, dict):
+        flag = payload.get('stream')
+    if isinstance(flag, bool):
+        return flag
+    if flag is not None:
+        return str(flag).lower() in ('1', 'true', 'yes')
+    return 'text/event-stream' in (request.headers.get('Accept') or '')
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """Wrap a generator of SSE strings; the request context stays available while it runs."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def parse_reply_json(text):
+    """Split a model reply into visible text and the trailing ```json block (courses, follow_up)."""
+    result = {'text': (text or '').strip(), 'courses': [], 'follow_up': None}
+    if text and JSON_BLOCK_MARKER in text:
+        try:
+            # Extract JSON block
+            json_start = text.find(JSON_BLOCK_MARKER) + len(JSON_BLOCK_MARKER)
+            json_end = text.find('```', json_start)
+            if json_end > json_start:
+                json_data = json.loads(text[json_start:json_end].strip())
+                result['courses'] = json_data.get('courses', [])
+                result['follow_up'] = json_data.get('follow_up')
+                # Clean the JSON block from the text
+                result['text'] = text[:text.find(JSON_BLOCK_MARKER)].strip()
+        except Exception as e:
+            print(f'JSON parse error: {e}')
+    return result
+
+
+class ReplyStreamParser:
+    """Incrementally forwards reply text, withholding everything from the ```json marker on."""
+
+    def __init__(self):
+        self._buf = ''
+        self._emitted = 0
+        self._in_block = False
+
+    @property
+    def text(self):
+        return self._buf
+
+    def feed(self, chunk):
+        """Add a chunk; return the part that is safe to show now."""
+        self._buf += chunk or ''
+        if self._in_block:
+            return ''
+        idx = self._buf.find(JSON_BLOCK_MARKER, max(0, self._emitted - len(JSON_BLOCK_MARKER)))
+        if idx >= 0:
+            self._in_block = True
+            return self._take(idx)
+        # Hold back a tail that may be the start of the marker split across chunks
+        safe = len(self._buf)
+        for k in range(min(len(JSON_BLOCK_MARKER) - 1, len(self._buf)), 0, -1):
+            if JSON_BLOCK_MARKER.startswith(self._buf[-k:]):
+                safe -= k
+                break
+        return self._take(safe)
+
+    def _take(self, end):
+        end = max(end, self._emitted)
+        delta = self._buf[self._emitted:end]
+        self._emitted = end
+        return delta
+
+    def finish(self):
+        """Return (remaining visible text, parsed reply dict) once the stream is over."""
+        tail = '' if self._in_block else self._take(len(self._buf))
+        return tail, parse_reply_json(self._buf)
+
+
+def gemini_text_stream(prompt, model_name):
+    return llm_client.stream(prompt, model_name)
+
+
+_STREAM_PROVIDER = gemini_text_stream
+
+
+def set_stream_provider(provider):
+    """Install ``provider(prompt, model_name) -> iterator of text chunks``; None restores Gemini."""
+    global _STREAM_PROVIDER
+    _STREAM_PROVIDER = provider or gemini_text_stream
+
+
+def stream_text(prompt, model_name):
+    return _STREAM_PROVIDER(prompt, model_name)
@@ -0,0 +1,167 @@
+"""Publish/subscribe of new course-chat messages for push delivery.
+
+``send_message`` publishes every stored message on the channel of its
+conversation (course + the two participants); ``GET /api/chat/messages/stream``
+(SSE) and ``GET /api/chat/messages?wait=`` (long-poll) park on a subscription
+instead of re-querying the database, so an idle conversation costs no queries.
+
+The broker is chosen with ``CHAT_BROKER``:
+
+* ``memory`` (default): in-process; every subscriber of a worker sees the
+  messages sent through that worker, enough for a single worker;
+* ``redis``: messages go through Redis pub/sub (``CHAT_BROKER_REDIS_URL``,
+  needs the ``redis`` package), so a message sent on one worker reaches
+  clients connected to any other.
+
+``set_chat_broker`` installs another broker (tests).
+"""
+import json
+import os
+import queue
+import threading
+
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    redis = None
+
+SUBSCRIBER_QUEUE_SIZE = 100  # a slower client resyncs with ``since`` instead of blocking publishers
+
+
+def conversation_channel(course_id, user_a, user_b):
+    """Channel of the direct conversation between two users about a course."""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f"chat:{int(course_id)}:{low}:{high}"
+
+
+class Subscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def _deliver(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            pass
+
+    def get(self, timeout=None):
+        """Next event, or None when ``timeout`` seconds pass without one."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InProcessBroker:
+    """Fan-out to the subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers = {}  # channel -> set of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        sub = Subscription(self, channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def _unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            sub._deliver(event)
+        return len(subs)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+
+class RedisBroker(InProcessBroker):
+    """Publishes through Redis; one pattern subscription per worker feeds the local subscribers."""
+
+    def __init__(self, url=None):
+        if redis is None:
+            raise RuntimeError("redis is not installed. Run `pip install redis` or use CHAT_BROKER=memory.")
+        super().__init__()
+        self._client = redis.Redis.from_url(url or os.getenv('CHAT_BROKER_REDIS_URL', 'redis://localhost:6379/0'))
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{'chat:*': self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message):
+        channel = message.get('channel')
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        try:
+            event = json.loads(message.get('data'))
+        except Exception as e:
+            print(f"[chat_events] bad message on {channel}: {e}")
+            return
+        super().publish(channel, event)
+
+    def publish(self, channel, event):
+        return self._client.publish(channel, json.dumps(event, ensure_ascii=False))
+
+
+_BROKERS = {
+    'memory': InProcessBroker,
+    'redis': RedisBroker,
+}
+_BROKER = None
+_BROKER_LOCK = threading.Lock()
+
+
+def get_chat_broker():
+    global _BROKER
+    if _BROKER is None:
+        with _BROKER_LOCK:
+            if _BROKER is None:
+                choice = (os.getenv('CHAT_BROKER') or 'memory').strip().lower()
+                if choice not in _BROKERS:
+                    print(f"[chat_events] unknown CHAT_BROKER={choice!r}, using memory")
+                    choice = 'memory'
+                _BROKER = _BROKERS[choice]()
+    return _BROKER
+
+
+def set_chat_broker(broker):
+    """Swap the broker (tests); None re-reads CHAT_BROKER."""
+    global _BROKER
+    _BROKER = broker
+
+
+def publish_message(message_payload):
+    """Publish a serialized chat message on its conversation channel; never raises."""
+    try:
+        channel = conversation_channel(
+            message_payload['courseId'], message_payload['fromUserId'], message_payload['toUserId']
+        )
+        get_chat_broker().publish(channel, {'type': 'message', 'message': message_payload})
+    except Exception as e:
+        print(f"[chat_events] publish failed: {e}")
+
+
+def subscribe_conversation(course_id, user_a, user_b):
+    return get_chat_broker().subscribe(conversation_channel(course_id, user_a, user_b))
@@ -0,0 +1,135 @@
+"""Versioned course-context snapshot shared by the Gemini prompt builders.
+
+Chat endpoints ground their prompts in the course catalog. Instead of querying
+and serializing courses on every message, the snapshot is built once with a
+fixed number of queries and holds prebuilt strings:
+
+* ``catalog`` / ``catalog_json``: the newest courses in the compact shape the
+  recommendation chat sends to Gemini (``Student.recommend_chat_message``);
+* ``details``: full course payloads of those courses, to map ids returned by
+  the model back to courses without a query per id;
+* ``public``: one prebuilt line per public course for ``AI._build_course_context``.
+
+``app.services.course_sync`` marks the snapshot stale on course writes; it is
+also rebuilt after ``COURSE_CONTEXT_TTL`` seconds (writes from other workers,
+category renames). Each rebuild bumps ``version``.
+"""
+import json
+import os
+import threading
+import time
+
+from sqlalchemy.orm import selectinload
+
+from app.models.model import Course
+
+_CONTEXT_TTL = int(os.getenv('COURSE_CONTEXT_TTL', '300'))  # seconds
+_CATALOG_SIZE = int(os.getenv('COURSE_CONTEXT_CATALOG_SIZE', '40'))
+
+
+class CourseContextSnapshot:
+    __slots__ = ('version', 'built_at', 'catalog', 'catalog_json', 'details', 'public')
+
+    def __init__(self, version, catalog, details, public):
+        self.version = version
+        self.built_at = time.time()
+        self.catalog = catalog
+        # Compact separators: fewer prompt tokens than the old indent=2 dump
+        self.catalog_json = json.dumps(catalog, ensure_ascii=False, separators=(',', ':'))
+        self.details = details
+        self.public = public  # [(lowercased search text, prompt line)], newest first
+
+    def public_course_lines(self, keyword=None, limit=10):
+        """Numbered prompt lines of the newest public courses, optionally filtered by a keyword
+        found in the title, description or level (case-insensitive)."""
+        keyword = (keyword or '').strip().lower()
+        lines = []
+        for search_text, line in self.public:
+            if keyword and keyword not in search_text:
+                continue
+            lines.append(f"{len(lines) + 1}) {line}")
+            if len(lines) >= limit:
+                break
+        return "\n".join(lines)
+
+
+def _build_snapshot(version):
+    recent = (
+        Course.query
+        .options(selectinload(Course.categories), selectinload(Course.topics))
+        .order_by(Course.created_at.desc())
+        .limit(_CATALOG_SIZE)
+        .all()
+    )
+    catalog = []
+    details = {}
+    for c in recent:
+        cats = [cat.name for cat in c.categories if cat.name]
+        tops = [t.name for t in c.topics if t.name]
+        price = float(c.price) if c.price else 0
+        catalog.append({
+            'id': c.id,
+            'title': c.title,
+            'level': c.level,
+            'price': price,
+            'categories': cats,
+            'topics': tops,
+            'description': (c.description or '')[:400],
+        })
+        details[c.id] = {
+            'id': c.id,
+            'title': c.title,
+            'level': c.level,
+            'price': price,
+            'categories': cats,
+            'topics': tops,
+            'description': c.description,
+        }
+
+    rows = (
+        Course.query
+        .with_entities(Course.title, Course.description, Course.level, Course.price, Course.currency)
+        .filter(Course.is_public.is_(True))
+        .order_by(Course.created_at.desc())
+        .all()
+    )
+    public = []
+    for title, description, level, price, currency in rows:
+        price_text = f"{price} {currency}" if price is not None else "N/A"
+        search_text = ' '.join([title or '', description or '', level or '']).lower()
+        line = (
+            f"Ten: {title}; Mo ta: {description or 'N/A'}; "
+            f"Level: {level or 'N/A'}; Gia: {price_text}"
+        )
+        public.append((search_text, line))
+    return CourseContextSnapshot(version, catalog, details, public)
+
+
+_SNAPSHOT = None
+_STALE = True
+_LOCK = threading.Lock()
+
+
+def get_course_context():
+    """Return the current snapshot, rebuilding it if it was invalidated or is older than the TTL."""
+    global _SNAPSHOT, _STALE
+    snapshot = _SNAPSHOT
+    if snapshot is not None and not _STALE and time.time() - snapshot.built_at < _CONTEXT_TTL:
+        return snapshot
+    with _LOCK:
+        # Another thread may have rebuilt it while we waited
+        snapshot = _SNAPSHOT
+        if snapshot is not None and not _STALE and time.time() - snapshot.built_at < _CONTEXT_TTL:
+            return snapshot
+        _STALE = False
+        try:
+            _SNAPSHOT = _build_snapshot((snapshot.version + 1) if snapshot else 1)
+        except Exception:
+            _STALE = True
+            raise
+        return _SNAPSHOT
+
+
+def invalidate_course_context():
+    global _STALE
+    _STALE = True
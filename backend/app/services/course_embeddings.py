@@ -0,0 +1,164 @@
+"""Course embedding pipeline.
+
+Course vectors are computed off the request path and persisted in
+``Course.embedding_vector`` together with ``Course.embedding_hash``, a hash of
+the embedding model and the course text. Course writes schedule a background
+job (``schedule_course_embedding``) that skips courses whose text did not
+change; ``backfill_course_embeddings`` fills in existing rows in batches.
+Recommendation handlers only read the vectors through ``course_index``.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy.orm import selectinload
+
+from app.models import db
+from app.models.model import Course
+from app.services.course_index import course_index
+from app.services.course_keyword_index import course_text
+from app.services.recommender import embed_documents, embedding_available, embedding_model_id
+
+logger = logging.getLogger(__name__)
+
+_BACKFILL_BATCH_SIZE = int(os.getenv('COURSE_EMBEDDING_BATCH_SIZE', '32'))
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+_PENDING = set()  # course ids queued but not yet embedded
+
+
+def content_hash(course):
+    text = f"{embedding_model_id()}\n{course_text(course)}"
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def needs_embedding(course, force=False):
+    return force or not course.embedding_vector or course.embedding_hash != content_hash(course)
+
+
+def embed_courses(courses, force=False):
+    """Compute and assign vectors for stale courses (caller commits).
+
+    Returns (embedded, skipped, failed) counts.
+    """
+    stale = [c for c in courses if needs_embedding(c, force)]
+    skipped = len(courses) - len(stale)
+    if not stale:
+        return 0, skipped, 0
+    vectors = embed_documents([course_text(c) for c in stale])
+    embedded = failed = 0
+    for course, vec in zip(stale, vectors):
+        if not vec:
+            failed += 1
+            continue
+        course.embedding_vector = [float(x) for x in vec]
+        course.embedding_hash = content_hash(course)
+        embedded += 1
+    return embedded, skipped, failed
+
+
+def _sync_index(courses):
+    for c in courses:
+        if c.embedding_vector:
+            course_index.upsert(c.id, c.embedding_vector)
+
+
+def _load_courses(ids):
+    return (
+        Course.query
+        .options(selectinload(Course.categories), selectinload(Course.topics))
+        .filter(Course.id.in_(ids))
+        .all()
+    )
+
+
+def _run_embedding_job(app, course_id):
+    with _EXECUTOR_LOCK:
+        _PENDING.discard(course_id)
+    with app.app_context():
+        try:
+            courses = _load_courses([course_id])
+            embedded, _, failed = embed_courses(courses)
+            if embedded:
+                db.session.commit()
+                _sync_index(courses)
+            elif failed:
+                logger.warning("Embedding course %s failed; it will be retried on the next edit or backfill",
+                               course_id)
+        except Exception as exc:
+            db.session.rollback()
+            logger.warning("Embedding job for course %s failed: %s", course_id, exc)
+        finally:
+            db.session.remove()
+
+
+def _get_executor():
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            # One worker: jobs are I/O bound and the embedding API is rate limited
+            _EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='course-embed')
+        return _EXECUTOR
+
+
+def schedule_course_embedding(course_id):
+    """Queue a background (re)embedding of one course; no-op when no embedding backend is configured."""
+    if course_id is None or not embedding_available():
+        return False
+    with _EXECUTOR_LOCK:
+        if course_id in _PENDING:
+            return True
+        _PENDING.add(course_id)
+    _get_executor().submit(_run_embedding_job, current_app._get_current_object(), course_id)
+    return True
+
+
+def _run_backfill_job(app):
+    with app.app_context():
+        try:
+            totals = backfill_course_embeddings()
+            logger.info("Course embedding backfill: %s", totals)
+        except Exception as exc:
+            db.session.rollback()
+            logger.warning("Course embedding backfill failed: %s", exc)
+        finally:
+            db.session.remove()
+
+
+def schedule_backfill(app=None):
+    """Queue a full backfill on the embedding worker (e.g. after the local model was refitted)."""
+    if not embedding_available():
+        return False
+    _get_executor().submit(_run_backfill_job, app or current_app._get_current_object())
+    return True
+
+
+def backfill_course_embeddings(batch_size=None, force=False):
+    """Embed every course whose stored vector is missing or stale, one batch at a time.
+
+    Returns a dict with embedded / skipped / failed counts.
+    """
+    batch_size = batch_size or _BACKFILL_BATCH_SIZE
+    totals = {'embedded': 0, 'skipped': 0, 'failed': 0}
+    last_id = 0
+    while True:
+        ids = [
+            cid for (cid,) in
+            db.session.query(Course.id).filter(Course.id > last_id).order_by(Course.id).limit(batch_size).all()
+        ]
+        if not ids:
+            break
+        last_id = ids[-1]
+        courses = _load_courses(ids)
+        embedded, skipped, failed = embed_courses(courses, force=force)
+        if embedded:
+            db.session.commit()
+            _sync_index(courses)
+        totals['embedded'] += embedded
+        totals['skipped'] += skipped
+        totals['failed'] += failed
+        db.session.expunge_all()
+    return totals
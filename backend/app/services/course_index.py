@@ -0,0 +1,183 @@
+"""In-memory course embedding index for semantic recommendations.
+
+Course vectors live in one contiguous float32 matrix with L2-normalised rows,
+so scoring a query against every course is a single matrix-vector product and
+top-k selection is an ``argpartition`` instead of a Python loop over courses.
+The index is loaded from ``Course.embedding_vector`` at startup and kept in
+sync by ``app.services.course_sync`` when courses are written.
+"""
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vec):
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(arr))
+    if not arr.size or norm == 0.0 or not np.isfinite(norm):
+        return None
+    return arr / norm
+
+
+class CourseEmbeddingIndex:
+    """Thread-safe id -> unit vector store backed by a growable contiguous matrix."""
+
+    def __init__(self, initial_capacity=64):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._reset()
+        self.loaded = False  # True once built from the database
+
+    def _reset(self, dim=0):
+        self._dim = dim
+        self._size = 0
+        self._matrix = np.zeros((self._initial_capacity if dim else 0, dim), dtype=np.float32)
+        self._ids = np.zeros(self._matrix.shape[0], dtype=np.int64)
+        self._pos = {}  # course_id -> row
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, course_id):
+        return course_id in self._pos
+
+    @property
+    def dim(self):
+        return self._dim
+
+    def build(self, items):
+        """Replace the whole index from an iterable of (course_id, vector)."""
+        rows = []
+        for cid, vec in items:
+            unit = _normalize(vec) if vec is not None else None
+            if unit is not None:
+                rows.append((int(cid), unit))
+        with self._lock:
+            if not rows:
+                self._reset()
+                self.loaded = True
+                return 0
+            dim = rows[0][1].shape[0]
+            kept = [(cid, unit) for cid, unit in rows if unit.shape[0] == dim]
+            if len(kept) != len(rows):
+                logger.warning("Skipped %d course vectors with dimension != %d", len(rows) - len(kept), dim)
+            self._dim = dim
+            self._size = len(kept)
+            self._matrix = np.ascontiguousarray(np.vstack([unit for _, unit in kept]), dtype=np.float32)
+            self._ids = np.fromiter((cid for cid, _ in kept), dtype=np.int64, count=len(kept))
+            self._pos = {cid: row for row, (cid, _) in enumerate(kept)}
+            self.loaded = True
+            return self._size
+
+    def upsert(self, course_id, vec):
+        """Insert or replace one course vector; returns False if it was rejected."""
+        unit = _normalize(vec) if vec is not None else None
+        if unit is None:
+            self.remove(course_id)
+            return False
+        course_id = int(course_id)
+        with self._lock:
+            if not self._dim:
+                self._reset(unit.shape[0])
+            if unit.shape[0] != self._dim:
+                logger.warning("Course %s vector has dimension %d, index expects %d",
+                               course_id, unit.shape[0], self._dim)
+                return False
+            row = self._pos.get(course_id)
+            if row is None:
+                if self._size == self._matrix.shape[0]:
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._pos[course_id] = row
+                self._ids[row] = course_id
+            self._matrix[row] = unit
+            return True
+
+    def _grow(self):
+        capacity = max(self._initial_capacity, self._matrix.shape[0] * 2)
+        matrix = np.zeros((capacity, self._dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def remove(self, course_id):
+        with self._lock:
+            row = self._pos.pop(int(course_id), None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix dense
+                moved_id = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._pos[moved_id] = row
+            self._size = last
+
+    def score(self, query_vec, course_ids):
+        """Cosine similarity of the query with each id in ``course_ids`` (0.0 for ids not indexed)."""
+        out = np.zeros(len(course_ids), dtype=np.float32)
+        q = _normalize(query_vec) if query_vec is not None else None
+        with self._lock:
+            if q is None or q.shape[0] != self._dim or not self._size:
+                return out
+            rows = np.fromiter((self._pos.get(int(cid), -1) for cid in course_ids), dtype=np.int64,
+                               count=len(course_ids))
+            present = rows >= 0
+            if present.any():
+                out[present] = self._matrix[rows[present]] @ q
+        return out
+
+    def search(self, query_vec, k, allowed_ids=None):
+        """Top-k (course_id, similarity) pairs, optionally restricted to ``allowed_ids``."""
+        q = _normalize(query_vec) if query_vec is not None else None
+        with self._lock:
+            n = self._size
+            if q is None or q.shape[0] != self._dim or not n or k <= 0:
+                return []
+            sims = self._matrix[:n] @ q
+            ids = self._ids[:n].copy()
+        if allowed_ids is not None:
+            mask = np.isin(ids, np.fromiter(allowed_ids, dtype=np.int64))
+            sims = np.where(mask, sims, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, n)
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(ids[i]), float(sims[i])) for i in top]
+
+
+course_index = CourseEmbeddingIndex()
+
+
+def load_course_index():
+    """(Re)build the global index from the persisted Course.embedding_vector column."""
+    from app.models import db
+    from app.models.model import Course
+
+    rows = (
+        db.session.query(Course.id, Course.embedding_vector)
+        .filter(Course.embedding_vector.isnot(None))
+        .all()
+    )
+    count = course_index.build((cid, vec) for cid, vec in rows if isinstance(vec, list) and vec)
+    logger.info("Loaded %d course embeddings into the semantic index", count)
+    return count
+
+
+def ensure_course_index():
+    if not course_index.loaded:
+        load_course_index()
+    return course_index
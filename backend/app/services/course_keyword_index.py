@@ -0,0 +1,266 @@
+"""In-memory inverted keyword index over the course corpus.
+
+Every course is tokenized once into a document (normalized filter keys,
+searchable text and the response payload) and its tokens are posted into
+``token -> {course_id: field weight}``. Structured filters (language, level,
+category, topic) are id sets, so the recommender's filter relaxations are set
+operations and keyword scoring is a postings lookup instead of a database
+scan plus re-tokenization per request.
+
+The index is built on first use, updated by ``app.services.course_sync`` on
+course writes, and rebuilt after ``COURSE_KEYWORD_INDEX_TTL`` seconds so that
+writes made by other workers (or category renames) are eventually picked up.
+"""
+import heapq
+import os
+import threading
+import time
+
+from sqlalchemy.orm import selectinload
+
+from app.models.model import Course, Instructor
+
+_INDEX_TTL = int(os.getenv('COURSE_KEYWORD_INDEX_TTL', '600'))  # seconds
+
+# A keyword found in the title, a category or a topic counts more than one
+# that only appears in the description.
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'categories': 3.0,
+    'topics': 3.0,
+    'description': 2.0,
+}
+
+_PUNCTUATION = ',./\\;:"\'|()[]{}!@#$%^&*?-_+\n\r\t'
+
+
+def normalize(s):
+    return (s or '').strip().lower()
+
+
+def tokenize(s):
+    s = normalize(s)
+    for ch in _PUNCTUATION:
+        s = s.replace(ch, ' ')
+    return [w for w in s.split() if w]
+
+
+def course_text(c):
+    """Compact course text used for embeddings and semantic keyword scoring."""
+    cats = ' '.join([getattr(cat, 'name', '') for cat in getattr(c, 'categories', [])])
+    tops = ' '.join([getattr(t, 'name', '') for t in getattr(c, 'topics', [])])
+    return ' | '.join(filter(None, [
+        getattr(c, 'title', ''), getattr(c, 'description', ''), cats, tops, getattr(c, 'level', ''),
+    ]))[:1500]
+
+
+def _course_document(c):
+    categories = [cat for cat in (c.categories or []) if getattr(cat, 'name', None)]
+    topics = [t for t in (c.topics or []) if getattr(t, 'name', None)]
+    instructor = c.instructor
+    fields = {
+        'title': normalize(c.title),
+        'description': normalize(c.description),
+        'categories': ' '.join(normalize(cat.name) for cat in categories),
+        'topics': ' '.join(normalize(t.name) for t in topics),
+    }
+    return {
+        'id': c.id,
+        'language': normalize(c.language),
+        'level': normalize(c.level),
+        'categoryKeys': {normalize(v) for cat in categories for v in (cat.name, cat.slug) if v},
+        'topicKeys': {normalize(v) for t in topics for v in (t.name, t.slug) if v},
+        'createdAt': c.created_at.timestamp() if c.created_at else 0.0,
+        # Same blob the heuristic scorer always matched substrings against
+        'blob': ' '.join(fields[f] for f in ('title', 'description', 'categories', 'topics')),
+        'text': normalize(course_text(c)),
+        'fields': fields,
+        'payload': {
+            'id': c.id,
+            'title': c.title,
+            'description': c.description,
+            'level': c.level,
+            'price': float(c.price) if c.price is not None else 0,
+            'currency': c.currency,
+            'categories': [cat.name for cat in categories],
+            'topics': [t.name for t in topics],
+            'instructorName': instructor.user.full_name if instructor and instructor.user else None,
+        },
+    }
+
+
+class CourseKeywordIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}          # course_id -> document
+        self._postings = {}      # token -> {course_id: weight}
+        self._by_language = {}   # language -> set(course_id)
+        self._by_level = {}      # level -> set(course_id)
+        self._by_category = {}   # category name/slug -> set(course_id)
+        self._by_topic = {}      # topic name/slug -> set(course_id)
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    @staticmethod
+    def _add_key(table, key, course_id):
+        if key:
+            table.setdefault(key, set()).add(course_id)
+
+    @staticmethod
+    def _discard_key(table, key, course_id):
+        ids = table.get(key)
+        if ids is not None:
+            ids.discard(course_id)
+            if not ids:
+                del table[key]
+
+    def _insert(self, doc):
+        cid = doc['id']
+        self._docs[cid] = doc
+        weights = {}
+        for field, value in doc['fields'].items():
+            w = FIELD_WEIGHTS[field]
+            for tok in tokenize(value):
+                if weights.get(tok, 0.0) < w:
+                    weights[tok] = w
+        doc['tokens'] = weights
+        for tok, w in weights.items():
+            self._postings.setdefault(tok, {})[cid] = w
+        self._add_key(self._by_language, doc['language'], cid)
+        self._add_key(self._by_level, doc['level'], cid)
+        for key in doc['categoryKeys']:
+            self._add_key(self._by_category, key, cid)
+        for key in doc['topicKeys']:
+            self._add_key(self._by_topic, key, cid)
+
+    def _delete(self, course_id):
+        doc = self._docs.pop(course_id, None)
+        if doc is None:
+            return
+        for tok in doc['tokens']:
+            posting = self._postings.get(tok)
+            if posting is not None:
+                posting.pop(course_id, None)
+                if not posting:
+                    del self._postings[tok]
+        self._discard_key(self._by_language, doc['language'], course_id)
+        self._discard_key(self._by_level, doc['level'], course_id)
+        for key in doc['categoryKeys']:
+            self._discard_key(self._by_category, key, course_id)
+        for key in doc['topicKeys']:
+            self._discard_key(self._by_topic, key, course_id)
+
+    def build(self, courses):
+        docs = [_course_document(c) for c in courses]
+        with self._lock:
+            self._reset()
+            for doc in docs:
+                self._insert(doc)
+            self.built_at = time.time()
+        return len(docs)
+
+    def upsert(self, course):
+        doc = _course_document(course)
+        with self._lock:
+            self._delete(doc['id'])
+            self._insert(doc)
+
+    def remove(self, course_id):
+        with self._lock:
+            self._delete(course_id)
+
+    # ---- queries (callers must not mutate the returned documents) ----
+
+    def documents(self, course_ids):
+        with self._lock:
+            return [self._docs[cid] for cid in course_ids if cid in self._docs]
+
+    def payload(self, course_id):
+        doc = self._docs.get(course_id)
+        return dict(doc['payload']) if doc else None
+
+    def filter_ids(self, language='', level='', major='', topic=''):
+        """Ids of courses matching every given (normalized) filter; empty filters are ignored."""
+        with self._lock:
+            ids = set(self._docs)
+            for table, key in (
+                (self._by_language, language),
+                (self._by_level, level),
+                (self._by_category, major),
+                (self._by_topic, topic),
+            ):
+                if key:
+                    ids &= table.get(key, set())
+            return ids
+
+    def document_frequency(self, token):
+        """Number of courses holding ``token`` as a whole token."""
+        return len(self._postings.get(token, ()))
+
+    def keyword_hits(self, keyword):
+        """Per-course score for one keyword: the field weight of an exact token hit,
+        or half of it when the keyword only appears inside a longer word or as a phrase."""
+        keyword = normalize(keyword)
+        if not keyword:
+            return {}
+        tokens = tokenize(keyword)
+        with self._lock:
+            if tokens == [keyword]:
+                hits = {}
+                # Partial containment, e.g. "java" in "javascript": scans the vocabulary, not the courses
+                for tok, posting in self._postings.items():
+                    if tok != keyword and keyword in tok:
+                        for cid, w in posting.items():
+                            if w / 2 > hits.get(cid, 0.0):
+                                hits[cid] = w / 2
+                hits.update(self._postings.get(keyword, {}))
+                return hits
+            # Phrase (or keyword with punctuation): courses holding every token, confirmed on the text
+            candidates = None
+            for tok in tokens:
+                ids = set(self._postings.get(tok, ()))
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return {}
+            hits = {}
+            for cid in candidates or ():
+                doc = self._docs[cid]
+                if keyword in doc['blob']:
+                    hits[cid] = min(doc['tokens'][tok] for tok in tokens) / 2
+            return hits
+
+    def most_recent(self, ids, n):
+        with self._lock:
+            return heapq.nlargest(n, ids, key=lambda cid: (self._docs[cid]['createdAt'], cid))
+
+
+course_keyword_index = CourseKeywordIndex()
+
+
+def load_course_keyword_index():
+    courses = (
+        Course.query
+        .options(
+            selectinload(Course.categories),
+            selectinload(Course.topics),
+            selectinload(Course.instructor).selectinload(Instructor.user),
+        )
+        .all()
+    )
+    return course_keyword_index.build(courses)
+
+
+def ensure_course_keyword_index():
+    built_at = course_keyword_index.built_at
+    if built_at is None or time.time() - built_at >= _INDEX_TTL:
+        load_course_keyword_index()
+    return course_keyword_index
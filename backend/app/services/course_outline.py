@@ -0,0 +1,194 @@
+"""Precomputed, student-independent course outlines.
+
+The outline (course info, sections, lessons, tests and total points per test)
+only changes when an instructor edits the curriculum, so it is built once per
+course and kept in a per-process cache. Instructor write endpoints call
+``invalidate_course_outline``; the TTL bounds staleness for other workers.
+"""
+import os
+
+from app.models import db
+from app.models.model import Course, CourseSection, Lesson, Test, Question, LessonProgress, TestAttempt
+from app.utils.cache import BoundedCache
+
+_OUTLINE_TTL = int(os.getenv('COURSE_OUTLINE_TTL', '300'))  # seconds
+_OUTLINE_CACHE = BoundedCache(  # course_id -> outline
+    'course_outline',
+    maxsize=int(os.getenv('COURSE_OUTLINE_CACHE_SIZE', '1024')),
+    ttl=_OUTLINE_TTL,
+)
+
+
+def _build_outline(course):
+    sections = (
+        CourseSection.query
+        .filter_by(course_id=course.id)
+        .order_by(CourseSection.sort_order, CourseSection.id)
+        .all()
+    )
+    section_ids = [s.id for s in sections]
+    lessons = []
+    if section_ids:
+        lessons = Lesson.query.filter(Lesson.section_id.in_(section_ids)).all()
+    lesson_ids = [l.id for l in lessons]
+    tests = []
+    if lesson_ids:
+        tests = Test.query.filter(Test.lesson_id.in_(lesson_ids)).order_by(Test.id).all()
+    test_ids = [t.id for t in tests]
+
+    # Question without points counts as 1 point (same rule as grading)
+    total_points = {}
+    if test_ids:
+        point_expr = db.func.coalesce(db.func.nullif(Question.points, 0), 1)
+        rows = (
+            db.session.query(Question.test_id, db.func.sum(point_expr))
+            .filter(Question.test_id.in_(test_ids))
+            .group_by(Question.test_id)
+            .all()
+        )
+        total_points = {tid: int(total or 0) for tid, total in rows}
+
+    tests_by_lesson = {}
+    for t in tests:
+        tests_by_lesson.setdefault(t.lesson_id, []).append({
+            "id": t.id,
+            "title": t.title,
+            "timeLimitMinutes": t.time_limit_minutes or 0,
+            "totalScore": total_points.get(t.id, 0),
+        })
+
+    lessons_by_section = {}
+    for lesson in sorted(lessons, key=lambda l: (l.sort_order or 0, l.id)):
+        lessons_by_section.setdefault(lesson.section_id, []).append({
+            "id": lesson.id,
+            "sectionId": lesson.section_id,
+            "title": lesson.title,
+            "content": lesson.content,
+            "type": lesson.type,
+            "videoUrl": lesson.video_url,
+            "durationSeconds": lesson.duration_seconds or 0,
+            "isPreview": lesson.is_preview or False,
+            "sortOrder": lesson.sort_order,
+            "tests": tests_by_lesson.get(lesson.id, []),
+        })
+
+    return {
+        "course": {
+            "id": course.id,
+            "instructorId": course.instructor_id,
+            "title": course.title,
+            "slug": course.slug,
+            "description": course.description,
+            "level": course.level,
+            "price": float(course.price) if course.price is not None else 0,
+            "currency": course.currency,
+            "isPublic": course.is_public,
+            "createdAt": str(course.created_at),
+            "updatedAt": str(course.updated_at),
+        },
+        "sections": [
+            {
+                "id": s.id,
+                "courseId": s.course_id,
+                "title": s.title,
+                "sortOrder": s.sort_order,
+                "lessons": lessons_by_section.get(s.id, []),
+            }
+            for s in sorted(sections, key=lambda s: (s.sort_order or 0, s.id))
+        ],
+        "lessonIds": lesson_ids,
+        "testIds": test_ids,
+    }
+
+
+def get_course_outline(course_id):
+    """Return the cached outline for a course, building it if needed; None if the course does not exist.
+
+    The returned structure is shared between requests and must not be mutated.
+    """
+    cached = _OUTLINE_CACHE.get(course_id)
+    if cached is not None:
+        return cached
+
+    course = db.session.get(Course, course_id)
+    if not course:
+        return None
+    outline = _build_outline(course)
+    _OUTLINE_CACHE.set(course_id, outline)
+    return outline
+
+
+def invalidate_course_outline(course_id):
+    if course_id is None:
+        return
+    _OUTLINE_CACHE.pop(course_id)
+
+
+def course_id_for(obj):
+    """Resolve the owning course id of a section, lesson, test or question (None if detached)."""
+    if obj is None:
+        return None
+    if isinstance(obj, Question):
+        obj = obj.test
+    if isinstance(obj, Test):
+        obj = obj.lesson
+    if isinstance(obj, Lesson):
+        obj = obj.section
+    if isinstance(obj, CourseSection):
+        return obj.course_id
+    if isinstance(obj, Course):
+        return obj.id
+    return None
+
+
+def build_student_outline(outline, student_id=None):
+    """Merge per-student progress (completed lessons, last test scores) into a cached outline.
+
+    Costs at most two queries: lesson progress and latest attempt per test.
+    """
+    completed = set()
+    last_scores = {}
+    if student_id:
+        lesson_ids = outline["lessonIds"]
+        if lesson_ids:
+            rows = (
+                db.session.query(LessonProgress.lesson_id)
+                .filter(LessonProgress.student_id == student_id, LessonProgress.lesson_id.in_(lesson_ids))
+                .all()
+            )
+            completed = {lid for (lid,) in rows}
+        test_ids = outline["testIds"]
+        if test_ids:
+            latest = (
+                db.session.query(db.func.max(TestAttempt.id).label('attempt_id'))
+                .filter(TestAttempt.student_id == student_id, TestAttempt.test_id.in_(test_ids))
+                .group_by(TestAttempt.test_id)
+                .subquery()
+            )
+            rows = (
+                db.session.query(TestAttempt.test_id, TestAttempt.total_score)
+                .join(latest, TestAttempt.id == latest.c.attempt_id)
+                .all()
+            )
+            last_scores = {tid: float(score) for tid, score in rows if score is not None}
+
+    return {
+        "course": dict(outline["course"]),
+        "sections": [
+            {
+                **section,
+                "lessons": [
+                    {
+                        **lesson,
+                        "completed": lesson["id"] in completed,
+                        "tests": [
+                            {**t, "lastScore": last_scores.get(t["id"])}
+                            for t in lesson["tests"]
+                        ],
+                    }
+                    for lesson in section["lessons"]
+                ],
+            }
+            for section in outline["sections"]
+        ],
+    }
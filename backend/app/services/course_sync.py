@@ -0,0 +1,27 @@
+"""Keep in-process course derived data in sync with course writes.
+
+Route handlers that create, update or delete a Course call these hooks after
+committing, so each derived structure has a single place to be refreshed.
+"""
+from app.services.course_context import invalidate_course_context
+from app.services.course_index import course_index
+from app.services.course_embeddings import schedule_course_embedding
+from app.services.course_keyword_index import course_keyword_index
+
+
+def on_course_saved(course):
+    """Call after a course row was created or updated and committed."""
+    invalidate_course_context()
+    if course_keyword_index.built_at is not None:
+        course_keyword_index.upsert(course)
+    if isinstance(course.embedding_vector, list) and course.embedding_vector:
+        # Keep serving the previous vector until the background job replaces it
+        course_index.upsert(course.id, course.embedding_vector)
+    schedule_course_embedding(course.id)
+
+
+def on_course_deleted(course_id):
+    """Call after a course row was deleted and committed."""
+    invalidate_course_context()
+    course_index.remove(course_id)
+    course_keyword_index.remove(course_id)
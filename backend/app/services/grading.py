@@ -0,0 +1,263 @@
+"""Answer keys and scoring for student test submissions.
+
+All questions and choices of a test are loaded in one query and kept as a
+per-test answer key, so grading a submission is a single in-memory pass.
+Instructor question/choice writes call ``invalidate_answer_key``; the TTL
+bounds staleness for other workers.
+
+Attempts are recorded with a single INSERT ... SELECT that allocates the next
+attempt number and enforces ``Test.attempts_allowed`` in the database; the
+unique (StudentId, TestId, AttemptNumber) constraint turns a concurrent
+duplicate into a retry instead of a double-numbered attempt. The same
+transaction bumps the student's running aggregates in ``student_test_stats``.
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy import insert, select, update, delete, literal, case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from app.models import db
+from app.models.model import Question, TestAttempt, Answer
+from app.models.student_test_stats import StudentTestStats
+from app.utils.cache import BoundedCache
+
+_ANSWER_KEY_TTL = int(os.getenv('ANSWER_KEY_TTL', '300'))  # seconds
+_ANSWER_KEY_CACHE = BoundedCache(  # test_id -> answer_key
+    'grading.answer_keys',
+    maxsize=int(os.getenv('ANSWER_KEY_CACHE_SIZE', '2048')),
+    ttl=_ANSWER_KEY_TTL,
+)
+
+
+def _build_answer_key(test_id):
+    questions = (
+        Question.query
+        .options(joinedload(Question.choices))
+        .filter(Question.test_id == test_id)
+        .order_by(Question.id)
+        .all()
+    )
+    key = []
+    for q in questions:
+        # First correct choice by id, as the previous per-question query returned
+        correct = [c.id for c in sorted(q.choices, key=lambda c: c.id) if c.is_correct]
+        key.append({
+            'id': q.id,
+            'content': q.content or '',
+            'points': q.points or 1,
+            'difficulty': 'medium',
+            'correctChoiceId': correct[0] if correct else None,
+            'choices': [
+                {'id': c.id, 'text': c.content or '', 'isCorrect': bool(c.is_correct)}
+                for c in sorted(q.choices, key=lambda c: (c.sort_order or 0, c.id))
+            ],
+        })
+    return key
+
+
+def get_answer_key(test_id):
+    """Return the cached answer key (list of question dicts) for a test; must not be mutated."""
+    cached = _ANSWER_KEY_CACHE.get(test_id)
+    if cached is not None:
+        return cached
+    key = _build_answer_key(test_id)
+    _ANSWER_KEY_CACHE.set(test_id, key)
+    return key
+
+
+def invalidate_answer_key(test_id):
+    if test_id is None:
+        return
+    _ANSWER_KEY_CACHE.pop(test_id)
+
+
+def grade_submission(answer_key, answers_by_qid):
+    """Score a submission ({questionId: choiceId}) against an answer key in one pass.
+
+    A choice id that is not an option of its question counts as unanswered.
+    """
+    raw_score = 0
+    total_raw_possible = 0
+    correct_count = 0
+    question_results = []
+    for q in answer_key:
+        q_points = q['points']
+        total_raw_possible += q_points
+        chosen_id = answers_by_qid.get(q['id'])
+        if chosen_id is not None and not any(c['id'] == chosen_id for c in q['choices']):
+            # Không phải lựa chọn của câu này: chấm như bỏ trống (Answers.ChoiceId có FK)
+            chosen_id = None
+        is_correct = q['correctChoiceId'] is not None and q['correctChoiceId'] == chosen_id
+        if is_correct:
+            raw_score += q_points
+            correct_count += 1
+        question_results.append({
+            'questionId': q['id'],
+            'content': q['content'],
+            'points': q_points,
+            'difficulty': q['difficulty'],
+            'userChoiceId': chosen_id,
+            'correctChoiceId': q['correctChoiceId'],
+            'isCorrect': is_correct,
+            'choices': q['choices'],
+        })
+    return {
+        'rawScore': raw_score,
+        'totalRawScore': total_raw_possible,
+        'correctCount': correct_count,
+        'totalQuestions': len(answer_key),
+        'questionResults': question_results,
+    }
+
+
+_ATTEMPT_INSERT_RETRIES = 3
+
+
+class AttemptLimitReached(Exception):
+    """Student already used every attempt allowed for the test."""
+
+
+def _attempt_limit(test):
+    # NULL / 0 = không giới hạn số lần làm
+    allowed = test.attempts_allowed
+    return allowed if allowed and allowed > 0 else None
+
+
+def _is_retryable_conflict(exc):
+    """True for the duplicate keys a concurrent submit of the same student/test
+    causes: the attempt-number unique constraint or the student_test_stats PK."""
+    message = str(exc.orig)
+    if 'uq_test_attempts_student_test_number' in message or 'TestAttempts.AttemptNumber' in message:
+        return True
+    duplicate = 'Duplicate entry' in message or 'UNIQUE constraint failed' in message
+    return duplicate and 'student_test_stats' in (exc.statement or '')
+
+
+def record_attempt(test, student_id, total_score, graded):
+    """Insert a TestAttempt plus one Answer row per question in one transaction.
+
+    Returns the new attempt id; raises AttemptLimitReached when the student has
+    no attempts left. The caller owns nothing to commit afterwards.
+    """
+    allowed = _attempt_limit(test)
+    now_dt = datetime.utcnow()
+    prev = (
+        select(db.func.coalesce(db.func.max(TestAttempt.attempt_number), 0).label('n'))
+        .where(TestAttempt.student_id == student_id, TestAttempt.test_id == test.id)
+        .subquery()
+    )
+    allocate = select(
+        literal(test.id), literal(student_id), prev.c.n + 1,
+        literal(now_dt), literal(now_dt), literal(total_score), literal(now_dt),
+    )
+    if allowed is not None:
+        allocate = allocate.where(prev.c.n < allowed)
+    stmt = insert(TestAttempt).from_select(
+        [
+            TestAttempt.test_id, TestAttempt.student_id, TestAttempt.attempt_number,
+            TestAttempt.start_time, TestAttempt.submit_time, TestAttempt.total_score, TestAttempt.created_at,
+        ],
+        allocate,
+    )
+
+    for attempt in range(_ATTEMPT_INSERT_RETRIES):
+        try:
+            result = db.session.execute(stmt)
+            if result.rowcount == 0:
+                db.session.rollback()
+                raise AttemptLimitReached()
+            attempt_id = result.lastrowid
+            answer_rows = [
+                {
+                    'attempt_id': attempt_id,
+                    'question_id': r['questionId'],
+                    'choice_id': r['userChoiceId'],
+                    'score_given': r['points'] if r['isCorrect'] else 0,
+                }
+                for r in graded['questionResults']
+            ]
+            if answer_rows:
+                db.session.execute(insert(Answer), answer_rows)
+            _bump_test_stats(student_id, test.id, total_score, now_dt)
+            db.session.commit()
+            return attempt_id
+        except IntegrityError as e:
+            # Một request song song vừa lấy cùng AttemptNumber -> thử lại; lỗi khác thì báo lên
+            db.session.rollback()
+            if attempt == _ATTEMPT_INSERT_RETRIES - 1 or not _is_retryable_conflict(e):
+                raise
+
+
+def _bump_test_stats(student_id, test_id, score, now_dt):
+    stats = StudentTestStats.__table__.c
+    result = db.session.execute(
+        update(StudentTestStats.__table__)
+        .where(stats.StudentId == student_id, stats.TestId == test_id)
+        .values(
+            AttemptCount=stats.AttemptCount + 1,
+            ScoreSum=stats.ScoreSum + score,
+            BestScore=case(
+                (db.or_(stats.BestScore.is_(None), stats.BestScore < score), score),
+                else_=stats.BestScore,
+            ),
+            UpdatedAt=now_dt,
+        )
+    )
+    if result.rowcount == 0:
+        # Lần đầu làm test này; insert trùng song song -> IntegrityError -> record_attempt thử lại
+        db.session.execute(insert(StudentTestStats.__table__).values(
+            StudentId=student_id, TestId=test_id, AttemptCount=1,
+            ScoreSum=score, BestScore=score, UpdatedAt=now_dt,
+        ))
+
+
+def delete_test_attempts(test_ids):
+    """Delete every attempt of ``test_ids`` with its Answers and the students'
+    aggregates, before the tests or their questions are deleted. The caller commits."""
+    if not test_ids:
+        return
+    StudentTestStats.query.filter(StudentTestStats.test_id.in_(test_ids)).delete(synchronize_session=False)
+    attempt_ids = db.session.query(TestAttempt.id).filter(TestAttempt.test_id.in_(test_ids))
+    Answer.query.filter(Answer.attempt_id.in_(attempt_ids.scalar_subquery())).delete(synchronize_session=False)
+    TestAttempt.query.filter(TestAttempt.test_id.in_(test_ids)).delete(synchronize_session=False)
+
+
+def get_student_test_metrics(student_id):
+    """Return (attempt count, score sum) over all tests of a student from the aggregates table."""
+    count, total = (
+        db.session.query(
+            db.func.coalesce(db.func.sum(StudentTestStats.attempt_count), 0),
+            db.func.coalesce(db.func.sum(StudentTestStats.score_sum), 0),
+        )
+        .filter(StudentTestStats.student_id == student_id)
+        .one()
+    )
+    return int(count), float(total)
+
+
+def rebuild_test_stats():
+    """Recompute student_test_stats from TestAttempts; returns the number of rows written."""
+    stats = StudentTestStats.__table__
+    attempts = TestAttempt.__table__.c
+    aggregate = (
+        select(
+            attempts.StudentId,
+            attempts.TestId,
+            db.func.count(),
+            db.func.sum(db.func.coalesce(attempts.TotalScore, 0)),
+            db.func.max(attempts.TotalScore),
+            literal(datetime.utcnow()),
+        )
+        .group_by(attempts.StudentId, attempts.TestId)
+    )
+    db.session.execute(delete(stats))
+    result = db.session.execute(
+        insert(stats).from_select(
+            ['StudentId', 'TestId', 'AttemptCount', 'ScoreSum', 'BestScore', 'UpdatedAt'],
+            aggregate,
+        )
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,141 @@
+"""Learning-path timeline, materialized when the path is created.
+
+``create_learning_path`` turns the latest skill profile into a ``LearningPath``
+whose ``LearningPathItem`` rows already hold everything the timeline shows:
+the week description (``generate_week_descriptions``) and the resolved
+courses (id, title, slug). ``latest_path_items`` reads it back with one
+query for the items of the user's latest path; only rows written before the
+timeline was materialized (``unresolved_course_ids``) need a course lookup.
+"""
+from typing import Any, Dict, List
+
+from sqlalchemy.orm import load_only
+
+from app.models import db, LearningPath, LearningPathItem
+from app.models.model import Course
+from app.services.ai_learning_path import (
+    generate_learning_path_with_ai,
+    generate_week_description,
+    generate_week_descriptions,
+    _build_fallback,
+)
+
+
+def lookup_courses(course_ids) -> Dict[int, Dict[str, Any]]:
+    """One batched query: course id -> {id, title, slug, level, language}."""
+    ids = {cid for cid in course_ids if cid is not None}
+    if not ids:
+        return {}
+    rows = (
+        Course.query
+        .options(load_only(Course.id, Course.title, Course.slug, Course.level, Course.language))
+        .filter(Course.id.in_(ids))
+        .all()
+    )
+    return {
+        c.id: {"id": c.id, "title": c.title, "slug": c.slug, "level": c.level, "language": c.language}
+        for c in rows
+    }
+
+
+def _week_course_ids(weeks: List[Dict[str, Any]], recommended_ids: List[int]) -> List[List[int]]:
+    """Course ids per week: the AI's own ``course_ids`` when given, otherwise the
+    recommended courses split in order over the weeks."""
+    total = len(weeks)
+    plan = []
+    for idx, week in enumerate(weeks):
+        ids = week.get("course_ids")
+        if isinstance(ids, list):
+            plan.append([cid for cid in ids if isinstance(cid, int)])
+        else:
+            start = idx * len(recommended_ids) // total
+            end = (idx + 1) * len(recommended_ids) // total
+            plan.append(list(recommended_ids[start:end]))
+    return plan
+
+
+def create_learning_path(profile) -> LearningPath:
+    """Build and add (not commit) the learning path of ``profile`` with its materialized timeline."""
+    test_result = profile.placement_test
+    if test_result is not None:
+        ai_payload = generate_learning_path_with_ai(test_result, profile)
+    else:
+        fallback = _build_fallback(None, profile)
+        ai_payload = {"raw_ai_response": fallback, "weeks": fallback["weeks"]}
+    weeks = [w for w in ai_payload["weeks"] if isinstance(w, dict)] or _build_fallback(None, profile)["weeks"]
+
+    recommended_ids = list(profile.recommended_course_ids or [])
+    week_course_ids = _week_course_ids(weeks, recommended_ids)
+    lookup = lookup_courses(cid for ids in week_course_ids for cid in ids)
+    week_courses = [
+        [{"id": cid, "title": lookup[cid]["title"], "slug": lookup[cid]["slug"]} for cid in ids if cid in lookup]
+        for ids in week_course_ids
+    ]
+    descriptions = generate_week_descriptions(
+        profile.level or "beginner",
+        profile.strengths or [],
+        profile.weaknesses or [],
+        week_courses,
+    )
+
+    path = LearningPath(
+        user_id=profile.user_id,
+        raw_ai_response=ai_payload["raw_ai_response"],
+        recommended_course_ids=recommended_ids,
+    )
+    for idx, week in enumerate(weeks):
+        path.items.append(LearningPathItem(
+            week_number=idx + 1,
+            title=(week.get("title") or f"Week {idx + 1}")[:255],
+            description=descriptions[idx],
+            topics=week.get("topics") or [],
+            course_ids=[c["id"] for c in week_courses[idx]],
+            courses=week_courses[idx],
+        ))
+    db.session.add(path)
+    return path
+
+
+def latest_path_items(user_id) -> List[LearningPathItem]:
+    """Items of the user's latest path in week order, in one query."""
+    latest_path = (
+        db.session.query(LearningPath.id)
+        .filter(LearningPath.user_id == user_id)
+        .order_by(LearningPath.created_at.desc(), LearningPath.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        LearningPathItem.query
+        .filter(LearningPathItem.learning_path_id == latest_path)
+        .order_by(LearningPathItem.week_number)
+        .all()
+    )
+
+
+def unresolved_course_ids(items) -> set:
+    """Course ids of rows created before the timeline was materialized."""
+    return {cid for item in items if item.courses is None for cid in item.course_ids or []}
+
+
+def build_timeline(items, course_lookup, level="beginner", strengths=None, weaknesses=None):
+    strengths = strengths or []
+    weaknesses = weaknesses or []
+    timeline = []
+    for idx, item in enumerate(items, start=1):
+        courses = item.courses
+        if courses is None:
+            courses = [
+                {"id": cid, "title": course_lookup[cid]["title"], "slug": course_lookup[cid]["slug"]}
+                for cid in item.course_ids or [] if cid in course_lookup
+            ]
+        timeline.append({
+            "week": item.week_number,
+            "title": item.title,
+            "description": item.description or generate_week_description(level, strengths, weaknesses, idx),
+            "strengths": strengths,
+            "weaknesses": weaknesses,
+            "course_ids": item.course_ids or [],
+            "courses": courses,
+        })
+    return timeline
@@ -0,0 +1,729 @@
+"""Shared client for every LLM call of the backend (Gemini, OpenAI).
+
+All chat, quiz, recommendation and learning-path prompts go through this
+module instead of configuring a provider SDK per route:
+
+* one ``requests.Session`` with a pooled adapter (``LLM_HTTP_POOL_SIZE``) so
+  connections to the provider are reused between calls;
+* a deadline per call (``timeout``, default ``LLM_TIMEOUT`` seconds) covering
+  rate-limit waits, retries and backoff;
+* retries with exponential backoff and jitter on connection errors and
+  408/429/5xx responses (``LLM_MAX_RETRIES``), honouring ``Retry-After``;
+* a token bucket per provider (``LLM_RATE_PER_SEC`` / ``LLM_RATE_BURST``) and a
+  cap on in-flight calls per model (``LLM_MODEL_CONCURRENCY``);
+* per (provider, model) metrics: calls, errors, retries, latency percentiles
+  and prompt / completion tokens (``llm_stats()``, ``GET /api/admin/llm/stats``).
+
+Providers are backends with ``generate`` / ``stream`` / ``embed`` /
+``list_models``. ``FakeLLMBackend`` answers locally and deterministically; it
+is installed with ``set_llm_backend`` (tests, offline dev) or ``LLM_BACKEND=fake``.
+"""
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+DEFAULT_GEMINI_MODEL = 'gemini-2.5-flash'
+DEFAULT_OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+DEFAULT_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '60'))  # seconds per call, retries included
+MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))  # seconds, doubled per retry
+BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+RATE_PER_SEC = float(os.getenv('LLM_RATE_PER_SEC', '5'))  # per provider; 0 = unlimited
+RATE_BURST = int(os.getenv('LLM_RATE_BURST', '10'))
+MODEL_CONCURRENCY = int(os.getenv('LLM_MODEL_CONCURRENCY', '8'))
+POOL_SIZE = int(os.getenv('LLM_HTTP_POOL_SIZE', '16'))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    retryable = False
+
+
+class LLMUnavailable(LLMError):
+    """The provider is not configured (missing API key)."""
+
+
+class LLMTimeout(LLMError):
+    """The call's deadline passed (while waiting for a slot, rate limit or the provider)."""
+
+
+class LLMConnectionError(LLMError):
+    retryable = True
+
+
+class LLMHTTPError(LLMError):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.retryable = status in RETRYABLE_STATUS
+        self.retry_after = retry_after
+
+
+class LLMResult:
+    __slots__ = ('text', 'provider', 'model', 'input_tokens', 'output_tokens', 'latency', 'attempts')
+
+    def __init__(self, text, provider=None, model=None, input_tokens=None, output_tokens=None):
+        self.text = text or ''
+        self.provider = provider
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.latency = None
+        self.attempts = 0
+
+
+_ENV_LOADED = False
+
+
+def _env(*names):
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        load_dotenv()
+        _ENV_LOADED = True
+    for name in names:
+        value = os.getenv(name)
+        if value:
+            return value
+    return None
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _check_response(resp):
+    if resp.status_code < 400:
+        return resp
+    try:
+        message = resp.json().get('error', {}).get('message') or resp.text
+    except Exception:
+        message = resp.text
+    raise LLMHTTPError(resp.status_code, (message or '')[:300], _retry_after(resp))
+
+
+def _sse_data(resp):
+    """JSON payloads of a provider's ``data:`` event stream."""
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+
+
+class LLMBackend:
+    """One provider. ``session`` is the client's pooled HTTP session; ``timeout`` the time left."""
+
+    name = 'none'
+    default_model = None
+
+    def available(self) -> bool:
+        return False
+
+    def generate(self, session, model, prompt, images, options, timeout) -> LLMResult:
+        raise LLMUnavailable(f"LLM provider {self.name!r} is not available")
+
+    def stream(self, session, model, prompt, options, timeout):
+        """Yield (text, input_tokens, output_tokens); token counts may be None until the end."""
+        result = self.generate(session, model, prompt, None, options, timeout)
+        yield result.text, result.input_tokens, result.output_tokens
+
+    def embed(self, session, model, texts, task_type, timeout):
+        raise LLMUnavailable(f"LLM provider {self.name!r} cannot embed")
+
+    def list_models(self, session, timeout):
+        return []
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini REST API (generateContent, streamGenerateContent, batchEmbedContents)."""
+
+    name = 'gemini'
+    default_model = DEFAULT_GEMINI_MODEL
+
+    def __init__(self, base_url=None):
+        self.base_url = (base_url or os.getenv('GEMINI_API_BASE')
+                         or 'https://generativelanguage.googleapis.com/v1beta').rstrip('/')
+
+    @staticmethod
+    def _key():
+        return _env('GEMINI_API_KEY', 'GOOGLE_API_KEY', 'GOOGLE_GEMINI_KEY')
+
+    def available(self) -> bool:
+        return bool(self._key())
+
+    @staticmethod
+    def _model_path(model):
+        return model if model.startswith('models/') else f'models/{model}'
+
+    def _request(self, session, method, path, timeout, **kwargs):
+        key = self._key()
+        if not key:
+            raise LLMUnavailable("Missing GEMINI_API_KEY / GOOGLE_API_KEY in environment.")
+        resp = session.request(method, f"{self.base_url}/{path}", headers={'x-goog-api-key': key},
+                               timeout=timeout, **kwargs)
+        return _check_response(resp)
+
+    @staticmethod
+    def _body(prompt, images, options):
+        parts = [{'text': prompt}]
+        for image in images or ():
+            parts.append({'inline_data': {
+                'mime_type': image.get('mime_type') or 'image/png',
+                'data': base64.b64encode(image['data']).decode('ascii'),
+            }})
+        body = {'contents': [{'role': 'user', 'parts': parts}]}
+        config = {}
+        if options.get('temperature') is not None:
+            config['temperature'] = options['temperature']
+        if options.get('max_tokens'):
+            config['maxOutputTokens'] = options['max_tokens']
+        if options.get('json'):
+            config['responseMimeType'] = 'application/json'
+        if options.get('thinking_budget') is not None:
+            # 2.5 models spend output tokens on thinking; 0 turns it off on Flash
+            config['thinkingConfig'] = {'thinkingBudget': options['thinking_budget']}
+        if config:
+            body['generationConfig'] = config
+        if options.get('system'):
+            body['systemInstruction'] = {'parts': [{'text': options['system']}]}
+        return body
+
+    @staticmethod
+    def _text(data):
+        texts = []
+        for cand in (data.get('candidates') or [])[:1]:
+            for part in (cand.get('content') or {}).get('parts') or []:
+                if part.get('text'):
+                    texts.append(part['text'])
+        return ''.join(texts)
+
+    @staticmethod
+    def _usage(data):
+        usage = data.get('usageMetadata') or {}
+        return usage.get('promptTokenCount'), usage.get('candidatesTokenCount')
+
+    def generate(self, session, model, prompt, images, options, timeout):
+        resp = self._request(session, 'POST', f"{self._model_path(model)}:generateContent", timeout,
+                             json=self._body(prompt, images, options))
+        data = resp.json()
+        return LLMResult(self._text(data).strip(), self.name, model, *self._usage(data))
+
+    def stream(self, session, model, prompt, options, timeout):
+        resp = self._request(session, 'POST', f"{self._model_path(model)}:streamGenerateContent", timeout,
+                             params={'alt': 'sse'}, json=self._body(prompt, None, options), stream=True)
+        with resp:
+            for data in _sse_data(resp):
+                yield (self._text(data), *self._usage(data))
+
+    def embed(self, session, model, texts, task_type, timeout):
+        path = self._model_path(model)
+        requests_ = []
+        for text in texts:
+            item = {'model': path, 'content': {'parts': [{'text': text}]}}
+            if task_type:
+                item['taskType'] = task_type.upper()
+            requests_.append(item)
+        body = {'requests': requests_}
+        resp = self._request(session, 'POST', f"{path}:batchEmbedContents", timeout, json=body)
+        return [e.get('values') for e in resp.json().get('embeddings') or []]
+
+    def list_models(self, session, timeout):
+        resp = self._request(session, 'GET', 'models', timeout, params={'pageSize': 1000})
+        return [
+            m['name'] for m in resp.json().get('models') or []
+            if 'generateContent' in (m.get('supportedGenerationMethods') or [])
+        ]
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI-compatible REST API (chat/completions, embeddings)."""
+
+    name = 'openai'
+    default_model = DEFAULT_OPENAI_MODEL
+
+    def __init__(self, base_url=None):
+        self.base_url = (base_url or os.getenv('OPENAI_API_BASE') or 'https://api.openai.com/v1').rstrip('/')
+
+    @staticmethod
+    def _key():
+        return _env('OPENAI_API_KEY')
+
+    def available(self) -> bool:
+        return bool(self._key())
+
+    def _request(self, session, method, path, timeout, **kwargs):
+        key = self._key()
+        if not key:
+            raise LLMUnavailable("Missing OPENAI_API_KEY in environment.")
+        resp = session.request(method, f"{self.base_url}/{path}", headers={'Authorization': f'Bearer {key}'},
+                               timeout=timeout, **kwargs)
+        return _check_response(resp)
+
+    @staticmethod
+    def _body(model, prompt, images, options):
+        content = prompt
+        if images:
+            content = [{'type': 'text', 'text': prompt}] + [
+                {'type': 'image_url', 'image_url': {
+                    'url': f"data:{image.get('mime_type') or 'image/png'};base64,"
+                           f"{base64.b64encode(image['data']).decode('ascii')}",
+                }}
+                for image in images
+            ]
+        messages = []
+        if options.get('system'):
+            messages.append({'role': 'system', 'content': options['system']})
+        messages.append({'role': 'user', 'content': content})
+        body = {'model': model, 'messages': messages}
+        if options.get('temperature') is not None:
+            body['temperature'] = options['temperature']
+        if options.get('max_tokens'):
+            body['max_tokens'] = options['max_tokens']
+        if options.get('json'):
+            body['response_format'] = {'type': 'json_object'}
+        return body
+
+    def generate(self, session, model, prompt, images, options, timeout):
+        resp = self._request(session, 'POST', 'chat/completions', timeout,
+                             json=self._body(model, prompt, images, options))
+        data = resp.json()
+        usage = data.get('usage') or {}
+        text = ((data.get('choices') or [{}])[0].get('message') or {}).get('content') or ''
+        return LLMResult(text.strip(), self.name, model, usage.get('prompt_tokens'), usage.get('completion_tokens'))
+
+    def stream(self, session, model, prompt, options, timeout):
+        body = self._body(model, prompt, None, options)
+        body.update(stream=True, stream_options={'include_usage': True})
+        resp = self._request(session, 'POST', 'chat/completions', timeout, json=body, stream=True)
+        with resp:
+            for data in _sse_data(resp):
+                usage = data.get('usage') or {}
+                delta = ((data.get('choices') or [{}])[0].get('delta') or {}).get('content') or ''
+                yield delta, usage.get('prompt_tokens'), usage.get('completion_tokens')
+
+    def embed(self, session, model, texts, task_type, timeout):
+        resp = self._request(session, 'POST', 'embeddings', timeout, json={'model': model, 'input': list(texts)})
+        rows = sorted(resp.json().get('data') or [], key=lambda r: r.get('index', 0))
+        return [r.get('embedding') for r in rows]
+
+    def list_models(self, session, timeout):
+        resp = self._request(session, 'GET', 'models', timeout)
+        return [m['id'] for m in resp.json().get('data') or []]
+
+
+class FakeLLMBackend(LLMBackend):
+    """Local stand-in for any provider: no network, deterministic answers.
+
+    ``responder(prompt, model)`` builds the reply (default: an echo of the
+    prompt); ``latency`` sleeps per call; the first ``failures`` calls raise a
+    retryable 503. Calls are recorded in ``calls`` as (kind, model, prompt) and
+    the options of ``generate`` calls in ``options``.
+    """
+
+    name = 'fake'
+    default_model = 'fake-model'
+
+    def __init__(self, responder=None, latency=0.0, failures=0, dim=16):
+        self.responder = responder
+        self.latency = latency
+        self.failures = failures
+        self.dim = dim
+        self.calls = []
+        self.options = []
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return True
+
+    def _begin(self, kind, model, prompt):
+        with self._lock:
+            self.calls.append((kind, model, prompt))
+            fail = self.failures > 0
+            if fail:
+                self.failures -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise LLMHTTPError(503, 'fake backend unavailable')
+
+    def _reply(self, model, prompt):
+        if self.responder:
+            return self.responder(prompt, model)
+        return f"[{model}] {' '.join((prompt or '').split())[:200]}"
+
+    def generate(self, session, model, prompt, images, options, timeout):
+        self.options.append(dict(options))
+        self._begin('generate', model, prompt)
+        text = self._reply(model, prompt)
+        return LLMResult(text, self.name, model, len((prompt or '').split()), len(text.split()))
+
+    def stream(self, session, model, prompt, options, timeout):
+        self._begin('stream', model, prompt)
+        words = self._reply(model, prompt).split(' ')
+        for word in words[:-1]:
+            yield word + ' ', None, None
+        yield words[-1], len((prompt or '').split()), len(words)
+
+    def embed(self, session, model, texts, task_type, timeout):
+        self._begin('embed', model, '\n'.join(texts))
+        vectors = []
+        for text in texts:
+            vec = [0.0] * self.dim
+            for word in (text or '').lower().split():
+                vec[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1.0
+            norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+            vectors.append([v / norm for v in vec])
+        return vectors
+
+    def list_models(self, session, timeout):
+        return [self.default_model]
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline):
+        """Take one token, waiting for the refill; LLMTimeout if that would pass ``deadline``."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise LLMTimeout("rate limit wait exceeds the call deadline")
+            time.sleep(wait)
+
+
+class ModelMetrics:
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.calls = self.errors = self.retries = self.timeouts = 0
+        self.input_tokens = self.output_tokens = 0
+        self.in_flight = 0
+        self._latencies = deque(maxlen=512)
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, latency, result=None, error=None):
+        with self._lock:
+            self.in_flight -= 1
+            self.calls += 1
+            self._latencies.append(latency)
+            if error is not None:
+                self.errors += 1
+                if isinstance(error, LLMTimeout):
+                    self.timeouts += 1
+            if result is not None:
+                self.input_tokens += result.input_tokens or 0
+                self.output_tokens += result.output_tokens or 0
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    def to_dict(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def pct(p):
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+            return {
+                'provider': self.provider,
+                'model': self.model,
+                'calls': self.calls,
+                'errors': self.errors,
+                'retries': self.retries,
+                'timeouts': self.timeouts,
+                'inFlight': self.in_flight,
+                'inputTokens': self.input_tokens,
+                'outputTokens': self.output_tokens,
+                'latencyP50Ms': pct(0.5),
+                'latencyP95Ms': pct(0.95),
+                'latencyMaxMs': round(latencies[-1] * 1000, 1) if latencies else None,
+            }
+
+
+class LLMClient:
+    def __init__(self, backends=None, rate=RATE_PER_SEC, burst=RATE_BURST, model_concurrency=MODEL_CONCURRENCY,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 timeout=DEFAULT_TIMEOUT):
+        self.backends = backends or {'gemini': GeminiBackend(), 'openai': OpenAIBackend()}
+        self.override = None
+        self.rate = rate
+        self.burst = burst
+        self.model_concurrency = model_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._session = None
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+        self._metrics = {}
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def backend(self, provider='gemini'):
+        if self.override is not None:
+            return self.override
+        backend = self.backends.get(provider)
+        if backend is None:
+            raise LLMUnavailable(f"Unknown LLM provider {provider!r}")
+        return backend
+
+    def available(self, provider='gemini'):
+        try:
+            return self.backend(provider).available()
+        except LLMError:
+            return False
+
+    def _get(self, table, key, factory):
+        with self._lock:
+            value = table.get(key)
+            if value is None:
+                value = table[key] = factory()
+            return value
+
+    def _resolve(self, provider, model):
+        backend = self.backend(provider)
+        model = model or backend.default_model
+        if isinstance(backend, GeminiBackend) and model.startswith('models/'):
+            model = model[len('models/'):]
+        return backend, model
+
+    def metrics(self, provider, model):
+        return self._get(self._metrics, (provider, model), lambda: ModelMetrics(provider, model))
+
+    def _acquire_slot(self, provider, model, deadline):
+        slot = self._get(self._slots, (provider, model),
+                         lambda: threading.BoundedSemaphore(max(1, self.model_concurrency)))
+        if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise LLMTimeout(f"no free {model} slot before the call deadline")
+        return slot
+
+    def _backoff(self, attempt, error, deadline):
+        """Seconds to wait before the next attempt, or None when no retry is allowed."""
+        if not getattr(error, 'retryable', False) or attempt > self.max_retries:
+            return None
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))) * random.uniform(0.5, 1.0)
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            delay = max(delay, retry_after)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _attempts(self, provider, model, call, deadline, metrics):
+        """Run ``call(remaining)`` with rate limiting and retries; returns (value, attempts)."""
+        bucket = self._get(self._buckets, provider, lambda: TokenBucket(self.rate, self.burst))
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMTimeout(f"{provider}/{model} call deadline exceeded")
+            bucket.acquire(deadline)
+            try:
+                return call(max(0.001, deadline - time.monotonic())), attempt
+            except requests.Timeout as exc:
+                raise LLMTimeout(f"{provider}/{model} timed out: {exc}") from exc
+            except requests.RequestException as exc:
+                error = LLMConnectionError(str(exc))
+                cause = exc
+            except LLMError as exc:
+                error = exc
+                cause = None
+            delay = self._backoff(attempt, error, deadline)
+            if delay is None:
+                if cause is not None:
+                    raise error from cause
+                raise error
+            metrics.retried()
+            time.sleep(delay)
+
+    def _run(self, provider, model, timeout, call):
+        backend, model = self._resolve(provider, model)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        metrics = self.metrics(backend.name, model)
+        slot = self._acquire_slot(backend.name, model, deadline)
+        started = time.monotonic()
+        metrics.started()
+        result = error = None
+        try:
+            value, attempts = self._attempts(
+                backend.name, model, lambda remaining: call(backend, model, remaining), deadline, metrics
+            )
+            if isinstance(value, LLMResult):
+                result = value
+                result.attempts = attempts
+                result.latency = time.monotonic() - started
+            return value
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            metrics.finished(time.monotonic() - started, result, error)
+            slot.release()
+
+    def generate(self, prompt, model=None, provider='gemini', timeout=None, images=None, **options):
+        """One completion; returns an LLMResult. ``options``: system, temperature, max_tokens, json."""
+        return self._run(provider, model, timeout,
+                         lambda b, m, remaining: b.generate(self.session, m, prompt, images, options, remaining))
+
+    def generate_text(self, prompt, model=None, provider='gemini', timeout=None, images=None, **options):
+        return self.generate(prompt, model, provider, timeout, images, **options).text
+
+    def embed(self, texts, model, provider='gemini', task_type='retrieval_document', timeout=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self._run(provider, model, timeout,
+                         lambda b, m, remaining: b.embed(self.session, m, texts, task_type, remaining))
+
+    def list_models(self, provider='gemini', timeout=None):
+        return self._run(provider, 'list-models', timeout,
+                         lambda b, m, remaining: b.list_models(self.session, remaining))
+
+    def stream(self, prompt, model=None, provider='gemini', timeout=None, **options):
+        """Yield text chunks. Retries only happen before the first chunk; the deadline covers the whole stream."""
+        backend, model = self._resolve(provider, model)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        metrics = self.metrics(backend.name, model)
+        slot = self._acquire_slot(backend.name, model, deadline)
+        started = time.monotonic()
+        metrics.started()
+        result = LLMResult('', backend.name, model)
+        error = None
+        try:
+            def _open(remaining):
+                chunks = backend.stream(self.session, model, prompt, options, remaining)
+                try:
+                    return chunks, next(chunks)
+                except StopIteration:
+                    return chunks, None
+
+            (chunks, first), result.attempts = self._attempts(backend.name, model, _open, deadline, metrics)
+            pending = [first] if first is not None else []
+            while True:
+                if pending:
+                    text, input_tokens, output_tokens = pending.pop()
+                else:
+                    try:
+                        text, input_tokens, output_tokens = next(chunks)
+                    except StopIteration:
+                        break
+                    except requests.Timeout as exc:
+                        raise LLMTimeout(f"{backend.name}/{model} stream timed out: {exc}") from exc
+                if input_tokens is not None:
+                    result.input_tokens = input_tokens
+                if output_tokens is not None:
+                    result.output_tokens = output_tokens
+                if text:
+                    yield text
+                if time.monotonic() > deadline:
+                    raise LLMTimeout(f"{backend.name}/{model} stream deadline exceeded")
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            metrics.finished(time.monotonic() - started, result, error)
+            slot.release()
+
+    def stats(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [m.to_dict() for m in sorted(metrics, key=lambda m: (m.provider, m.model))]
+
+    def reset_stats(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+_CLIENT = LLMClient()
+if (os.getenv('LLM_BACKEND') or '').strip().lower() == 'fake':
+    _CLIENT.override = FakeLLMBackend()
+
+
+def get_llm_client() -> LLMClient:
+    return _CLIENT
+
+
+def set_llm_backend(backend):
+    """Route every provider to ``backend`` (e.g. FakeLLMBackend); None restores the real providers."""
+    _CLIENT.override = backend
+
+
+def available(provider='gemini'):
+    return _CLIENT.available(provider)
+
+
+def generate(prompt, model=None, provider='gemini', timeout=None, images=None, **options):
+    return _CLIENT.generate(prompt, model, provider, timeout, images, **options)
+
+
+def generate_text(prompt, model=None, provider='gemini', timeout=None, images=None, **options):
+    return _CLIENT.generate_text(prompt, model, provider, timeout, images, **options)
+
+
+def stream(prompt, model=None, provider='gemini', timeout=None, **options):
+    return _CLIENT.stream(prompt, model, provider, timeout, **options)
+
+
+def embed(texts, model, provider='gemini', task_type='retrieval_document', timeout=None):
+    return _CLIENT.embed(texts, model, provider, task_type, timeout)
+
+
+def list_models(provider='gemini', timeout=None):
+    return _CLIENT.list_models(provider, timeout)
+
+
+def llm_stats():
+    return _CLIENT.stats()
@@ -0,0 +1,198 @@
+"""Bounded fan-out of per-lesson quiz generation.
+
+``run_batch`` runs one call per item on a shared worker pool with at most
+``concurrency`` calls of the batch in flight, gives up on an item after
+``item_timeout`` seconds and on the whole batch at ``deadline``; items that did
+not finish get a timeout result instead of failing the batch. Calls that time
+out cannot be interrupted: they finish in the background, their result is
+dropped, and they count as abandoned until then. While
+``QUIZ_BATCH_MAX_ABANDONED`` abandoned calls still hold workers, new items fail
+fast instead of queueing behind them, so a few hung calls cannot starve later
+batches.
+
+``submit_job`` runs the same fan-out in the background for large batches and
+is read with ``get_job``. Queued and running jobs are kept until they finish;
+finished ones move to a bounded registry (``QUIZ_BATCH_JOB_TTL`` seconds).
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from app.utils.cache import BoundedCache
+
+MAX_CONCURRENCY = int(os.getenv('QUIZ_BATCH_MAX_CONCURRENCY', '8'))
+DEFAULT_CONCURRENCY = min(int(os.getenv('QUIZ_BATCH_CONCURRENCY', '4')), MAX_CONCURRENCY)
+LESSON_TIMEOUT = float(os.getenv('QUIZ_LESSON_TIMEOUT', '60'))  # seconds per lesson
+BATCH_DEADLINE = float(os.getenv('QUIZ_BATCH_DEADLINE', '100'))  # seconds, synchronous endpoint
+
+WORKERS = int(os.getenv('QUIZ_BATCH_WORKERS', str(MAX_CONCURRENCY * 2)))
+# Timed-out calls allowed to keep a worker busy; the rest of the pool stays free for new batches
+MAX_ABANDONED = int(os.getenv('QUIZ_BATCH_MAX_ABANDONED', str(max(1, WORKERS - MAX_CONCURRENCY))))
+
+# Shared by all batches so the total number of in-flight LLM calls stays bounded
+_WORKERS = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='quiz-batch')
+_ABANDONED = set()  # futures of timed-out calls still running
+_ABANDONED_LOCK = threading.Lock()
+# Background jobs only coordinate; the LLM calls run on _WORKERS
+_JOB_RUNNERS = ThreadPoolExecutor(max_workers=int(os.getenv('QUIZ_BATCH_JOB_RUNNERS', '2')),
+                                  thread_name_prefix='quiz-batch-job')
+_ACTIVE_JOBS = {}  # job_id -> queued/running BatchJob, never evicted
+_ACTIVE_JOBS_LOCK = threading.Lock()
+_JOBS = BoundedCache('quiz_batch.jobs', maxsize=256, ttl=int(os.getenv('QUIZ_BATCH_JOB_TTL', '3600')))
+
+
+def clamp_concurrency(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_CONCURRENCY
+    return max(1, min(value, MAX_CONCURRENCY))
+
+
+def _release_abandoned(future):
+    with _ABANDONED_LOCK:
+        _ABANDONED.discard(future)
+
+
+def _abandon(future):
+    """Give up on a call: cancel it if it has not started, otherwise track it until it returns."""
+    if future.cancel():
+        return
+    with _ABANDONED_LOCK:
+        _ABANDONED.add(future)
+    future.add_done_callback(_release_abandoned)  # runs at once if it already finished
+
+
+def abandoned_calls():
+    with _ABANDONED_LOCK:
+        return len(_ABANDONED)
+
+
+def run_batch(items, fn, on_timeout, concurrency=None, item_timeout=None, deadline=None, on_result=None):
+    """Run ``fn(item)`` for every item; return results in item order.
+
+    ``on_timeout(item, reason)`` builds the result of an item that did not finish;
+    ``on_result(index, result)`` is called as soon as each result is known.
+    """
+    concurrency = clamp_concurrency(concurrency)
+    item_timeout = item_timeout or LESSON_TIMEOUT
+    results = [None] * len(items)
+    pending = deque(enumerate(items))
+    in_flight = {}  # future -> (index, started_at)
+
+    def _record(index, result):
+        results[index] = result
+        if on_result:
+            on_result(index, result)
+
+    while pending or in_flight:
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            for index, _ in list(in_flight.values()):
+                _record(index, on_timeout(items[index], 'batch deadline exceeded'))
+            for future in in_flight:
+                _abandon(future)
+            for index, item in pending:
+                _record(index, on_timeout(item, 'batch deadline exceeded'))
+            break
+        while pending and len(in_flight) < concurrency:
+            index, item = pending.popleft()
+            if abandoned_calls() >= MAX_ABANDONED:
+                _record(index, on_timeout(item, 'too many stalled calls in progress, try again later'))
+                continue
+            in_flight[_WORKERS.submit(fn, item)] = (index, time.monotonic())
+        if not in_flight:
+            continue
+
+        now = time.monotonic()
+        wake_at = min(started + item_timeout for _, started in in_flight.values())
+        if deadline is not None:
+            wake_at = min(wake_at, deadline)
+        done, _ = wait(list(in_flight), timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            index, _ = in_flight.pop(future)
+            try:
+                _record(index, future.result())
+            except Exception as exc:
+                _record(index, on_timeout(items[index], str(exc)))
+
+        now = time.monotonic()
+        for future, (index, started) in list(in_flight.items()):
+            if now - started >= item_timeout:
+                _abandon(future)
+                del in_flight[future]
+                _record(index, on_timeout(items[index], f'timed out after {item_timeout:g}s'))
+    return results
+
+
+class BatchJob:
+    def __init__(self, total, meta=None):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.meta = meta or {}
+        self.status = 'queued'
+        self.results = [None] * total
+        self.completed = 0
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def record(self, index, result):
+        with self._lock:
+            if self.results[index] is None:
+                self.completed += 1
+            self.results[index] = result
+
+    def to_status(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'total': self.total,
+                'completed': self.completed,
+                'error': self.error,
+                'created_at': self.created_at.isoformat() + 'Z',
+                'finished_at': self.finished_at.isoformat() + 'Z' if self.finished_at else None,
+                **self.meta,
+            }
+
+    def finished_results(self):
+        with self._lock:
+            return [r for r in self.results if r is not None]
+
+
+def submit_job(items, fn, on_timeout, concurrency=None, item_timeout=None, meta=None):
+    """Start a background batch; returns the BatchJob (poll it with ``get_job``)."""
+    job = BatchJob(len(items), meta)
+    with _ACTIVE_JOBS_LOCK:
+        _ACTIVE_JOBS[job.id] = job
+
+    def _run():
+        job.status = 'running'
+        try:
+            run_batch(items, fn, on_timeout, concurrency=concurrency, item_timeout=item_timeout,
+                      on_result=job.record)
+            job.status = 'done'
+        except Exception as exc:
+            job.status = 'failed'
+            job.error = str(exc)
+        finally:
+            job.finished_at = datetime.utcnow()
+            # Finished jobs become evictable (LRU + TTL from now on)
+            _JOBS.set(job.id, job)
+            with _ACTIVE_JOBS_LOCK:
+                _ACTIVE_JOBS.pop(job.id, None)
+
+    _JOB_RUNNERS.submit(_run)
+    return job
+
+
+def get_job(job_id):
+    with _ACTIVE_JOBS_LOCK:
+        job = _ACTIVE_JOBS.get(job_id)
+    return job if job is not None else _JOBS.get(job_id)
@@ -0,0 +1,163 @@
+"""Persistent, content-addressed cache of AI-generated quizzes.
+
+A generation is identified by a SHA-256 of (prompt template version, lesson
+title, num_questions, difficulty, model); the parsed question array is stored
+in the ``ai_quiz_cache`` table under that key, so repeated generations skip the
+Gemini round trip and the parsing, and survive restarts and are shared between
+workers. Bump ``QUIZ_PROMPT_VERSION`` in ``app.routes.AIQuiz`` whenever the
+prompt or the parsing changes so old entries stop matching.
+
+Entries expire after ``QUIZ_CACHE_TTL`` seconds; when the table grows past
+``QUIZ_CACHE_MAX_ENTRIES`` rows the least recently used ones are deleted.
+Hit / miss counters are per worker and show up in ``GET /api/admin/cache/stats``.
+The cache is best effort: a database error is logged and treated as a miss.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.models import db
+from app.models.ai_quiz_cache import AIQuizCacheEntry
+from app.utils.cache import register_cache
+
+QUIZ_CACHE_TTL = int(os.getenv('QUIZ_CACHE_TTL', str(30 * 24 * 3600)))  # seconds, 0 = no expiry
+QUIZ_CACHE_MAX_ENTRIES = int(os.getenv('QUIZ_CACHE_MAX_ENTRIES', '5000'))
+
+
+def normalize_title(title):
+    """Case and whitespace differences in the lesson title do not change the quiz."""
+    return ' '.join((title or '').split()).casefold()
+
+
+def quiz_cache_key(prompt_version, lesson_title, num_questions, difficulty, model):
+    parts = [str(prompt_version), normalize_title(lesson_title), int(num_questions), difficulty, model]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class QuizCache:
+    name = 'ai_quiz.generations'
+
+    def __init__(self, ttl=QUIZ_CACHE_TTL, max_entries=QUIZ_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.bypasses = 0
+        self.evictions = self.expirations = self.errors = 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for attr, n in deltas.items():
+                setattr(self, attr, getattr(self, attr) + n)
+
+    def get(self, key):
+        """Cached question list for ``key``, or None."""
+        try:
+            entry = db.session.get(AIQuizCacheEntry, key)
+            now = datetime.utcnow()
+            if entry is not None and entry.expires_at is not None and entry.expires_at <= now:
+                db.session.delete(entry)
+                db.session.commit()
+                self._count(expirations=1)
+                entry = None
+            if entry is None:
+                self._count(misses=1)
+                return None
+            questions = list(entry.questions or [])
+            (
+                AIQuizCacheEntry.query
+                .filter(AIQuizCacheEntry.cache_key == key)
+                .update({
+                    AIQuizCacheEntry.hit_count: AIQuizCacheEntry.hit_count + 1,
+                    AIQuizCacheEntry.last_used_at: now,
+                }, synchronize_session=False)
+            )
+            db.session.commit()
+            self._count(hits=1)
+            return questions
+        except Exception as e:
+            db.session.rollback()
+            self._count(misses=1, errors=1)
+            print(f"Quiz cache lookup failed: {e}")
+            return None
+
+    def put(self, key, questions, prompt_version, lesson_title, num_questions, difficulty, model):
+        """Store (or replace) the questions of one generation, then enforce TTL and size limits."""
+        if not questions:
+            return
+        now = datetime.utcnow()
+        try:
+            entry = db.session.get(AIQuizCacheEntry, key)
+            if entry is None:
+                entry = AIQuizCacheEntry(cache_key=key, hit_count=0, created_at=now)
+                db.session.add(entry)
+            entry.prompt_version = str(prompt_version)
+            entry.lesson_title = (lesson_title or '')[:255]
+            entry.num_questions = num_questions
+            entry.difficulty = difficulty
+            entry.model = model
+            entry.questions = questions
+            entry.last_used_at = now
+            entry.expires_at = now + timedelta(seconds=self.ttl) if self.ttl else None
+            db.session.commit()
+            self._count(stores=1)
+            self._evict(now)
+        except Exception as e:
+            db.session.rollback()
+            self._count(errors=1)
+            print(f"Quiz cache store failed: {e}")
+
+    def _evict(self, now):
+        expired = (
+            AIQuizCacheEntry.query
+            .filter(AIQuizCacheEntry.expires_at.isnot(None), AIQuizCacheEntry.expires_at <= now)
+            .delete(synchronize_session=False)
+        )
+        evicted = 0
+        overflow = AIQuizCacheEntry.query.count() - self.max_entries
+        if overflow > 0:
+            keys = [
+                k for (k,) in AIQuizCacheEntry.query
+                .with_entities(AIQuizCacheEntry.cache_key)
+                .order_by(AIQuizCacheEntry.last_used_at.asc())
+                .limit(overflow)
+                .all()
+            ]
+            evicted = (
+                AIQuizCacheEntry.query
+                .filter(AIQuizCacheEntry.cache_key.in_(keys))
+                .delete(synchronize_session=False)
+            )
+        db.session.commit()
+        self._count(expirations=expired, evictions=evicted)
+
+    def record_bypass(self):
+        self._count(bypasses=1)
+
+    def stats(self):
+        try:
+            size = AIQuizCacheEntry.query.count()
+        except Exception:
+            db.session.rollback()
+            size = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': size,
+                'maxsize': self.max_entries,
+                'ttl': self.ttl or None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stores': self.stores,
+                'bypasses': self.bypasses,
+                'errors': self.errors,
+            }
+
+
+quiz_cache = QuizCache()
+register_cache(quiz_cache)
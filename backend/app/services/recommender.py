@@ -1,38 +1,36 @@
-from app.models import db
-from app.models.model import Course, Category, Topic, Instructor
-import os, math
+from app.models.model import Course
+from app.services import llm_client
+from app.services.course_index import ensure_course_index
+from app.services.course_keyword_index import (
+    course_text,
+    ensure_course_keyword_index,
+    normalize as _norm,
+    tokenize as _tokenize,
+)
+from app.utils.cache import BoundedCache
+import hashlib
+import heapq
+import os
+import threading
+import numpy as np
 try:
-    import google.generativeai as genai  # type: ignore
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
 except Exception:  # pragma: no cover
-    genai = None
+    TfidfVectorizer = TruncatedSVD = None
 
 _GEMINI_EMBED_MODEL = "text-embedding-004"
-_GEMINI_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or os.getenv("GOOGLE_GEMINI_KEY")
-_EMBED_CACHE = {}  # course_id -> list[float]
-_QUERY_CACHE = {}  # query string -> list[float]
-_GEMINI_READY = False
-
-def _init_gemini():
-    global _GEMINI_READY
-    if _GEMINI_READY:
-        return
-    if genai and _GEMINI_KEY:
-        try:
-            genai.configure(api_key=_GEMINI_KEY)
-            _GEMINI_READY = True
-        except Exception:
-            _GEMINI_READY = False
-
-def _norm(s: str) -> str:
-    return (s or '').strip().lower()
-
-
-def _tokenize(s: str):
-    s = _norm(s)
-    for ch in ',./\\;:\"\'|()[]{}!@#$%^&*?-_+\n\r\t':
-        s = s.replace(ch, ' ')
-    return [w for w in s.split() if w]
-
+# Courses scored exactly per semantic query (top by similarity + top by keyword hits)
+SEMANTIC_CANDIDATES = int(os.getenv('RECOMMENDER_SEMANTIC_CANDIDATES', '50'))
+# Query tokens held by more courses than this do not pick keyword candidates
+# (they still count in the keyword score of the shortlist)
+KEYWORD_CANDIDATE_MAX_DF = int(os.getenv('RECOMMENDER_KEYWORD_CANDIDATE_MAX_DF', '2000'))
+# (model id, normalized query) -> list[float]
+_QUERY_CACHE = BoundedCache(
+    'recommender.query_embeddings',
+    maxsize=int(os.getenv('RECOMMENDER_QUERY_CACHE_SIZE', '2048')),
+    ttl=int(os.getenv('RECOMMENDER_QUERY_CACHE_TTL', '86400')),
+)
 
 def recommend_courses(level=None, major=None, topic=None, language=None, limit=6):
     """
@@ -40,232 +38,340 @@ def recommend_courses(level=None, major=None, topic=None, language=None, limit=6
     - Filter by level/category/topic when provided.
     - Score courses by keyword matches in title/description/categories/topics.
     - Ensure at least 3 results by relaxing filters if needed.
+    Filters are id-set intersections and keyword hits are postings lookups
+    on the in-memory course keyword index; no per-request course scan.
     """
     level = _norm(level) if level else ''
     major = _norm(major) if major else ''
     topic = _norm(topic) if topic else ''
     language = _norm(language) if language else ''
 
-    def base_query():
-        q = Course.query
-        if language:
-            q = q.filter(db.func.lower(Course.language) == language)
-        if level:
-            q = q.filter(db.func.lower(Course.level) == level)
-        if major:
-            q = q.join(Course.categories)
-            q = q.filter(db.or_(db.func.lower(Category.name) == major, db.func.lower(Category.slug) == major))
-        if topic:
-            q = q.join(Course.topics)
-            q = q.filter(db.or_(db.func.lower(Topic.name) == topic, db.func.lower(Topic.slug) == topic))
-        return q.distinct()
-
-    def to_dict(c: Course):
-        instructor_name = None
-        if c.instructor_id:
-            ins = Instructor.query.get(c.instructor_id)
-            if ins and getattr(ins, 'user', None):
-                instructor_name = ins.user.full_name
-        return {
-            'id': c.id,
-            'title': c.title,
-            'description': c.description,
-            'level': c.level,
-            'price': float(c.price) if c.price is not None else 0,
-            'currency': c.currency,
-            'categories': [cat.name for cat in getattr(c, 'categories', []) if getattr(cat, 'name', None)],
-            'topics': [t.name for t in getattr(c, 'topics', []) if getattr(t, 'name', None)],
-            'instructorName': instructor_name,
-        }
-
-    def score_course(c: Course) -> float:
-        title = _norm(getattr(c, 'title', ''))
-        desc = _norm(getattr(c, 'description', ''))
-        cat_names = ' '.join([_norm(getattr(cat, 'name', '')) for cat in getattr(c, 'categories', [])])
-        top_names = ' '.join([_norm(getattr(t, 'name', '')) for t in getattr(c, 'topics', [])])
-        text_blob = ' '.join([title, desc, cat_names, top_names])
-        tokens = set(_tokenize(text_blob))
-        score = 0.0
-        # Keyword hits
-        for kw in [major, topic]:
-            if kw:
-                if kw in tokens:
-                    score += 3.0
-                else:
-                    # partial containment
-                    if kw and kw in text_blob:
-                        score += 1.5
+    index = ensure_course_keyword_index()
+    keyword_hits = [index.keyword_hits(kw) for kw in (major, topic) if kw]
+
+    def score_doc(doc) -> float:
+        # Keyword hits (exact token = field weight, partial containment = half)
+        score = sum(hits.get(doc['id'], 0.0) for hits in keyword_hits)
         # Level bonus
-        try:
-            if level and _norm(getattr(c, 'level', '')) == level:
-                score += 1.0
-        except Exception:
-            pass
+        if level and doc['level'] == level:
+            score += 1.0
         # Recentness bonus (optional via created_at)
-        try:
-            if getattr(c, 'created_at', None):
-                score += 0.2
-        except Exception:
-            pass
+        if doc['createdAt']:
+            score += 0.2
         return score
 
-    def apply_language_filter(query):
-        if language:
-            return query.filter(db.func.lower(Course.language) == language)
-        return query
+    def ranked(ids):
+        docs = index.documents(ids)
+        return [d['id'] for d in sorted(docs, key=lambda d: (-score_doc(d), d['id']))]
 
     # First pass with all filters
-    q = base_query()
-    courses = q.all()
-    scored = sorted(courses, key=score_course, reverse=True)
+    scored = ranked(index.filter_ids(language=language, level=level, major=major, topic=topic))
 
     # Fallbacks to ensure at least 3
     if len(scored) < 3:
         # Relax topic filter but keep level and language
-        q2 = apply_language_filter(Course.query)
-        if level:
-            q2 = q2.filter(db.func.lower(Course.level) == level)
-        if major:
-            q2 = q2.join(Course.categories).filter(db.or_(db.func.lower(Category.name) == major, db.func.lower(Category.slug) == major))
-        extra = q2.distinct().all()
-        scored = sorted(extra, key=score_course, reverse=True)
+        scored = ranked(index.filter_ids(language=language, level=level, major=major))
     if len(scored) < 3:
         # Relax level but keep major/topic and language
-        q3 = apply_language_filter(Course.query)
-        if major:
-            q3 = q3.join(Course.categories).filter(db.or_(db.func.lower(Category.name) == major, db.func.lower(Category.slug) == major))
-        if topic:
-            q3 = q3.join(Course.topics).filter(db.or_(db.func.lower(Topic.name) == topic, db.func.lower(Topic.slug) == topic))
-        scored = sorted(q3.distinct().all(), key=score_course, reverse=True)
+        scored = ranked(index.filter_ids(language=language, major=major, topic=topic))
 
     # Final slice
-    result = [to_dict(c) for c in scored[:max(limit, 3)]]
+    picked = scored[:max(limit, 3)]
+    result = [index.payload(cid) for cid in picked]
     # If still less than 3, append more globally by relevance
     if len(result) < 3:
-        rest = apply_language_filter(Course.query).order_by(Course.created_at.desc()).limit(10).all()
-        rest_scored = sorted(rest, key=score_course, reverse=True)
-        for c in rest_scored:
-            if c.id not in {r['id'] for r in result}:
-                result.append(to_dict(c))
+        seen = set(picked)
+        for cid in ranked(index.most_recent(index.filter_ids(language=language), 10)):
+            if cid not in seen:
+                result.append(index.payload(cid))
                 if len(result) >= 3:
                     break
     return result
 
-# ===================== SEMANTIC GEMINI RECOMMENDER =====================
-
-def _cosine(a, b):
-    try:
-        if not a or not b:
-            return 0.0
-        num = sum(x*y for x,y in zip(a,b))
-        da = math.sqrt(sum(x*x for x in a))
-        db = math.sqrt(sum(y*y for y in b))
-        if da == 0 or db == 0:
-            return 0.0
-        return num / (da*db)
-    except Exception:
-        return 0.0
-
-def _course_text(c: Course) -> str:
-    cats = ' '.join([getattr(cat,'name','') for cat in getattr(c,'categories',[])])
-    tops = ' '.join([getattr(t,'name','') for t in getattr(c,'topics',[])])
-    return ' | '.join(filter(None,[getattr(c,'title',''), getattr(c,'description',''), cats, tops, getattr(c,'level','')]))[:1500]
-
-def _embed_text(text: str):
-    _init_gemini()
-    if not _GEMINI_READY:
-        return None
-    text = (text or '').strip()
-    if not text:
-        return None
-    try:
-        emb = genai.embed_content(model=_GEMINI_EMBED_MODEL, content=text, task_type="retrieval_document")
-        vec = emb.get('embedding') or emb.get('data', [{}])[0].get('embedding')
-        return vec
-    except Exception:
+# ===================== SEMANTIC RECOMMENDER =====================
+
+
+class EmbeddingBackend:
+    """Turns course texts and user queries into vectors of one fixed space.
+
+    ``model_id`` identifies that space; persisted course vectors computed with
+    another model id are treated as stale and recomputed.
+    """
+    name = 'none'
+
+    def available(self) -> bool:
+        return False
+
+    def model_id(self) -> str:
+        return self.name
+
+    def warm(self) -> bool:
+        """Prepare the backend at startup; True if stored vectors may need recomputing."""
+        return False
+
+    def embed_documents(self, texts):
+        return [None] * len(texts)
+
+    def embed_query(self, text):
         return None
 
-def _get_course_embedding(c: Course):
-    cid = c.id
-    if cid in _EMBED_CACHE:
-        return _EMBED_CACHE[cid]
-    vec = _embed_text(_course_text(c))
-    if vec:
-        _EMBED_CACHE[cid] = vec
-    return vec
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    name = 'gemini'
+
+    def __init__(self, model=_GEMINI_EMBED_MODEL):
+        self.model = model
+
+    def available(self) -> bool:
+        return llm_client.available('gemini')
+
+    def model_id(self) -> str:
+        return f"gemini:{self.model}"
+
+    def _embed_one(self, text):
+        try:
+            return llm_client.embed([text], self.model)[0]
+        except Exception:
+            return None
+
+    def embed_documents(self, texts):
+        non_empty = [t for t in texts if t]
+        if not non_empty or not self.available():
+            return [None] * len(texts)
+        vectors = None
+        try:
+            batch = llm_client.embed(non_empty, self.model)
+            if isinstance(batch, list) and len(batch) == len(non_empty) and all(isinstance(v, list) for v in batch):
+                vectors = iter(batch)
+        except Exception:
+            vectors = None
+        if vectors is None:
+            # Batch call not supported / failed: one call per text
+            vectors = iter([self._embed_one(t) for t in non_empty])
+        return [next(vectors) if t else None for t in texts]
+
+    def embed_query(self, text):
+        if not text or not self.available():
+            return None
+        return self._embed_one(text)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """CPU-only TF-IDF + truncated SVD (LSA) embeddings fitted on the course corpus.
+
+    Deterministic for a given corpus, no network calls. The model is fitted on
+    the course texts at startup (or on first use); courses created afterwards
+    are projected with the existing model. Its model id carries a fingerprint
+    of the fitted corpus, so a refit marks stored vectors stale.
+    """
+    name = 'local'
+
+    def __init__(self, n_components=None, max_features=None):
+        self.n_components = n_components or int(os.getenv('RECOMMENDER_LOCAL_DIM', '128'))
+        self.max_features = max_features or int(os.getenv('RECOMMENDER_LOCAL_MAX_FEATURES', '50000'))
+        self._lock = threading.Lock()
+        self._model = None  # (vectorizer, svd or None, fingerprint)
+
+    def available(self) -> bool:
+        return TfidfVectorizer is not None
+
+    def model_id(self) -> str:
+        model = self._ensure_model()
+        return f"local-lsa:{model[2] if model else 'unfitted'}"
+
+    def fit(self, texts):
+        texts = [t for t in texts if t and t.strip()]
+        if not texts or TfidfVectorizer is None:
+            return False
+        vectorizer = TfidfVectorizer(
+            lowercase=True, strip_accents='unicode', sublinear_tf=True,
+            ngram_range=(1, 2), max_features=self.max_features,
+        )
+        try:
+            tfidf = vectorizer.fit_transform(texts)
+        except ValueError:  # empty vocabulary (stop words / punctuation only)
+            return False
+        n_components = min(self.n_components, tfidf.shape[0] - 1, tfidf.shape[1] - 1)
+        svd = None
+        if n_components >= 2:
+            svd = TruncatedSVD(n_components=n_components, random_state=42)
+            svd.fit(tfidf)
+        digest = hashlib.sha256()
+        digest.update(f"{self.n_components}:{self.max_features}".encode('utf-8'))
+        for t in sorted(texts):
+            digest.update(t.encode('utf-8'))
+            digest.update(b'\0')
+        with self._lock:
+            self._model = (vectorizer, svd, digest.hexdigest()[:12])
+        return True
+
+    def _fit_from_db(self):
+        from sqlalchemy.orm import selectinload
+        courses = Course.query.options(selectinload(Course.categories), selectinload(Course.topics)).all()
+        return self.fit([course_text(c) for c in courses])
+
+    def _ensure_model(self):
+        if self._model is None:
+            try:
+                self._fit_from_db()
+            except Exception as exc:
+                print(f"[recommender] local embedding fit failed: {exc}")
+        return self._model
+
+    def warm(self) -> bool:
+        previous = self._model[2] if self._model else None
+        self._fit_from_db()
+        return bool(self._model) and self._model[2] != previous
+
+    def _transform(self, texts):
+        model = self._ensure_model()
+        if not model:
+            return None
+        vectorizer, svd, _ = model
+        matrix = vectorizer.transform(texts)
+        dense = svd.transform(matrix) if svd is not None else matrix.toarray()
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (dense / norms).astype(np.float32)
+
+    def embed_documents(self, texts):
+        vectors = self._transform([t or '' for t in texts])
+        if vectors is None:
+            return [None] * len(texts)
+        return [v.tolist() if t and v.any() else None for t, v in zip(texts, vectors)]
+
+    def embed_query(self, text):
+        if not text:
+            return None
+        return self.embed_documents([text])[0]
+
+
+_BACKENDS = {
+    'gemini': GeminiEmbeddingBackend,
+    'local': LocalEmbeddingBackend,
+    'none': EmbeddingBackend,
+}
+_BACKEND = None
+
+
+def _backend_from_env():
+    choice = _norm(os.getenv('RECOMMENDER_EMBED_BACKEND', 'auto'))
+    if choice == 'auto':
+        # Prefer Gemini when a key is configured, otherwise stay fully offline
+        choice = 'gemini' if llm_client.available('gemini') else 'local'
+    if choice not in _BACKENDS:
+        print(f"[recommender] unknown RECOMMENDER_EMBED_BACKEND={choice!r}, using keyword-only scoring")
+        choice = 'none'
+    return _BACKENDS[choice]()
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    global _BACKEND
+    if _BACKEND is None:
+        _BACKEND = _backend_from_env()
+    return _BACKEND
+
+
+def set_embedding_backend(backend):
+    """Swap the active backend (tests, benchmarks); clears cached query vectors."""
+    global _BACKEND
+    _BACKEND = backend
+    _QUERY_CACHE.clear()
+
+
+def embedding_model_id() -> str:
+    """Identifies the vector space; stored course vectors from another model are recomputed."""
+    return get_embedding_backend().model_id()
+
+def embedding_available() -> bool:
+    return get_embedding_backend().available()
+
+def embed_documents(texts):
+    """Embed a batch of course texts; returns one vector (or None) per text."""
+    return get_embedding_backend().embed_documents([(t or '').strip() for t in texts])
+
+def normalize_query(query: str) -> str:
+    """Canonical form used as cache key: case-folded, single spaces, no trailing punctuation."""
+    return ' '.join((query or '').casefold().split()).strip(' ?!.,;:')
 
 def _get_query_embedding(query: str):
-    q = (query or '').strip()
+    q = normalize_query(query)
     if not q:
         return None
-    if q in _QUERY_CACHE:
-        return _QUERY_CACHE[q]
-    vec = _embed_text(q)
-    if vec:
-        _QUERY_CACHE[q] = vec
-    return vec
-
-def _to_dict(c: Course, semantic=False):
-    instructor_name = None
-    if c.instructor_id:
-        ins = Instructor.query.get(c.instructor_id)
-        if ins and getattr(ins,'user',None):
-            instructor_name = ins.user.full_name
-    return {
-        'id': c.id,
-        'title': c.title,
-        'description': c.description,
-        'level': c.level,
-        'price': float(c.price) if c.price is not None else 0,
-        'currency': c.currency,
-        'categories': [cat.name for cat in getattr(c,'categories',[]) if getattr(cat,'name',None)],
-        'topics': [t.name for t in getattr(c,'topics',[]) if getattr(t,'name',None)],
-        'instructorName': instructor_name,
-        '_semantic': semantic,
-    }
+    backend = get_embedding_backend()
+    return _QUERY_CACHE.get_or_set((backend.model_id(), q), lambda: backend.embed_query(q) or None)
+
+def _keyword_scores(query: str, texts):
+    """Keyword score of each course text: whole query contained +2.0, each contained token +0.5."""
+    scores = np.zeros(len(texts), dtype=np.float32)
+    blob = _norm(query)
+    if not blob:
+        return scores
+    tokens = set(_tokenize(blob))
+    for i, text in enumerate(texts):
+        text_blob = _norm(text)
+        kw_score = 0.0
+        if blob in text_blob:
+            kw_score += 2.0
+        for tk in tokens:
+            if tk and tk in text_blob:
+                kw_score += 0.5
+        scores[i] = kw_score
+    return scores
+
+def _keyword_candidates(index, query, allowed_ids, k):
+    """Up to ``k`` of ``allowed_ids`` holding the most selective query tokens, from the index postings."""
+    counts = {}
+    for tk in set(_tokenize(query)):
+        if index.document_frequency(tk) > KEYWORD_CANDIDATE_MAX_DF:
+            continue
+        for cid in index.keyword_hits(tk):
+            if cid in allowed_ids:
+                counts[cid] = counts.get(cid, 0) + 1
+    return heapq.nlargest(k, counts, key=lambda cid: (counts[cid], -cid))
 
 def semantic_recommend(query: str, limit=6, level=None, major=None, topic=None):
+    """Blend of cosine similarity (0.6) and keyword score (0.4) over a shortlist.
+
+    The shortlist is the top ``SEMANTIC_CANDIDATES`` courses of the embedding
+    index (one matrix-vector product + argpartition) plus as many keyword
+    matches from the postings; only those are scored exactly, so the work
+    per request does not grow with the catalog.
+    """
     query = (query or '').strip()
     if not query:
         return []
     # Try semantic embedding; if fails fallback to keyword heuristic
     q_vec = _get_query_embedding(query)
     # Pre-filter by structured fields if provided to narrow set
-    base = Course.query
-    if level:
-        base = base.filter(db.func.lower(Course.level) == _norm(level))
-    if major:
-        base = base.join(Course.categories).filter(db.or_(db.func.lower(Category.name) == _norm(major), db.func.lower(Category.slug) == _norm(major)))
-    if topic:
-        base = base.join(Course.topics).filter(db.or_(db.func.lower(Topic.name) == _norm(topic), db.func.lower(Topic.slug) == _norm(topic)))
-    courses = base.distinct().all()
+    index = ensure_course_keyword_index()
+    ids = index.filter_ids(level=_norm(level), major=_norm(major), topic=_norm(topic))
     # Fallback enlarge set if too small
-    if len(courses) < 3:
-        courses = Course.query.all()
+    if len(ids) < 3:
+        ids = index.filter_ids()
 
-    scored = []
-    for c in courses:
-        # keyword score reuse
-        kw_score = 0.0
-        blob = _norm(query)
-        text_blob = _norm(_course_text(c))
-        if blob:
-            if blob in text_blob:
-                kw_score += 2.0
-            # split tokens
-            for tk in set(_tokenize(blob)):
-                if tk and tk in text_blob:
-                    kw_score += 0.5
-        if q_vec:
-            c_vec = _get_course_embedding(c)
-            sim = _cosine(q_vec, c_vec) if c_vec else 0.0
-        else:
-            sim = 0.0
-        blend = sim * 0.6 + kw_score * 0.4
-        scored.append((blend, sim, kw_score, c))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    result = [_to_dict(c, semantic=True) for (blend, sim, kw, c) in scored[:limit]]
+    k_candidates = max(limit, SEMANTIC_CANDIDATES)
+    shortlist = []
+    if q_vec:
+        # Only precomputed vectors are read here; see app.services.course_embeddings
+        allowed = ids if len(ids) < len(index) else None  # no filter: skip the id mask
+        shortlist = [cid for cid, _ in ensure_course_index().search(q_vec, k_candidates, allowed_ids=allowed)]
+    candidates = sorted(set(shortlist).union(_keyword_candidates(index, query, ids, k_candidates)))
+    docs = index.documents(candidates)
+
+    kw_scores = _keyword_scores(query, [d['text'] for d in docs])
+    if q_vec:
+        sims = ensure_course_index().score(q_vec, [d['id'] for d in docs])
+    else:
+        sims = np.zeros(len(docs), dtype=np.float32)
+    blend = sims * 0.6 + kw_scores * 0.4
+
+    k = min(limit, len(docs))
+    result = []
+    if k > 0:
+        top = np.argpartition(-blend, k - 1)[:k]
+        top = top[np.argsort(-blend[top], kind='stable')]
+        result = [{**index.payload(docs[i]['id']), '_semantic': True} for i in top]
     if len(result) < max(3, limit):
         # complement with heuristic recommend
         extra = recommend_courses(level=level, major=major, topic=topic, limit=limit)
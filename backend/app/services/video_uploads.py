@@ -0,0 +1,416 @@
+"""Resumable lecture-video uploads, pushed to the video storage in the background.
+
+The browser sends the file in parts to an upload session; every part is
+appended to a spool file on local disk (``VIDEO_SPOOL_DIR``) and the session
+remembers how many bytes it holds, so a dropped connection resumes from
+``received`` instead of starting over. Once the file is complete a background
+worker pushes it to the storage in ``VIDEO_PUSH_CHUNK_SIZE`` parts (as
+``cloudinary.uploader.upload_large`` does), retrying each part with backoff,
+and records progress that the job-status endpoint reports.
+
+Session state lives in ``job.json`` next to the spool file, so any worker of
+the host can report it. ``sweep_sessions`` (at startup, then every
+``VIDEO_SWEEP_INTERVAL`` seconds via ``start_sweeper``) requeues pushes left
+queued/uploading by a worker that died (no progress for
+``VIDEO_STALE_JOB_SECONDS``) and deletes spool directories untouched for
+``VIDEO_SPOOL_TTL``. Storage backends implement
+``VideoStorage``; ``VIDEO_STORAGE`` selects ``cloudinary`` (default) or
+``local`` (``LocalVideoStorage``, a filesystem stand-in for tests and offline
+dev); ``set_video_storage`` installs another one.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from werkzeug.utils import secure_filename
+
+from app.utils.uploads import UploadError
+
+SPOOL_DIR = Path(os.getenv(
+    'VIDEO_SPOOL_DIR', str(Path(__file__).resolve().parents[2] / 'uploads' / 'video_spool')
+))
+MAX_VIDEO_SIZE = int(os.getenv('VIDEO_UPLOAD_MAX_BYTES', str(4 * 1024 ** 3)))
+PUSH_CHUNK_SIZE = int(os.getenv('VIDEO_PUSH_CHUNK_SIZE', str(20 * 1024 * 1024)))  # Cloudinary needs >= 5 MB
+PUSH_MAX_RETRIES = int(os.getenv('VIDEO_PUSH_MAX_RETRIES', '3'))
+PUSH_BACKOFF = float(os.getenv('VIDEO_PUSH_BACKOFF', '2'))  # seconds, doubled per retry
+RECEIVE_CHUNK = 1024 * 1024
+STALE_JOB_AFTER = int(os.getenv('VIDEO_STALE_JOB_SECONDS', '1800'))  # no saved progress for this long
+SPOOL_TTL = int(os.getenv('VIDEO_SPOOL_TTL', str(7 * 24 * 3600)))
+SWEEP_INTERVAL = int(os.getenv('VIDEO_SWEEP_INTERVAL', '3600'))
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'm4v', 'webm', 'mkv', 'avi', 'mpeg', 'mpg', 'ogv', 'wmv', 'flv', '3gp'}
+
+_PUSH_RUNNERS = ThreadPoolExecutor(max_workers=int(os.getenv('VIDEO_PUSH_WORKERS', '2')),
+                                   thread_name_prefix='video-push')
+_SESSION_LOCKS = {}
+_SESSION_LOCKS_GUARD = threading.Lock()
+_SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+_ACTIVE_PUSHES = set()  # sessions this process is pushing right now
+_SWEEPER = None
+
+
+# ---------- storage backends ----------
+
+class VideoStorage:
+    """Chunked upload target. ``begin`` returns a JSON-serializable state that is
+    saved with the session and passed back to every ``put_chunk`` call."""
+
+    name = 'base'
+
+    def begin(self, filename, size):
+        raise NotImplementedError
+
+    def put_chunk(self, state, offset, data, size):
+        """Send ``data`` (bytes at ``offset`` of ``size``). Returns ``{'public_id', 'url'}``
+        after the last part, None before; may update ``state``."""
+        raise NotImplementedError
+
+
+class CloudinaryVideoStorage(VideoStorage):
+    name = 'cloudinary'
+
+    def begin(self, filename, size):
+        return {
+            'upload_id': uuid.uuid4().hex,
+            'public_id': os.path.splitext(filename)[0],
+            'filename': filename,
+        }
+
+    def put_chunk(self, state, offset, data, size):
+        from app.utils.cloudinary_upload import upload_video_part
+
+        result = upload_video_part(data, state['filename'], state['upload_id'], offset, size, state['public_id'])
+        state['public_id'] = result.get('public_id') or state['public_id']
+        if offset + len(data) < size:
+            return None
+        return {'public_id': result.get('public_id'), 'url': result.get('secure_url') or result.get('url')}
+
+
+class LocalVideoStorage(VideoStorage):
+    """Writes videos under ``root``; served by whoever serves ``base_url``."""
+
+    name = 'local'
+
+    def __init__(self, root=None, base_url=None):
+        self.root = Path(root or os.getenv('VIDEO_STORAGE_LOCAL_DIR', str(SPOOL_DIR.parent / 'videos')))
+        self.base_url = (base_url or os.getenv('VIDEO_STORAGE_LOCAL_URL', '/uploads/videos')).rstrip('/')
+
+    def begin(self, filename, size):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return {'upload_id': uuid.uuid4().hex, 'filename': filename}
+
+    def put_chunk(self, state, offset, data, size):
+        part = self.root / f".{state['upload_id']}.part"
+        with part.open('r+b' if part.exists() else 'wb') as f:
+            f.seek(offset)
+            f.write(data)
+        if offset + len(data) < size:
+            return None
+        stem, ext = os.path.splitext(state['filename'])
+        public_id = f"{stem}-{state['upload_id'][:8]}"
+        os.replace(part, self.root / f"{public_id}{ext}")
+        return {'public_id': public_id, 'url': f"{self.base_url}/{public_id}{ext}"}
+
+
+_STORAGES = {
+    'cloudinary': CloudinaryVideoStorage,
+    'local': LocalVideoStorage,
+}
+_STORAGE = None
+
+
+def get_video_storage():
+    global _STORAGE
+    if _STORAGE is None:
+        choice = (os.getenv('VIDEO_STORAGE') or 'cloudinary').strip().lower()
+        if choice not in _STORAGES:
+            print(f"[video_uploads] unknown VIDEO_STORAGE={choice!r}, using cloudinary")
+            choice = 'cloudinary'
+        _STORAGE = _STORAGES[choice]()
+    return _STORAGE
+
+
+def set_video_storage(storage):
+    """Swap the storage backend (tests); None re-reads VIDEO_STORAGE."""
+    global _STORAGE
+    _STORAGE = storage
+
+
+# ---------- upload sessions ----------
+
+def _session_lock(session_id):
+    with _SESSION_LOCKS_GUARD:
+        return _SESSION_LOCKS.setdefault(session_id, threading.Lock())
+
+
+def _drop_session_lock(session_id):
+    with _SESSION_LOCKS_GUARD:
+        _SESSION_LOCKS.pop(session_id, None)
+
+
+class UploadSession:
+    """One resumable upload; persisted as ``<spool>/<id>/job.json``."""
+
+    FIELDS = ('id', 'owner_id', 'filename', 'size', 'received', 'pushed', 'status', 'storage',
+              'storage_state', 'public_id', 'url', 'error', 'attempts', 'created_at', 'updated_at')
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @property
+    def dir(self):
+        return SPOOL_DIR / self.id
+
+    @property
+    def data_path(self):
+        return self.dir / 'data.part'
+
+    @classmethod
+    def load(cls, session_id):
+        if not session_id or not _SESSION_ID.match(session_id):
+            return None
+        try:
+            with (SPOOL_DIR / session_id / 'job.json').open(encoding='utf-8') as f:
+                return cls(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def save(self):
+        self.updated_at = datetime.utcnow().isoformat() + 'Z'
+        tmp = self.dir / 'job.json.tmp'
+        with tmp.open('w', encoding='utf-8') as f:
+            json.dump({name: getattr(self, name) for name in self.FIELDS}, f)
+        os.replace(tmp, self.dir / 'job.json')
+
+    def to_status(self):
+        return {
+            'upload_id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'size': self.size,
+            'received': self.received,
+            'pushed': self.pushed,
+            'progress': round(self.pushed / self.size, 4) if self.size else 0.0,
+            'publicId': self.public_id,
+            'url': self.url,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+def create_session(filename, size, owner_id=None):
+    """Start an upload of ``size`` bytes; status 'receiving'."""
+    safe_name = secure_filename(filename or '')
+    if not safe_name:
+        raise UploadError('filename is required')
+    if safe_name.rsplit('.', 1)[-1].lower() not in VIDEO_EXTENSIONS:
+        raise UploadError('Unsupported video type')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size is required')
+    if size <= 0:
+        raise UploadError('size is required')
+    if size > MAX_VIDEO_SIZE:
+        raise UploadError(f'Video too large (max {MAX_VIDEO_SIZE // (1024 * 1024)}MB)', 413)
+
+    session = UploadSession(
+        id=uuid.uuid4().hex, owner_id=owner_id, filename=safe_name, size=size, received=0, pushed=0,
+        status='receiving', attempts=0, created_at=datetime.utcnow().isoformat() + 'Z',
+    )
+    session.dir.mkdir(parents=True, exist_ok=True)
+    session.data_path.touch()
+    session.save()
+    return session
+
+
+def append_chunk(session_id, offset, stream):
+    """Append the body ``stream`` at ``offset``; must equal the bytes already received.
+
+    Raises UploadError 409 on an offset mismatch (the client resumes from
+    ``received``), 413 past the announced size. Returns the updated session.
+    """
+    if not _SESSION_ID.match(session_id or ''):
+        raise UploadError('upload session not found', 404)
+    with _session_lock(session_id):
+        session = UploadSession.load(session_id)
+        if session is None:
+            raise UploadError('upload session not found', 404)
+        if session.status != 'receiving':
+            raise UploadError(f'upload is {session.status}', 409)
+        if offset != session.received:
+            raise UploadError(f'expected offset {session.received}', 409)
+        received = session.received
+        try:
+            with session.data_path.open('r+b') as f:
+                f.seek(received)
+                while True:
+                    chunk = stream.read(RECEIVE_CHUNK)
+                    if not chunk:
+                        break
+                    if received + len(chunk) > session.size:
+                        raise UploadError('more data than the announced size', 413)
+                    f.write(chunk)
+                    received += len(chunk)
+        finally:
+            # Whatever reached the disk counts; a dropped connection resumes from here
+            with session.data_path.open('r+b') as f:
+                f.truncate(received)
+            session.received = received
+            if received == session.size:
+                session.status = 'queued'
+            session.save()
+        return session
+
+
+def _put_with_retries(storage, state, offset, data, size):
+    for attempt in range(PUSH_MAX_RETRIES + 1):
+        try:
+            return storage.put_chunk(state, offset, data, size), attempt
+        except Exception as e:
+            if attempt >= PUSH_MAX_RETRIES:
+                raise
+            print(f"[video_uploads] part at {offset} failed ({e}); retry {attempt + 1}/{PUSH_MAX_RETRIES}")
+            time.sleep(PUSH_BACKOFF * (2 ** attempt))
+
+
+def push_session(session_id):
+    """Send a complete spool file to the storage, resuming after the last pushed part."""
+    with _session_lock(session_id):
+        session = UploadSession.load(session_id)
+        if session is None or session.status not in ('queued', 'failed'):
+            return session
+        storage = get_video_storage()
+        if session.storage != storage.name or session.storage_state is None:
+            session.storage = storage.name
+            session.storage_state = storage.begin(session.filename, session.size)
+            session.pushed = 0
+        session.status = 'uploading'
+        session.error = None
+        session.save()
+        _ACTIVE_PUSHES.add(session_id)
+
+    try:
+        result = None
+        with session.data_path.open('rb') as f:
+            f.seek(session.pushed)
+            while session.pushed < session.size:
+                data = f.read(PUSH_CHUNK_SIZE)
+                result, retries = _put_with_retries(storage, session.storage_state, session.pushed, data, session.size)
+                session.pushed += len(data)
+                session.attempts = (session.attempts or 0) + retries
+                session.save()
+        session.data_path.unlink(missing_ok=True)
+        session.public_id = result['public_id']
+        session.url = result['url']
+        session.status = 'done'
+        session.save()
+    except Exception as e:
+        print(f"❌ Video push failed for {session_id}: {e}")
+        session.status = 'failed'
+        session.error = str(e)
+        session.save()
+    finally:
+        _ACTIVE_PUSHES.discard(session_id)
+    return session
+
+
+def start_push(session_id):
+    """Queue the push on the background workers."""
+    return _PUSH_RUNNERS.submit(push_session, session_id)
+
+
+def retry_push(session_id):
+    """Queue a failed push again; it resumes after the last part the storage accepted.
+    Returns the session (None if unknown); only 'failed' sessions are requeued."""
+    with _session_lock(session_id):
+        session = UploadSession.load(session_id)
+        if session is None or session.status != 'failed':
+            return session
+        session.status = 'queued'
+        session.save()
+    start_push(session_id)
+    return session
+
+
+def discard_session(session_id):
+    shutil.rmtree(SPOOL_DIR / session_id, ignore_errors=True)
+    _drop_session_lock(session_id)
+
+
+# ---------- housekeeping ----------
+
+def _age_seconds(session, now):
+    try:
+        updated = datetime.fromisoformat((session.updated_at or session.created_at).rstrip('Z'))
+    except (AttributeError, ValueError):
+        return float('inf')
+    return (now - updated).total_seconds()
+
+
+def sweep_sessions(now=None):
+    """Requeue stale queued/uploading pushes and delete expired spool directories.
+
+    A push counts as stale when its job has not been saved for
+    ``STALE_JOB_AFTER`` seconds and this process is not running it (the worker
+    that was died or restarted); it resumes after the last pushed part.
+    Returns ``{'requeued': [...], 'expired': [...]}`` (session ids).
+    """
+    now = now or datetime.utcnow()
+    requeued, expired = [], []
+    if not SPOOL_DIR.is_dir():
+        return {'requeued': requeued, 'expired': expired}
+    for path in SPOOL_DIR.iterdir():
+        if not path.is_dir() or not _SESSION_ID.match(path.name):
+            continue
+        with _session_lock(path.name):
+            session = UploadSession.load(path.name)
+            if session is None:
+                # Không có job.json (tạo dở / hỏng): xóa khi đủ cũ
+                if time.time() - path.stat().st_mtime > SPOOL_TTL:
+                    shutil.rmtree(path, ignore_errors=True)
+                    expired.append(path.name)
+                    _drop_session_lock(path.name)
+                continue
+            age = _age_seconds(session, now)
+            if session.status in ('queued', 'uploading'):
+                if age > STALE_JOB_AFTER and session.id not in _ACTIVE_PUSHES:
+                    session.status = 'queued'
+                    session.save()
+                    requeued.append(session.id)
+            elif age > SPOOL_TTL:
+                shutil.rmtree(path, ignore_errors=True)
+                expired.append(session.id)
+                _drop_session_lock(session.id)
+    for session_id in requeued:
+        print(f"[video_uploads] requeued stale push {session_id}")
+        start_push(session_id)
+    return {'requeued': requeued, 'expired': expired}
+
+
+def _sweep_loop():
+    while True:
+        try:
+            sweep_sessions()
+        except Exception as e:
+            print(f"[video_uploads] sweep failed: {e}")
+        time.sleep(SWEEP_INTERVAL)
+
+
+def start_sweeper():
+    """Sweep now and then every ``SWEEP_INTERVAL`` seconds on a daemon thread (once per process)."""
+    global _SWEEPER
+    with _SESSION_LOCKS_GUARD:
+        if _SWEEPER is None:
+            _SWEEPER = threading.Thread(target=_sweep_loop, name='video-sweep', daemon=True)
+            _SWEEPER.start()
+    return _SWEEPER
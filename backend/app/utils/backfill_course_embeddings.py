@@ -0,0 +1,31 @@
+"""Compute and store embeddings for courses whose vector is missing or stale.
+
+Run after deploying (or after switching embedding model):
+    python -m app.utils.backfill_course_embeddings [--force] [--batch-size 32]
+"""
+import argparse
+
+from app import create_app
+from app.services.course_embeddings import backfill_course_embeddings
+from app.services.recommender import embedding_available
+
+
+def run(batch_size=None, force=False):
+    app = create_app()
+    with app.app_context():
+        if not embedding_available():
+            print("❌ No embedding backend configured (see RECOMMENDER_EMBED_BACKEND)")
+            return
+        totals = backfill_course_embeddings(batch_size=batch_size, force=force)
+        print(
+            f"✅ Embedded {totals['embedded']} courses, "
+            f"{totals['skipped']} unchanged, {totals['failed']} failed"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--force", action="store_true", help="re-embed courses even if their text is unchanged")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+    run(batch_size=args.batch_size, force=args.force)
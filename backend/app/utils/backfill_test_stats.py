@@ -0,0 +1,18 @@
+"""Rebuild student_test_stats from existing TestAttempts.
+
+Run once after deploying the aggregates table (or any time they drift):
+    python -m app.utils.backfill_test_stats
+"""
+from app import create_app
+from app.services.grading import rebuild_test_stats
+
+
+def run():
+    app = create_app()
+    with app.app_context():
+        rows = rebuild_test_stats()
+        print(f"✅ Rebuilt test stats for {rows} (student, test) pairs")
+
+
+if __name__ == "__main__":
+    run()
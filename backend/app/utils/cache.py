@@ -0,0 +1,107 @@
+"""Bounded, thread-safe in-process caches.
+
+``BoundedCache`` is an LRU map with an optional per-entry TTL and hit / miss /
+eviction / expiration counters. Every cache registers itself by name so that
+``cache_stats()`` can report all of them (see ``GET /api/admin/cache/stats``);
+other caches with a ``name`` and a ``stats()`` method join with ``register_cache``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def register_cache(cache):
+    with _REGISTRY_LOCK:
+        _REGISTRY[cache.name] = cache
+
+
+class BoundedCache:
+    def __init__(self, name, maxsize=1024, ttl=None):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds; None = entries only leave by LRU eviction
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        register_cache(self)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count=True):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= now:
+                del self._data[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, factory):
+        """Return the cached value or compute it with ``factory()`` (not cached if it returns None).
+
+        ``factory`` runs outside the lock, so concurrent misses may compute twice.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def cache_stats():
+    with _REGISTRY_LOCK:
+        caches = list(_REGISTRY.values())
+    return [c.stats() for c in sorted(caches, key=lambda c: c.name)]
@@ -27,3 +27,24 @@ def upload_video(file_stream, filename: str) -> Tuple[str, str]:
         overwrite=True,
     )
     return result.get("public_id"), result.get("secure_url")
+
+
+def upload_video_part(chunk: bytes, filename: str, upload_id: str, offset: int, total_size: int, public_id: str):
+    """
+    Upload one part of a chunked video upload (what cloudinary.uploader.upload_large
+    does per chunk). Parts must be sent in order; every part but the last must be
+    at least 5 MB. Returns Cloudinary's response (complete once the last part is in).
+    """
+    headers = {
+        "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{total_size}",
+        "X-Unique-Upload-Id": upload_id,
+    }
+    return cloudinary.uploader.upload_large_part(
+        (filename, chunk),
+        http_headers=headers,
+        resource_type="video",
+        # After the first part public_id already carries the folder
+        folder=None if "/" in public_id else DEFAULT_FOLDER,
+        public_id=public_id,
+        overwrite=True,
+    )
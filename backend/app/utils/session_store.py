@@ -0,0 +1,242 @@
+"""Short-lived session state with TTL, optionally shared between worker processes.
+
+Chat sessions, newbie placement tests and e-mail OTPs are kept in a
+``SessionStore`` (one namespace each) instead of module-level dicts, so any
+worker can serve the next request of a session. Values are JSON documents:
+callers read a copy with ``get`` and write it back with ``set``. Expired keys
+are dropped by the backend, never by scanning all sessions on a request.
+
+The backend is chosen with ``SESSION_STORE_BACKEND``:
+
+* ``memory`` (default): in-process; fine for one worker and for tests;
+* ``sql``: the ``session_store`` table of the application database;
+* ``redis``: any Redis-protocol server at ``SESSION_STORE_REDIS_URL``
+  (needs the ``redis`` package).
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    redis = None
+
+from app.models import db
+from app.models.session_entry import SessionEntry
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """In-process backend with amortized O(1) expiry.
+
+    Deadlines go into one-second buckets (a timing wheel); each write drains the
+    buckets that came due since the previous write, so a key is touched at most
+    once per ``set`` and the cost never depends on how many sessions are alive.
+    Reads also check the deadline, so expiry is exact to the second.
+    """
+
+    def __init__(self):
+        self._data = {}     # key -> (expires_at, json text)
+        self._wheel = {}    # whole second -> keys due then; rewritten keys are skipped
+        self._cursor = int(time.time())  # first bucket not drained yet
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        last = int(now) - 1  # buckets strictly in the past
+        if last < self._cursor:
+            return
+        if last - self._cursor > len(self._wheel):
+            # Long idle gap: visit the buckets that exist rather than every second
+            due = sorted(s for s in self._wheel if s <= last)
+        else:
+            due = range(self._cursor, last + 1)
+        for second in due:
+            for key in self._wheel.pop(second, ()):
+                entry = self._data.get(key)
+                if entry is not None and entry[0] <= now:
+                    del self._data[key]
+        self._cursor = last + 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        expires_at = now + ttl
+        with self._lock:
+            self._purge(now)
+            self._data[key] = (expires_at, value)
+            self._wheel.setdefault(max(int(expires_at), self._cursor), set()).add(key)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def clear(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLBackend:
+    """Rows of the ``session_store`` table; runs on its own connection, never the request's session."""
+
+    def __init__(self, purge_every=200):
+        self.table = SessionEntry.__table__
+        self.purge_every = purge_every
+        self._writes = 0
+
+    def get(self, key):
+        t = self.table
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(t.c.Value).where(t.c.Key == key, t.c.ExpiresAt > datetime.utcnow())
+            ).first()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        t = self.table
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl)
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                update(t).where(t.c.Key == key).values(Value=value, ExpiresAt=expires_at)
+            ).rowcount
+        if not updated:
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(insert(t).values(Key=key, Value=value, ExpiresAt=expires_at))
+            except IntegrityError:
+                # Another worker inserted it first
+                with db.engine.begin() as conn:
+                    conn.execute(update(t).where(t.c.Key == key).values(Value=value, ExpiresAt=expires_at))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            with db.engine.begin() as conn:
+                conn.execute(delete(t).where(t.c.ExpiresAt <= now))
+
+    def pop(self, key):
+        t = self.table
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                select(t.c.Value).where(t.c.Key == key, t.c.ExpiresAt > datetime.utcnow())
+            ).first()
+            # Only the worker whose DELETE removes the row gets the value
+            deleted = conn.execute(delete(t).where(t.c.Key == key)).rowcount
+        return row[0] if row and deleted else None
+
+    def clear(self, prefix):
+        t = self.table
+        with db.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.Key.like(prefix + '%')))
+
+
+class RedisBackend:
+    def __init__(self, url=None, prefix='codecourse:session:'):
+        if redis is None:
+            raise RuntimeError("redis is not installed. Run `pip install redis` or use another SESSION_STORE_BACKEND.")
+        self._client = redis.Redis.from_url(url or os.getenv('SESSION_STORE_REDIS_URL', 'redis://localhost:6379/0'))
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def pop(self, key):
+        pipe = self._client.pipeline(transaction=True)
+        pipe.get(self.prefix + key)
+        pipe.delete(self.prefix + key)
+        value, _ = pipe.execute()
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def clear(self, prefix):
+        for key in self._client.scan_iter(match=f"{self.prefix}{prefix}*"):
+            self._client.delete(key)
+
+
+_BACKENDS = {
+    'memory': MemoryBackend,
+    'sql': SQLBackend,
+    'redis': RedisBackend,
+}
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_session_backend():
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                choice = (os.getenv('SESSION_STORE_BACKEND') or 'memory').strip().lower()
+                if choice not in _BACKENDS:
+                    print(f"[session_store] unknown SESSION_STORE_BACKEND={choice!r}, using memory")
+                    choice = 'memory'
+                _BACKEND = _BACKENDS[choice]()
+    return _BACKEND
+
+
+def set_session_backend(backend):
+    """Swap the backend of every store (tests); None re-reads SESSION_STORE_BACKEND."""
+    global _BACKEND
+    _BACKEND = backend
+
+
+class SessionStore:
+    """A namespace of the session backend; keys may be strings or tuples (joined with ':')."""
+
+    def __init__(self, namespace, ttl):
+        self.namespace = namespace
+        self.ttl = ttl  # seconds
+
+    def _key(self, key):
+        parts = key if isinstance(key, tuple) else (key,)
+        return f"{self.namespace}:" + ':'.join(str(p) for p in parts)
+
+    def get(self, key, default=None):
+        raw = get_session_backend().get(self._key(key))
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.delete(key)
+            return
+        get_session_backend().set(self._key(key), json.dumps(value, ensure_ascii=False), ttl)
+
+    def pop(self, key, default=None):
+        raw = get_session_backend().pop(self._key(key))
+        return default if raw is None else json.loads(raw)
+
+    def delete(self, key):
+        return self.pop(key, _MISSING) is not _MISSING
+
+    def __contains__(self, key):
+        return get_session_backend().get(self._key(key)) is not None
+
+    def clear(self):
+        get_session_backend().clear(f"{self.namespace}:")
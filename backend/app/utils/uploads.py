@@ -0,0 +1,214 @@
+"""Streaming storage of user uploads (chat and AI attachments).
+
+``receive_upload`` reads the request body in chunks instead of letting
+Werkzeug parse the whole form first: each chunk is hashed and written to a
+temporary file next to its destination, and the upload is aborted as soon as
+it grows past ``max_size``. Two request formats are accepted:
+
+* ``multipart/form-data`` with the file in the ``file`` field (the existing
+  clients), decoded incrementally;
+* a raw body (``application/octet-stream``) with the name in ``?filename=`` or
+  the ``X-File-Name`` header.
+
+Files are stored as ``<sha256>.<ext>``: identical uploads share one file and
+naming needs no "does it exist" probing. ``serve_upload_file`` serves them
+with the hash as a strong ETag and a long cache lifetime; Range and
+If-None-Match requests are answered by Werkzeug (206 / 304).
+"""
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+
+from flask import request, send_from_directory
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers allowed on top of max_size
+MAX_FORM_FIELD_SIZE = 64 * 1024
+HASHED_NAME = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+
+
+class UploadError(Exception):
+    """Rejected upload; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class StoredUpload:
+    def __init__(self, path: Path, original_name: str, extension: str, size: int, sha256: str, mimetype, deduplicated):
+        self.path = path
+        self.original_name = original_name
+        self.extension = extension
+        self.size = size
+        self.sha256 = sha256
+        self.mimetype = mimetype
+        self.deduplicated = deduplicated
+
+    @property
+    def filename(self):
+        return self.path.name
+
+
+def _extension(filename):
+    return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+
+
+class _HashingWriter:
+    """Temporary file in the upload directory that hashes and counts what is written."""
+
+    def __init__(self, upload_dir: Path, max_size: int, too_large_message: str):
+        self.upload_dir = upload_dir
+        self.max_size = max_size
+        self.too_large_message = too_large_message
+        self.path = upload_dir / f".upload-{uuid.uuid4().hex}.part"
+        self._file = self.path.open("wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadError(self.too_large_message, 413)
+        self._hash.update(data)
+        self._file.write(data)
+
+    def finish(self, extension):
+        """Move the data to ``<sha256>.<ext>``; returns (path, sha256, deduplicated)."""
+        self._file.close()
+        digest = self._hash.hexdigest()
+        dest = self.upload_dir / (f"{digest}.{extension}" if extension else digest)
+        if dest.exists():
+            self.discard()
+            return dest, digest, True
+        os.replace(self.path, dest)
+        return dest, digest, False
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _read_chunks(stream):
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _receive_multipart(writer_factory, allowed, field_name):
+    boundary = request.mimetype_params.get("boundary")
+    if not boundary:
+        raise UploadError("Missing multipart boundary")
+    decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=MAX_FORM_FIELD_SIZE)
+    writer = None
+    upload = None  # (writer, original name, mimetype) once the file part is complete
+    current_is_file = False
+    chunks = _read_chunks(request.stream)
+    finished = False
+    while not finished:
+        chunk = next(chunks, None)
+        decoder.receive_data(chunk)
+        event = decoder.next_event()
+        while not isinstance(event, NeedData):
+            if isinstance(event, File):
+                current_is_file = event.name == field_name and writer is None and upload is None
+                if current_is_file:
+                    original = event.filename or ""
+                    if not original:
+                        raise UploadError("missing filename")
+                    if _extension(original) not in allowed:
+                        raise UploadError("Unsupported file type")
+                    writer = writer_factory()
+                    mimetype = event.headers.get("Content-Type")
+            elif isinstance(event, Field):
+                current_is_file = False
+            elif isinstance(event, Data):
+                if current_is_file:
+                    writer.write(event.data)
+                    if not event.more_data:
+                        upload = (writer, original, mimetype)
+                        writer = None
+                        current_is_file = False
+            elif isinstance(event, Epilogue):
+                finished = True
+                break
+            event = decoder.next_event()
+        if chunk is None:
+            finished = True
+    if writer is not None:
+        writer.discard()
+    if upload is None:
+        raise UploadError("file is required")
+    return upload
+
+
+def receive_upload(upload_dir: Path, allowed_extensions, max_size: int, too_large_message=None, field_name="file"):
+    """Stream the uploaded file of the current request into ``upload_dir``.
+
+    Returns a ``StoredUpload``; raises ``UploadError`` (400 / 413) without
+    leaving partial files behind.
+    """
+    too_large_message = too_large_message or f"File too large (max {max_size // (1024 * 1024)}MB)"
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    if request.content_length is not None and request.content_length > max_size + MULTIPART_OVERHEAD:
+        raise UploadError(too_large_message, 413)
+
+    writers = []
+
+    def _new_writer():
+        writer = _HashingWriter(upload_dir, max_size, too_large_message)
+        writers.append(writer)
+        return writer
+
+    try:
+        if request.mimetype == "multipart/form-data":
+            writer, original, mimetype = _receive_multipart(_new_writer, allowed_extensions, field_name)
+        else:
+            original = request.args.get("filename") or request.headers.get("X-File-Name") or ""
+            if not original:
+                raise UploadError("missing filename")
+            if _extension(original) not in allowed_extensions:
+                raise UploadError("Unsupported file type")
+            mimetype = request.mimetype or None
+            writer = _new_writer()
+            for chunk in _read_chunks(request.stream):
+                writer.write(chunk)
+            if writer.size == 0:
+                raise UploadError("file is required")
+        original = secure_filename(original) or original
+        extension = _extension(original)
+        path, digest, deduplicated = writer.finish(extension)
+        return StoredUpload(path, original, extension, writer.size, digest, mimetype, deduplicated)
+    except ValueError as e:
+        # Malformed multipart body
+        for w in writers:
+            w.discard()
+        raise UploadError(f"Invalid upload body: {e}") from e
+    except Exception:
+        for w in writers:
+            w.discard()
+        raise
+
+
+def serve_upload_file(upload_dir: Path, filename: str, max_age=365 * 24 * 3600):
+    """Serve a stored upload; content-hash names get a strong ETag and a long max-age."""
+    match = HASHED_NAME.match(filename)
+    if not match:
+        # Files stored before content-hash naming: Werkzeug's mtime/size ETag
+        return send_from_directory(upload_dir, filename, as_attachment=False)
+    response = send_from_directory(upload_dir, filename, as_attachment=False, etag=match.group(1), max_age=max_age)
+    response.cache_control.immutable = True
+    return response
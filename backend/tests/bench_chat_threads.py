@@ -0,0 +1,138 @@
+"""Benchmark the instructor inbox (GET /api/chat/threads) on 10k messages / 2k threads (not collected by pytest).
+Run:
+    python backend/tests/bench_chat_threads.py
+
+Compares the former per-thread queries (last message + unread count for every
+enrollment) with the grouped summaries now used by list_threads, on SQLite.
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # importing app builds a DB engine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_jwt_extended import JWTManager, create_access_token  # noqa: E402
+from sqlalchemy import BigInteger, and_, event, or_  # noqa: E402
+from sqlalchemy.ext.compiler import compiles  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from app.models import db  # noqa: E402
+from app.models.model import Course, Enrollment, Instructor, Message, Student, User  # noqa: E402
+from app.routes import chat_bp  # noqa: E402
+
+THREADS = 2_000
+MESSAGES = 10_000
+RUNS = 5
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_as_integer(type_, compiler, **kw):
+    return "INTEGER"
+
+
+def build_app():
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"check_same_thread": False}, "poolclass": StaticPool},
+        JWT_SECRET_KEY="bench-secret-key-with-enough-length-32b",
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(chat_bp)
+    return app
+
+
+def seed():
+    inst_user = User(email="ins@example.com", password_hash="x", full_name="Instructor", role="instructor")
+    course = Course(instructor=Instructor(user=inst_user), title="Course", slug="course", is_public=True)
+    db.session.add(course)
+    db.session.flush()
+    students = [
+        Student(user=User(email=f"s{i}@example.com", password_hash="x", full_name=f"S{i}", role="student"))
+        for i in range(THREADS)
+    ]
+    db.session.add_all(students)
+    db.session.flush()
+    db.session.add_all(Enrollment(student_id=s.id, course_id=course.id, status="active") for s in students)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(MESSAGES):
+        st = students[i % THREADS]
+        to_instructor = i % 2 == 0
+        rows.append({
+            "course_id": course.id,
+            "from_user_id": st.user_id if to_instructor else inst_user.id,
+            "to_user_id": inst_user.id if to_instructor else st.user_id,
+            "content": f"message {i}",
+            "created_at": start + timedelta(seconds=i),
+            "read_at": None if i % 3 else start,
+        })
+    db.session.bulk_insert_mappings(Message, rows)
+    db.session.commit()
+    return inst_user.id, course.id, [s.user_id for s in students]
+
+
+def legacy_summaries(user_id, course_id, student_user_ids):
+    """The per-thread queries list_threads used to issue."""
+    out = {}
+    for other in student_user_ids:
+        last = (
+            Message.query.filter(
+                Message.course_id == course_id,
+                or_(
+                    and_(Message.from_user_id == user_id, Message.to_user_id == other),
+                    and_(Message.from_user_id == other, Message.to_user_id == user_id),
+                ),
+            )
+            .order_by(Message.created_at.desc())
+            .first()
+        )
+        unread = Message.query.filter(
+            Message.course_id == course_id, Message.to_user_id == user_id, Message.read_at.is_(None)
+        ).count()
+        out[other] = (last.content if last else None, unread)
+    return out
+
+
+def timed(fn, engine):
+    statements = []
+
+    def _on_execute(*args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    try:
+        samples = []
+        for _ in range(RUNS):
+            db.session.expire_all()
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_execute)
+    samples.sort()
+    return samples[len(samples) // 2], len(statements) // RUNS
+
+
+def main():
+    app = build_app()
+    with app.app_context():
+        db.create_all()
+        inst_user_id, course_id, student_user_ids = seed()
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(inst_user_id), additional_claims={'role': 'instructor'})}"}
+
+        print(f"threads={THREADS} messages={MESSAGES} runs={RUNS} (median)")
+        print(f"{'variant':>22} | {'ms':>9} | {'queries':>7}")
+        ms, queries = timed(lambda: legacy_summaries(inst_user_id, course_id, student_user_ids), db.engine)
+        print(f"{'per-thread (before)':>22} | {ms:>9.1f} | {queries:>7}")
+        ms, queries = timed(lambda: client.get("/api/chat/threads", headers=headers), db.engine)
+        print(f"{'GET /threads (after)':>22} | {ms:>9.1f} | {queries:>7}")
+
+
+if __name__ == "__main__":
+    main()
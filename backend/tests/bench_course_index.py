@@ -0,0 +1,93 @@
+"""Benchmark semantic recommendation latency (not collected by pytest).
+
+Times ``recommender.semantic_recommend`` end to end (query embedding from a
+stub backend, filters, shortlist from the embedding index, keyword scoring of
+the shortlist) over synthetic catalogs, next to the raw index search.
+Run:
+    python backend/tests/bench_course_index.py
+"""
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # importing app builds a DB engine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import recommender  # noqa: E402
+from app.services.course_index import course_index  # noqa: E402
+from app.services.course_keyword_index import course_keyword_index  # noqa: E402
+
+DIM = 768  # text-embedding-004
+QUERIES = 200
+TOP_K = 6
+WORDS = ["python", "java", "web", "data", "sql", "flask", "react", "design", "cloud", "security",
+         "testing", "mobile", "android", "docker", "linux", "network", "game", "music", "excel", "ai"]
+LEVELS = ["beginner", "intermediate", "advanced"]
+
+
+class _StubEmbeddingBackend(recommender.EmbeddingBackend):
+    name = "bench"
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def available(self):
+        return True
+
+    def embed_query(self, text):
+        return self.rng.normal(size=DIM).astype(np.float32).tolist()
+
+
+def _course(cid, rng):
+    words = rng.choice(WORDS, size=4, replace=False)
+    category = SimpleNamespace(name=str(words[0]).title(), slug=str(words[0]))
+    topic = SimpleNamespace(name=str(words[1]).title(), slug=str(words[1]))
+    return SimpleNamespace(
+        id=cid, title=f"{words[0]} {words[1]}", description=f"Learn {words[2]} and {words[3]}",
+        level=LEVELS[cid % 3], language="general", price=0, currency="VND", created_at=datetime(2024, 1, 1),
+        categories=[category], topics=[topic], instructor=None,
+    )
+
+
+def bench(n_courses, rng):
+    t0 = time.perf_counter()
+    course_keyword_index.build(_course(cid, rng) for cid in range(1, n_courses + 1))
+    vectors = rng.normal(size=(n_courses, DIM)).astype(np.float32)
+    course_index.build(zip(range(1, n_courses + 1), vectors))
+    build_ms = (time.perf_counter() - t0) * 1000
+
+    search_ms, recommend_ms = [], []
+    for i in range(QUERIES):
+        q = rng.normal(size=DIM).astype(np.float32)
+        t0 = time.perf_counter()
+        course_index.search(q, TOP_K)
+        search_ms.append((time.perf_counter() - t0) * 1000)
+
+        query = f"{WORDS[i % len(WORDS)]} {WORDS[(i * 7) % len(WORDS)]} course {i}"  # distinct: no cache hits
+        t0 = time.perf_counter()
+        recommender.semantic_recommend(query, limit=TOP_K)
+        recommend_ms.append((time.perf_counter() - t0) * 1000)
+
+    def pct(values, p):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+    return build_ms, pct(search_ms, 0.5), pct(recommend_ms, 0.5), pct(recommend_ms, 0.95)
+
+
+def main():
+    rng = np.random.default_rng(42)
+    recommender.set_embedding_backend(_StubEmbeddingBackend(rng))
+    print(f"dim={DIM} top_k={TOP_K} queries={QUERIES} candidates={recommender.SEMANTIC_CANDIDATES}")
+    print(f"{'courses':>8} | {'build ms':>9} | {'search p50':>10} | {'recommend p50':>13} | {'recommend p95':>13}")
+    for n in (100, 10_000, 100_000):
+        build_ms, search_p50, p50, p95 = bench(n, rng)
+        print(f"{n:>8} | {build_ms:>9.1f} | {search_p50:>10.3f} | {p50:>13.3f} | {p95:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
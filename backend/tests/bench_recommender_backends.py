@@ -0,0 +1,100 @@
+"""Compare keyword-only scoring with the local embedding backend (not collected by pytest).
+
+Synthetic corpus: each course belongs to one topic and is described with 3 of
+that topic's 12 words plus generic filler; each query uses 2 topic words, so
+many relevant courses share no word with the query. A course is relevant when
+it shares the query's topic; quality is R-precision (precision at k = number
+of relevant courses), latency covers one query. Run:
+    python backend/tests/bench_recommender_backends.py
+"""
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # importing app builds a DB engine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.course_index import CourseEmbeddingIndex  # noqa: E402
+from app.services.recommender import LocalEmbeddingBackend, _keyword_scores  # noqa: E402
+
+TOPICS = {
+    "python": "python pandas numpy django flask pip virtualenv decorators generators asyncio pytest typing",
+    "web": "javascript react html css dom browser frontend vue typescript webpack responsive layout",
+    "data": "statistics regression dataset visualization matplotlib sql analytics dashboard excel pivot bi etl",
+    "ml": "neural network training gradient classification tensorflow pytorch overfitting features embeddings "
+          "transformer",
+    "mobile": "android ios kotlin swift flutter appstore mobile gestures notifications emulator xcode jetpack",
+    "devops": "docker kubernetes ci cd pipeline deployment linux bash monitoring terraform cloud ansible",
+    "design": "figma typography color palette wireframe prototype ux research branding illustration sketch grid",
+    "music": "guitar piano chords rhythm melody harmony scales songwriting recording mixing drums vocals",
+}
+FILLER = "beginner complete guide practical course learn project hands on bootcamp masterclass".split()
+N_COURSES = 2000
+N_QUERIES = 200
+TOP_K = 10  # results per query for the latency measurement
+
+
+def build_corpus(rng):
+    texts, labels = [], []
+    names = list(TOPICS)
+    for i in range(N_COURSES):
+        topic = names[i % len(names)]
+        words = TOPICS[topic].split()
+        texts.append(f"Course {i} " + " ".join(rng.sample(words, 3) + rng.sample(FILLER, 2)))
+        labels.append(topic)
+    queries = []
+    for _ in range(N_QUERIES):
+        topic = rng.choice(names)
+        queries.append((" ".join(rng.sample(TOPICS[topic].split(), 2)), topic))
+    return texts, labels, queries
+
+
+def evaluate(rank_fn, labels, queries):
+    latencies, scores = [], []
+    label_arr = np.asarray(labels)
+    for query, topic in queries:
+        t0 = time.perf_counter()
+        rank_fn(query, TOP_K)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        n_relevant = int(np.sum(label_arr == topic))
+        top = rank_fn(query, n_relevant)
+        scores.append(float(np.sum(label_arr[top] == topic)) / n_relevant)
+    latencies.sort()
+    return np.mean(scores), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    rng = random.Random(7)
+    texts, labels, queries = build_corpus(rng)
+
+    def keyword_rank(query, k):
+        scores = _keyword_scores(query, texts)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[scores[top] > 0]  # the keyword path has nothing to say about zero-score courses
+        return top[np.argsort(-scores[top])]
+
+    print(f"courses={N_COURSES} queries={N_QUERIES} latency k={TOP_K}")
+    print(f"{'path':>16} | {'R-precision':>11} | {'p50 ms':>7} | {'p95 ms':>7} | {'fit ms':>7}")
+    precision, p50, p95 = evaluate(keyword_rank, labels, queries)
+    print(f"{'keyword-only':>16} | {precision:>11.3f} | {p50:>7.3f} | {p95:>7.3f} | {'-':>7}")
+
+    for dim in (16, 128):
+        backend = LocalEmbeddingBackend(n_components=dim)
+        t0 = time.perf_counter()
+        backend.fit(texts)
+        index = CourseEmbeddingIndex()
+        index.build(enumerate(backend.embed_documents(texts)))
+        fit_ms = (time.perf_counter() - t0) * 1000
+
+        def local_rank(query, k, backend=backend, index=index):
+            return np.asarray([cid for cid, _ in index.search(backend.embed_query(query), k)], dtype=np.int64)
+
+        precision, p50, p95 = evaluate(local_rank, labels, queries)
+        print(f"{f'local-lsa/{dim}':>16} | {precision:>11.3f} | {p50:>7.3f} | {p95:>7.3f} | {fit_ms:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Shared pytest fixtures: an in-memory SQLite app with the real blueprints.
+
+Run from the backend directory:
+    python -m pytest -q tests
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+# Must be set before app.utils.db builds its global engine
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# No background embedding jobs unless a test installs a backend explicitly
+os.environ.setdefault("RECOMMENDER_EMBED_BACKEND", "none")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import BigInteger, event
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+
+from app.models import db
+
+
+# SQLite only auto-increments "INTEGER PRIMARY KEY" columns
+@compiles(BigInteger, "sqlite")
+def _bigint_as_integer(type_, compiler, **kw):
+    return "INTEGER"
+
+
+def _build_app():
+    from app.routes import student_bp, instructor_bp, chat_bp, admin_bp, ai_quiz_bp
+    from app.routes.AI import ai_bp
+    from app.routes.LearningPath import learning_path_bp
+
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY="test",
+        JWT_SECRET_KEY="test-secret-key-with-enough-length-32b",
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SQLALCHEMY_ENGINE_OPTIONS={
+            "connect_args": {"check_same_thread": False},
+            "poolclass": StaticPool,
+        },
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(student_bp)
+    app.register_blueprint(instructor_bp)
+    app.register_blueprint(chat_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(ai_bp)
+    app.register_blueprint(ai_quiz_bp)
+    app.register_blueprint(learning_path_bp)
+    return app
+
+
+def _reset_caches():
+    from app.routes import Chat as chat_routes
+    from app.services import ai_learning_path, course_context, course_outline, grading, llm_client, recommender
+    from app.services.course_index import course_index
+    from app.services.course_keyword_index import course_keyword_index
+    from app.services.ai_streaming import set_stream_provider
+    from app.services.chat_events import set_chat_broker
+    from app.services.video_uploads import set_video_storage
+    from app.utils.session_store import set_session_backend
+
+    course_outline._OUTLINE_CACHE.clear()
+    grading._ANSWER_KEY_CACHE.clear()
+    ai_learning_path._DESCRIPTION_CACHE.clear()
+    chat_routes._ACCESS_CACHE.clear()
+    course_index.clear()
+    course_keyword_index.clear()
+    course_context._SNAPSHOT = None
+    course_context.invalidate_course_context()
+    set_stream_provider(None)
+    llm_client.set_llm_backend(None)
+    llm_client.get_llm_client().reset_stats()
+    recommender.set_embedding_backend(None)
+    set_session_backend(None)
+    set_chat_broker(None)
+    set_video_storage(None)
+
+
+@pytest.fixture()
+def app():
+    flask_app = _build_app()
+    _reset_caches()
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture()
+def auth_header(app):
+    def _make(user_id, role="student"):
+        token = create_access_token(identity=str(user_id), additional_claims={"role": role})
+        return {"Authorization": f"Bearer {token}"}
+    return _make
+
+
+@pytest.fixture()
+def foreign_keys(app):
+    """Enforce foreign keys like MySQL does (SQLite ignores them by default)."""
+    db.session.commit()
+    db.session.connection().exec_driver_sql("PRAGMA foreign_keys=ON")
+    yield
+    db.session.rollback()
+    db.session.connection().exec_driver_sql("PRAGMA foreign_keys=OFF")
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture()
+def count_queries(app):
+    """Context manager that records every SQL statement sent to the database."""
+    @contextmanager
+    def _count():
+        counter = QueryCounter()
+
+        def _on_execute(conn, cursor, statement, parameters, context, executemany):
+            counter.statements.append(statement)
+
+        engine = db.engine
+        event.listen(engine, "before_cursor_execute", _on_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", _on_execute)
+    return _count
+
+
+@pytest.fixture()
+def make_course(app):
+    """Factory creating a public course with its own instructor, category and topic."""
+    from app.models.model import User, Instructor, Course, Category, Topic
+
+    counter = {"n": 0}
+
+    def _make(**overrides):
+        counter["n"] += 1
+        n = counter["n"]
+        user = User(email=f"ins{n}@example.com", password_hash="x", full_name=f"Instructor {n}", role="instructor")
+        instructor = Instructor(user=user)
+        category = Category(name=f"Category {n}", slug=f"category-{n}")
+        topic = Topic(name=f"Topic {n}", slug=f"topic-{n}", category=category)
+        fields = {
+            "title": f"Course {n}",
+            "slug": f"course-{n}",
+            "description": f"Description of course {n}",
+            "level": "beginner",
+            "is_public": True,
+        }
+        fields.update(overrides)
+        course = Course(instructor=instructor, categories=[category], topics=[topic], **fields)
+        db.session.add(course)
+        db.session.commit()
+        return course
+
+    return _make
+
+
+@pytest.fixture()
+def make_student(app):
+    from app.models.model import User, Student
+
+    counter = {"n": 0}
+
+    def _make():
+        counter["n"] += 1
+        n = counter["n"]
+        user = User(email=f"stu{n}@example.com", password_hash="x", full_name=f"Student {n}", role="student")
+        student = Student(user=user)
+        db.session.add(student)
+        db.session.commit()
+        return student
+
+    return _make
+
+
+@pytest.fixture()
+def make_test(app):
+    """Factory adding a section/lesson/test with ``num_questions`` 4-choice questions to a course."""
+    from app.models.model import CourseSection, Lesson, Test, Question, Choice
+
+    def _make(course, num_questions=3, points=1):
+        section = CourseSection(course_id=course.id, title="Section", sort_order=1)
+        lesson = Lesson(section=section, title="Lesson", sort_order=1)
+        test = Test(lesson=lesson, title="Quiz", attempts_allowed=999)
+        for i in range(num_questions):
+            question = Question(test=test, content=f"Q{i}", points=points, sort_order=i)
+            for j in range(4):
+                question.choices.append(Choice(content=f"C{i}-{j}", is_correct=(j == 0), sort_order=j))
+        db.session.add(section)
+        db.session.commit()
+        return test
+
+    return _make
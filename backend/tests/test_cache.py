@@ -0,0 +1,63 @@
+"""Bounded LRU/TTL cache utility and its use by the recommender."""
+from app.services import recommender
+from app.utils import cache as cache_module
+from app.utils.cache import BoundedCache
+
+
+def test_lru_eviction_and_counters():
+    c = BoundedCache("test.lru", maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1      # "a" becomes most recently used
+    c.set("c", 3)               # evicts "b"
+    assert c.get("b") is None
+    assert c.get("c") == 3
+    stats = c.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1, 1)
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    c = BoundedCache("test.ttl", maxsize=10, ttl=5)
+    c.set("k", "v")
+    now[0] += 4
+    assert c.get("k") == "v"
+    now[0] += 2
+    assert c.get("k") is None
+    assert c.stats()["expirations"] == 1 and len(c) == 0
+
+
+def test_get_or_set_does_not_cache_none():
+    c = BoundedCache("test.factory", maxsize=10)
+    calls = []
+    assert c.get_or_set("x", lambda: calls.append(1)) is None
+    assert c.get_or_set("x", lambda: calls.append(1) or 42) == 42
+    assert c.get_or_set("x", lambda: calls.append(1) or 0) == 42
+    assert len(calls) == 2
+
+
+class _CountingBackend(recommender.EmbeddingBackend):
+    name = "counting"
+
+    def __init__(self):
+        self.queries = []
+
+    def available(self):
+        return True
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [1.0, 0.0]
+
+
+def test_query_cache_normalizes_and_reports_stats(client):
+    backend = _CountingBackend()
+    recommender.set_embedding_backend(backend)
+    for q in ("Learn Python", "  learn   python? ", "LEARN PYTHON!"):
+        assert recommender._get_query_embedding(q) == [1.0, 0.0]
+    assert backend.queries == ["learn python"]
+
+    stats = {c["name"]: c for c in client.get("/api/admin/cache/stats").get_json()["caches"]}
+    assert stats["recommender.query_embeddings"]["hits"] >= 2
+    assert "course_outline" in stats and "grading.answer_keys" in stats
@@ -0,0 +1,107 @@
+"""GET /api/chat/messages: keyset pages, bulk read receipts and the cached access decision."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import db
+from app.models.model import Enrollment, Message
+from app.routes import Chat as chat_routes
+
+
+@pytest.fixture()
+def conversation(app, auth_header, make_course, make_student):
+    course = make_course()
+    student = make_student()
+    db.session.add(Enrollment(student_id=student.id, course_id=course.id, status="active"))
+    instructor_user_id = course.instructor.user.id
+    start = datetime(2024, 1, 1)
+    minutes = [0, 1, 1, 3, 4]  # m1 and m2 share a timestamp: the id breaks the tie
+    for i in range(5):
+        from_id, to_id = (instructor_user_id, student.user_id) if i % 2 == 0 else (student.user_id, instructor_user_id)
+        db.session.add(Message(course_id=course.id, from_user_id=from_id, to_user_id=to_id,
+                               content=f"m{i}", created_at=start + timedelta(minutes=minutes[i])))
+    db.session.commit()
+    return {
+        "url": f"/api/chat/messages?course_id={course.id}",
+        "headers": auth_header(student.user_id),
+    }
+
+
+def test_pages_walk_history_backwards(client, conversation):
+    url, headers = conversation["url"], conversation["headers"]
+    resp = client.get(url + "&limit=2", headers=headers)
+    assert [m["content"] for m in resp.get_json()] == ["m3", "m4"]
+    pages = [resp.get_json()]
+    while "X-Next-Cursor" in resp.headers:
+        resp = client.get(url + f"&limit=2&cursor={resp.headers['X-Next-Cursor']}", headers=headers)
+        pages.append(resp.get_json())
+    assert [[m["content"] for m in page] for page in pages] == [["m3", "m4"], ["m1", "m2"], ["m0"]]
+
+    full = client.get(url, headers=headers)
+    assert [m["content"] for m in full.get_json()] == ["m0", "m1", "m2", "m3", "m4"]
+    assert "X-Next-Cursor" not in full.headers
+
+
+def test_read_receipts_use_one_bulk_update(client, conversation, count_queries):
+    url, headers = conversation["url"], conversation["headers"]
+    db.session.expire_all()
+    with count_queries() as counter:
+        resp = client.get(url + "&limit=2", headers=headers)
+    updates = [s for s in counter.statements if s.lstrip().upper().startswith("UPDATE")]
+    assert len(updates) == 1
+    assert resp.get_json()[1]["readAt"] is not None  # m4, sent by the instructor
+    # The first page marked everything up to its newest message as read
+    assert Message.query.filter(Message.read_at.is_(None)).count() == 2  # m1, m3: sent by the student
+
+    with count_queries() as counter:
+        client.get(url + "&limit=2", headers=headers)
+    assert not [s for s in counter.statements if s.lstrip().upper().startswith("UPDATE")]
+
+
+def test_unread_page_costs_no_query_per_message(client, conversation, count_queries):
+    url, headers = conversation["url"], conversation["headers"]
+    first = Message.query.filter_by(content="m0").one()
+    for i in range(30):
+        db.session.add(Message(course_id=first.course_id, from_user_id=first.from_user_id, to_user_id=first.to_user_id,
+                               content=f"n{i}", created_at=datetime(2024, 2, 1) + timedelta(minutes=i)))
+    db.session.commit()
+    db.session.expire_all()
+    with count_queries() as unread:
+        resp = client.get(url + "&limit=30", headers=headers)
+    assert all(m["readAt"] for m in resp.get_json())
+    chat_routes._ACCESS_CACHE.clear()  # same access checks as the first request
+    db.session.expire_all()
+    with count_queries() as read:
+        client.get(url + "&limit=30", headers=headers)
+    # Only the bulk UPDATE (and its commit's BEGIN, if any) on top of the read page
+    assert unread.count <= read.count + 2, unread.statements
+
+
+def test_access_decision_is_cached(client, conversation, count_queries):
+    url, headers = conversation["url"], conversation["headers"]
+    db.session.expire_all()
+    with count_queries() as first:
+        client.get(url + "&limit=2", headers=headers)
+    db.session.expire_all()
+    with count_queries() as second:
+        client.get(url + "&limit=2", headers=headers)
+    assert not any('"Enrollments"' in s for s in second.statements)
+    assert second.count < first.count
+
+
+def test_invalid_cursor(client, conversation):
+    resp = client.get(conversation["url"] + "&cursor=not-a-cursor", headers=conversation["headers"])
+    assert resp.status_code == 400
+
+
+def test_send_rechecks_enrollment_despite_cached_access(client, conversation):
+    url, headers = conversation["url"], conversation["headers"]
+    assert client.get(url + "&limit=2", headers=headers).status_code == 200  # access now cached
+    enrollment = Enrollment.query.one()
+    course_id = enrollment.course_id
+    db.session.delete(enrollment)
+    db.session.commit()
+
+    resp = client.post("/api/chat/messages", headers=headers, json={"course_id": course_id, "content": "still here?"})
+    assert resp.status_code == 403
+    assert client.get(url + "&limit=2", headers=headers).status_code == 403
@@ -0,0 +1,105 @@
+"""Push delivery of course chat: in-process pub/sub, long-poll and SSE."""
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.models import db
+from app.models.model import Enrollment, Message
+from app.services.chat_events import InProcessBroker, conversation_channel, get_chat_broker
+
+
+@pytest.fixture()
+def conversation(app, client, auth_header, make_course, make_student):
+    course = make_course()
+    student = make_student()
+    db.session.add(Enrollment(student_id=student.id, course_id=course.id, status="active"))
+    db.session.commit()
+    instructor_user_id = course.instructor.user.id
+    return {
+        "course_id": course.id,
+        "student_id": student.id,
+        "student_user_id": student.user_id,
+        "instructor_user_id": instructor_user_id,
+        "student_headers": auth_header(student.user_id),
+        "instructor_headers": auth_header(instructor_user_id, "instructor"),
+    }
+
+
+def _send_later(app, client, conv, content, delay):
+    def _run():
+        time.sleep(delay)
+        with app.app_context():
+            client.post("/api/chat/messages", headers=conv["instructor_headers"],
+                        json={"course_id": conv["course_id"], "student_id": conv["student_id"], "content": content})
+    thread = threading.Thread(target=_run)
+    thread.start()
+    return thread
+
+
+def test_broker_delivers_per_channel():
+    broker = InProcessBroker()
+    channel = conversation_channel(1, 9, 4)
+    assert channel == conversation_channel(1, 4, 9)
+    with broker.subscribe(channel) as sub, broker.subscribe(conversation_channel(2, 4, 9)) as other:
+        assert broker.publish(channel, {"type": "message"}) == 1
+        assert sub.get(timeout=0) == {"type": "message"}
+        assert other.get(timeout=0) is None
+    assert broker.subscriber_count() == 0
+
+
+def test_long_poll_returns_when_message_is_sent(app, client, conversation):
+    conv = conversation
+    since = datetime.utcnow().isoformat()
+    sender = _send_later(app, client, conv, "Chào em", delay=0.2)
+    t0 = time.monotonic()
+    resp = client.get(f"/api/chat/messages?course_id={conv['course_id']}&since={since}&wait=5",
+                      headers=conv["student_headers"])
+    sender.join()
+    assert time.monotonic() - t0 < 4
+    messages = resp.get_json()
+    assert [m["content"] for m in messages] == ["Chào em"]
+    assert messages[0]["readAt"] is not None
+
+
+def test_idle_long_poll_times_out_without_extra_queries(client, conversation, count_queries):
+    conv = conversation
+    url = f"/api/chat/messages?course_id={conv['course_id']}&since={datetime.utcnow().isoformat()}"
+    client.get(url, headers=conv["student_headers"])  # caches the access decision
+    db.session.expire_all()
+    with count_queries() as plain:
+        client.get(url, headers=conv["student_headers"])
+    db.session.expire_all()
+    with count_queries() as parked:
+        t0 = time.monotonic()
+        resp = client.get(url + "&wait=0.3", headers=conv["student_headers"])
+    assert resp.get_json() == []
+    assert time.monotonic() - t0 >= 0.3
+    assert parked.count == plain.count
+    assert get_chat_broker().subscriber_count() == 0
+
+
+def test_sse_stream_pushes_sent_messages(client, conversation):
+    conv = conversation
+    db.session.add(Message(course_id=conv["course_id"], from_user_id=conv["instructor_user_id"],
+                           to_user_id=conv["student_user_id"], content="cũ", created_at=datetime(2024, 1, 1)))
+    db.session.commit()
+    resp = client.get(f"/api/chat/messages/stream?course_id={conv['course_id']}&since=2023-12-31T00:00:00&timeout=1",
+                      headers=conv["student_headers"], buffered=False)
+    assert resp.mimetype == "text/event-stream"
+    chunks = (chunk.decode("utf-8") for chunk in resp.response)
+    assert next(chunks).startswith("event: ready")
+    backlog = next(chunks)
+    assert json.loads(backlog.split("data: ", 1)[1])["content"] == "cũ"
+
+    client.post("/api/chat/messages", headers=conv["instructor_headers"],
+                json={"course_id": conv["course_id"], "student_id": conv["student_id"], "content": "mới"})
+    pushed = next(chunks)
+    assert pushed.startswith("event: message")
+    payload = json.loads(pushed.split("data: ", 1)[1])
+    assert payload["content"] == "mới" and payload["readAt"] is not None
+    rest = list(chunks)  # ends after ``timeout``
+    assert all(chunk.startswith(":") for chunk in rest)
+    assert Message.query.filter(Message.read_at.is_(None)).count() == 0
@@ -0,0 +1,106 @@
+"""SSE streaming of the Gemini chat endpoints against a local fake generator."""
+import json
+
+import pytest
+
+from app.models.model import AIChatMessage
+from app.routes import Student as student_routes
+from app.services.ai_streaming import ReplyStreamParser, set_stream_provider
+
+
+def _events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def _fake_provider(chunks, calls=None):
+    def _stream(prompt, model_name):
+        if calls is not None:
+            calls.append(prompt)
+        yield from chunks
+    return _stream
+
+
+def test_parser_withholds_json_block_split_across_chunks():
+    parser = ReplyStreamParser()
+    chunks = ["Try these", " courses.\n`", "``js", 'on\n{"courses": [{"id": 7, "reason": "fit"}],',
+              ' "follow_up": "More?"}\n```']
+    shown = "".join(parser.feed(c) for c in chunks)
+    tail, ai = parser.finish()
+    assert shown + tail == "Try these courses.\n"
+    assert ai["text"] == "Try these courses."
+    assert ai["courses"] == [{"id": 7, "reason": "fit"}]
+    assert ai["follow_up"] == "More?"
+
+
+def test_parser_without_json_block_flushes_everything():
+    parser = ReplyStreamParser()
+    shown = parser.feed("plain answer ``")
+    tail, ai = parser.finish()
+    assert shown + tail == "plain answer ``"
+    assert ai["courses"] == []
+
+
+@pytest.fixture()
+def chat_session(client, auth_header, make_student):
+    student = make_student()
+    headers = auth_header(student.user_id)
+    session_id = client.post("/api/student/recommend/chat/init", headers=headers).get_json()["sessionId"]
+    yield student, headers, session_id
+    student_routes._AI_CHAT_SESSIONS.clear()
+
+
+def test_recommend_chat_streams_tokens_then_courses(client, make_course, chat_session):
+    student, headers, session_id = chat_session
+    course = make_course(title="Flask APIs")
+    prompts = []
+    set_stream_provider(_fake_provider(
+        ["Học ", "Flask nhé!\n", "```json\n", json.dumps({"courses": [{"id": course.id, "reason": "backend"}]}),
+         "\n```"],
+        prompts,
+    ))
+
+    resp = client.post("/api/student/recommend/chat/message?stream=1", headers=headers,
+                       json={"sessionId": session_id, "message": "Tôi muốn học backend"})
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    events = _events(resp)
+    tokens = "".join(data["text"] for name, data in events if name == "token")
+    assert tokens == "Học Flask nhé!\n"
+    name, done = events[-1]
+    assert name == "done"
+    assert done["reply"] == "Học Flask nhé!"
+    assert done["coursesWithReasons"][0]["course"]["title"] == "Flask APIs"
+    assert "Flask APIs" in prompts[0] and "Tôi muốn học backend" in prompts[0]
+
+    history = student_routes._AI_CHAT_SESSIONS.get((student.user_id, session_id))["history"]
+    assert history[-1] == {"role": "assistant", "text": "Học Flask nhé!"}
+
+
+def test_ai_chat_stream_persists_reply_after_completion(client, auth_header, make_student):
+    student = make_student()
+    set_stream_provider(_fake_provider(["Xin ", "chào", "!"]))
+
+    resp = client.post("/api/ai/chat", headers={**auth_header(student.user_id), "Accept": "text/event-stream"},
+                       json={"prompt": "hello"})
+    events = _events(resp)
+    assert [data["text"] for name, data in events if name == "token"] == ["Xin ", "chào", "!"]
+    assert events[-1][0] == "done" and events[-1][1]["reply"] == "Xin chào!"
+
+    messages = AIChatMessage.query.order_by(AIChatMessage.id).all()
+    assert [(m.sent_by, m.content) for m in messages] == [("user", "hello"), ("ai", "Xin chào!")]
+
+
+def test_ai_chat_stream_falls_back_when_provider_fails(client):
+    def _broken(prompt, model_name):
+        raise RuntimeError("offline")
+        yield  # pragma: no cover
+
+    set_stream_provider(_broken)
+    events = _events(client.post("/api/ai/chat?stream=1", json={"prompt": "learn python"}))
+    name, done = events[-1]
+    assert name == "done" and done["warning"] == "offline"
+    assert done["reply"] == events[0][1]["text"]
@@ -0,0 +1,74 @@
+"""GET /api/chat/threads: grouped last-message/unread summaries with a constant query count."""
+from datetime import datetime, timedelta
+
+from app.models import db
+from app.models.model import Enrollment, Message
+
+
+def _enroll(student, course):
+    db.session.add(Enrollment(student_id=student.id, course_id=course.id, status="active"))
+
+
+def _message(course, from_user_id, to_user_id, content, minutes, read=False):
+    created = datetime(2024, 1, 1) + timedelta(minutes=minutes)
+    db.session.add(Message(
+        course_id=course.id, from_user_id=from_user_id, to_user_id=to_user_id,
+        content=content, created_at=created, read_at=created if read else None,
+    ))
+
+
+def _inbox(make_course, make_student, n_students):
+    course = make_course(title="Python")
+    other = make_course(title="SQL")
+    instructor_user_id = course.instructor.user.id
+    students = [make_student() for _ in range(n_students)]
+    for i, st in enumerate(students):
+        _enroll(st, course)
+        _message(course, st.user_id, instructor_user_id, f"hỏi {i}", minutes=i)
+        _message(course, instructor_user_id, st.user_id, f"trả lời {i}", minutes=i + 1, read=True)
+        _message(course, st.user_id, instructor_user_id, f"cảm ơn {i}", minutes=i + 2)
+    _enroll(students[0], other)
+    _message(other, students[0].user_id, other.instructor.user.id, "khác khóa", minutes=99)
+    db.session.commit()
+    return course, other, students
+
+
+def test_instructor_threads_are_per_student(client, auth_header, make_course, make_student):
+    course, _, students = _inbox(make_course, make_student, 3)
+    resp = client.get("/api/chat/threads", headers=auth_header(course.instructor.user.id, "instructor"))
+    threads = {t["studentId"]: t for t in resp.get_json()}
+    assert set(threads) == {s.id for s in students}
+    first = threads[students[0].id]
+    assert first["lastMessage"] == "cảm ơn 0"
+    assert first["unread"] == 2
+    assert first["courseTitle"] == "Python"
+
+
+def test_student_threads(client, auth_header, make_course, make_student):
+    course, other, students = _inbox(make_course, make_student, 2)
+    resp = client.get("/api/chat/threads", headers=auth_header(students[0].user_id))
+    threads = {t["courseId"]: t for t in resp.get_json()}
+    assert threads[course.id]["lastMessage"] == "cảm ơn 0"
+    assert threads[course.id]["unread"] == 0
+    assert threads[other.id]["lastMessage"] == "khác khóa"
+    assert threads[other.id]["instructorName"] == other.instructor.user.full_name
+
+
+def test_thread_listing_query_count_is_constant(client, auth_header, make_course, make_student, count_queries):
+    course, _, _ = _inbox(make_course, make_student, 3)
+    instructor_user_id = course.instructor.user.id
+    headers = auth_header(instructor_user_id, "instructor")
+    db.session.expire_all()  # the test shares the request's session; start both runs cold
+    with count_queries() as small:
+        client.get("/api/chat/threads", headers=headers)
+
+    for _ in range(20):
+        st = make_student()
+        _enroll(st, course)
+        _message(course, st.user_id, instructor_user_id, "xin chào", minutes=5)
+    db.session.commit()
+    db.session.expire_all()
+    with count_queries() as large:
+        resp = client.get("/api/chat/threads", headers=headers)
+    assert len(resp.get_json()) == 23
+    assert large.count == small.count
@@ -0,0 +1,67 @@
+"""Catalog endpoint must not issue per-course queries (N+1)."""
+from app.models import db
+
+
+def _catalog_query_count(client, count_queries):
+    db.session.expire_all()
+    with count_queries() as counter:
+        res = client.get("/api/student/courses")
+    assert res.status_code == 200
+    return counter.count, res.get_json()["courses"]
+
+
+def test_catalog_query_count_is_constant(client, make_course, count_queries):
+    for _ in range(3):
+        make_course()
+    small_count, small = _catalog_query_count(client, count_queries)
+
+    for _ in range(20):
+        make_course()
+    large_count, large = _catalog_query_count(client, count_queries)
+
+    assert len(small) == 3
+    assert len(large) == 23
+    assert large_count == small_count
+    # count + courses + categories + topics
+    assert small_count <= 4
+
+
+def test_catalog_payload_includes_related_names(client, make_course):
+    course = make_course(level="advanced")
+    res = client.get("/api/student/courses?level=advanced")
+    item = res.get_json()["courses"][0]
+    assert item["id"] == course.id
+    assert item["instructorName"] == "Instructor 1"
+    assert item["categories"] == ["Category 1"]
+    assert item["topics"] == ["Topic 1"]
+
+
+def test_catalog_keyset_pagination_walks_all_pages(client, make_course):
+    ids = {make_course().id for _ in range(7)}
+    seen = []
+    cursor = None
+    while True:
+        url = "/api/student/courses?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        res = client.get(url)
+        assert res.status_code == 200
+        assert res.headers["X-Total-Count"] == "7"
+        body = res.get_json()
+        assert len(body["courses"]) <= 3
+        seen.extend(c["id"] for c in body["courses"])
+        cursor = body["nextCursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen))
+    assert set(seen) == ids
+
+
+def test_catalog_fields_projection(client, make_course):
+    make_course()
+    res = client.get("/api/student/courses?limit=10&fields=title,price")
+    item = res.get_json()["courses"][0]
+    assert set(item) == {"id", "title", "price"}
+
+
+def test_catalog_invalid_cursor(client):
+    res = client.get("/api/student/courses?cursor=not-a-cursor")
+    assert res.status_code == 400
@@ -0,0 +1,55 @@
+"""Shared course-context snapshot used by the Gemini prompt builders."""
+import json
+
+from app.models import db
+from app.routes.AI import _build_course_context
+from app.services.course_context import get_course_context
+from app.services.course_sync import on_course_saved
+
+
+def test_snapshot_is_built_once_and_reused(make_course, count_queries):
+    for _ in range(3):
+        make_course()
+    first = get_course_context()
+    with count_queries() as counter:
+        again = get_course_context()
+        _build_course_context(None, limit=10)
+    assert again is first
+    assert counter.count == 0
+
+    catalog = json.loads(first.catalog_json)
+    assert [c["title"] for c in catalog] == [c["title"] for c in first.catalog]
+    assert {c["id"] for c in catalog} == set(first.details)
+    assert catalog[0]["categories"] and catalog[0]["topics"]
+
+
+def test_course_write_bumps_version(make_course):
+    course = make_course(title="Old title")
+    before = get_course_context()
+    course.title = "New title"
+    db.session.commit()
+    on_course_saved(course)
+    after = get_course_context()
+    assert after.version == before.version + 1
+    assert after.details[course.id]["title"] == "New title"
+
+
+def test_public_course_lines_filter_and_number(make_course):
+    make_course(title="Python basics", description="Learn python")
+    make_course(title="Hidden python", is_public=False)
+    make_course(title="Cooking", description="Pasta")
+    make_course(title="Advanced Python", level="advanced")
+
+    lines = _build_course_context("PYTHON", limit=10).splitlines()
+    assert [line.split(";")[0] for line in lines] == ["1) Ten: Advanced Python", "2) Ten: Python basics"]
+    assert _build_course_context("nothing-matches") == ""
+    assert len(_build_course_context(None, limit=2).splitlines()) == 2
+
+
+def test_archiving_a_course_refreshes_the_context(client, auth_header, make_course):
+    course = make_course(title="Python basics", description="Learn python")
+    assert _build_course_context("python") != ""
+    resp = client.put(f"/api/courses/{course.id}/archive", json={"is_archived": True},
+                      headers=auth_header(course.instructor.user_id, "instructor"))
+    assert resp.status_code == 200 and resp.get_json()["status"] == "archived"
+    assert _build_course_context("python") == ""
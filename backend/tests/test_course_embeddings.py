@@ -0,0 +1,87 @@
+"""Persisted course embeddings: backfill, change detection, read-only request path."""
+import pytest
+
+from app.models import db
+from app.services import course_embeddings, recommender
+from app.services.course_index import course_index
+
+
+class _QueryOnlyBackend(recommender.EmbeddingBackend):
+    name = "fake"
+
+    def available(self):
+        return True
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+@pytest.fixture()
+def fake_embedder(monkeypatch):
+    calls = []
+
+    def _embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    monkeypatch.setattr(course_embeddings, "embed_documents", _embed)
+    return calls
+
+
+def test_backfill_stores_vectors_and_skips_unchanged(make_course, fake_embedder):
+    from app.models.model import Course
+
+    ids = [make_course().id for _ in range(5)]
+
+    totals = course_embeddings.backfill_course_embeddings(batch_size=2)
+    assert totals == {"embedded": 5, "skipped": 0, "failed": 0}
+    assert len(fake_embedder) == 3  # batches of 2, 2, 1
+    for cid in ids:
+        stored = db.session.get(Course, cid)
+        assert stored.embedding_vector and stored.embedding_hash == course_embeddings.content_hash(stored)
+        assert stored.id in course_index
+
+    fake_embedder.clear()
+    assert course_embeddings.backfill_course_embeddings()["skipped"] == 5
+    assert fake_embedder == []
+
+    edited = db.session.get(Course, ids[0])
+    edited.title = "Renamed course"
+    db.session.commit()
+    expected_text = recommender.course_text(edited)
+    assert course_embeddings.backfill_course_embeddings() == {"embedded": 1, "skipped": 4, "failed": 0}
+    assert fake_embedder == [[expected_text]]
+
+
+def test_semantic_recommend_never_embeds_courses(make_course, monkeypatch):
+    indexed = make_course(title="Python basics")
+    make_course(title="Cooking")
+    course_index.build([(indexed.id, [1.0, 0.0])])
+
+    def _fail(texts):
+        raise AssertionError("course embedding requested in the request path")
+
+    monkeypatch.setattr(recommender, "embed_documents", _fail)
+    monkeypatch.setattr(course_embeddings, "embed_documents", _fail)
+    recommender.set_embedding_backend(_QueryOnlyBackend())
+
+    result = recommender.semantic_recommend("learn something", limit=2)
+    assert result[0]["id"] == indexed.id
+
+
+def test_semantic_recommend_scores_only_a_shortlist(make_course, monkeypatch):
+    courses = [make_course(title=f"Course {i}") for i in range(12)]
+    make_course(title="Guitar chords")
+    # Course 0 is the closest vector, course 11 the farthest
+    course_index.build([(c.id, [1.0, i / 10]) for i, c in enumerate(courses)])
+    monkeypatch.setattr(recommender, "SEMANTIC_CANDIDATES", 3)
+    scored = []
+    real_scores = recommender._keyword_scores
+    monkeypatch.setattr(recommender, "_keyword_scores",
+                        lambda query, texts: scored.append(list(texts)) or real_scores(query, texts))
+    recommender.set_embedding_backend(_QueryOnlyBackend())
+
+    result = recommender.semantic_recommend("guitar", limit=3)
+    assert len(scored) == 1 and len(scored[0]) == 4  # 3 nearest vectors + 1 keyword match
+    assert result[0]["title"] == "Guitar chords"
+    assert [r["id"] for r in result[1:]] == [courses[0].id, courses[1].id]
@@ -0,0 +1,44 @@
+"""Vectorised course embedding index."""
+import numpy as np
+
+from app.services.course_index import CourseEmbeddingIndex
+
+
+def _brute_force(vectors, query, k):
+    q = query / np.linalg.norm(query)
+    sims = {cid: float(np.dot(v / np.linalg.norm(v), q)) for cid, v in vectors.items()}
+    return sorted(sims, key=sims.get, reverse=True)[:k]
+
+
+def test_search_matches_brute_force_after_updates():
+    rng = np.random.default_rng(0)
+    vectors = {cid: rng.normal(size=16) for cid in range(1, 301)}
+    index = CourseEmbeddingIndex(initial_capacity=8)
+    index.build(list(vectors.items())[:100])
+    for cid, vec in list(vectors.items())[100:]:
+        index.upsert(cid, vec)
+    for cid in range(1, 301, 7):
+        index.remove(cid)
+        del vectors[cid]
+    vectors[5] = rng.normal(size=16)
+    index.upsert(5, vectors[5])
+
+    query = rng.normal(size=16)
+    assert len(index) == len(vectors)
+    assert [cid for cid, _ in index.search(query, 10)] == _brute_force(vectors, query, 10)
+
+
+def test_search_respects_allowed_ids_and_score_defaults():
+    index = CourseEmbeddingIndex()
+    index.build([(1, [1.0, 0.0]), (2, [0.0, 1.0]), (3, [0.7, 0.7])])
+    assert [cid for cid, _ in index.search([1.0, 0.1], 5, allowed_ids=[2, 3])] == [3, 2]
+    scores = index.score([1.0, 0.0], [1, 99])
+    assert scores[0] == 1.0 and scores[1] == 0.0
+
+
+def test_rejects_mismatched_and_zero_vectors():
+    index = CourseEmbeddingIndex()
+    assert index.upsert(1, [1.0, 2.0, 3.0])
+    assert not index.upsert(2, [1.0, 2.0])
+    assert not index.upsert(3, [0.0, 0.0, 0.0])
+    assert len(index) == 1
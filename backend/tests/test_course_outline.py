@@ -0,0 +1,64 @@
+"""Cached course outline for /api/student/course/<id>/sections-lessons."""
+from datetime import datetime
+
+from app.models import db
+from app.models.model import LessonProgress, TestAttempt as Attempt
+
+
+def _outline(client, course_id, headers=None):
+    res = client.get(f"/api/student/course/{course_id}/sections-lessons", headers=headers or {})
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def test_outline_totals_and_student_overlay(client, make_course, make_test, make_student, auth_header):
+    course = make_course()
+    test = make_test(course, num_questions=4, points=2)
+    student = make_student()
+    lesson_id = test.lesson_id
+    db.session.add(LessonProgress(student_id=student.id, lesson_id=lesson_id, status="completed"))
+    now = datetime.utcnow()
+    for number, score in enumerate((4.0, 7.5), start=1):
+        db.session.add(Attempt(student_id=student.id, test_id=test.id, attempt_number=number,
+                               start_time=now, total_score=score))
+    db.session.commit()
+
+    body = _outline(client, course.id, auth_header(student.user_id))
+    lesson = body["sections"][0]["lessons"][0]
+    assert lesson["completed"] is True
+    assert lesson["tests"][0]["totalScore"] == 8
+    assert lesson["tests"][0]["lastScore"] == 7.5
+
+    anonymous = _outline(client, course.id)["sections"][0]["lessons"][0]
+    assert anonymous["completed"] is False
+    assert anonymous["tests"][0]["lastScore"] is None
+
+
+def test_outline_is_cached_with_constant_overlay_queries(client, make_course, make_test, make_student,
+                                                         auth_header, count_queries):
+    course = make_course()
+    for _ in range(5):
+        make_test(course, num_questions=3)
+    student = make_student()
+    headers = auth_header(student.user_id)
+    _outline(client, course.id, headers)
+
+    with count_queries() as counter:
+        _outline(client, course.id, headers)
+    # student lookup + lesson progress + latest attempts
+    assert counter.count <= 3
+
+
+def test_instructor_question_write_invalidates_outline(client, make_course, make_test, auth_header):
+    course = make_course()
+    test = make_test(course, num_questions=2)
+    instructor_user_id = course.instructor.user_id
+    assert _outline(client, course.id)["sections"][0]["lessons"][0]["tests"][0]["totalScore"] == 2
+
+    res = client.post(
+        f"/tests/{test.id}/questions",
+        json={"content": "New", "points": 3, "choices": [{"text": "a", "isCorrect": True}]},
+        headers=auth_header(instructor_user_id, role="instructor"),
+    )
+    assert res.status_code == 201
+    assert _outline(client, course.id)["sections"][0]["lessons"][0]["tests"][0]["totalScore"] == 5
@@ -0,0 +1,53 @@
+"""Local (TF-IDF + SVD) embedding backend and backend selection."""
+import numpy as np
+
+from app.services import recommender
+from app.services.course_embeddings import backfill_course_embeddings
+
+CORPUS = [
+    "Python programming for beginners | variables loops functions | Programming Python",
+    "Advanced Python data analysis with pandas and numpy | Data Science Python",
+    "Web development with JavaScript React and HTML CSS | Web JavaScript",
+    "Cooking italian pasta and pizza at home | Lifestyle Cooking",
+    "Guitar lessons chords and rhythm for beginners | Music Guitar",
+    "Machine learning with scikit-learn regression classification | Data Science Machine Learning",
+]
+
+
+def test_local_backend_is_deterministic_and_normalized():
+    a, b = recommender.LocalEmbeddingBackend(n_components=4), recommender.LocalEmbeddingBackend(n_components=4)
+    assert a.fit(CORPUS) and b.fit(CORPUS)
+    assert a.model_id() == b.model_id()
+    va, vb = a.embed_documents(CORPUS), b.embed_documents(CORPUS)
+    assert np.allclose(va, vb)
+    assert np.allclose(np.linalg.norm(va, axis=1), 1.0, atol=1e-5)
+    assert a.embed_query("") is None
+
+
+def test_local_backend_ranks_related_course_first():
+    backend = recommender.LocalEmbeddingBackend(n_components=4)
+    backend.fit(CORPUS)
+    docs = np.asarray(backend.embed_documents(CORPUS))
+    q = np.asarray(backend.embed_query("learn python loops"))
+    top2 = set(np.argsort(-(docs @ q))[:2].tolist())
+    assert top2 == {0, 1}  # both Python courses
+
+
+def test_backend_selection_from_env(monkeypatch):
+    monkeypatch.setenv("RECOMMENDER_EMBED_BACKEND", "local")
+    recommender.set_embedding_backend(None)
+    assert isinstance(recommender.get_embedding_backend(), recommender.LocalEmbeddingBackend)
+    monkeypatch.setenv("RECOMMENDER_EMBED_BACKEND", "bogus")
+    recommender.set_embedding_backend(None)
+    assert not recommender.embedding_available()
+
+
+def test_semantic_recommend_with_local_backend(make_course):
+    for text in CORPUS:
+        title, description = text.split(" | ", 1)
+        make_course(title=title, description=description)
+    recommender.set_embedding_backend(recommender.LocalEmbeddingBackend(n_components=4))
+
+    assert backfill_course_embeddings()["embedded"] == len(CORPUS)
+    result = recommender.semantic_recommend("guitar chords", limit=3)
+    assert result[0]["title"].startswith("Guitar")
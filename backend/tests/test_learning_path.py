@@ -0,0 +1,82 @@
+"""Learning-path timeline materialized at creation (/api/learning-path/<user_id>)."""
+from app.models import db, LearningPath, LearningPathItem, SkillProfile
+from app.services.ai_learning_path import generate_week_description
+
+
+def _profile(user_id, course_ids, weaknesses=("web",)):
+    profile = SkillProfile(
+        user_id=user_id,
+        level="beginner",
+        strengths=["logic"],
+        weaknesses=list(weaknesses),
+        recommended_topics=["Python"],
+        recommended_course_ids=course_ids,
+        language="python",
+    )
+    db.session.add(profile)
+    db.session.commit()
+    return profile
+
+
+def test_creation_materializes_descriptions_and_courses(client, auth_header, make_student, make_course):
+    student = make_student()
+    courses = [make_course(title=f"Python {i}", slug=f"python-{i}") for i in range(3)]
+    _profile(student.user_id, [c.id for c in courses])
+
+    resp = client.post(f"/api/learning-path/{student.user_id}", headers=auth_header(student.user_id))
+    assert resp.status_code == 201
+
+    items = LearningPathItem.query.order_by(LearningPathItem.week_number).all()
+    assert len(items) == 6
+    assert [c["slug"] for item in items for c in item.courses] == ["python-0", "python-1", "python-2"]
+    assert items[0].description == generate_week_description("beginner", ["logic"], ["web"], 1)
+
+    timeline = client.get(f"/api/learning-path/{student.user_id}").get_json()["timeline"]
+    assert [w["week"] for w in timeline] == [1, 2, 3, 4, 5, 6]
+    assert timeline[1]["courses"] == [{"id": courses[0].id, "title": "Python 0", "slug": "python-0"}]
+
+
+def test_read_uses_constant_queries(client, auth_header, make_student, make_course, count_queries):
+    student = make_student()
+    courses = [make_course() for _ in range(4)]
+    _profile(student.user_id, [c.id for c in courses])
+    headers = auth_header(student.user_id)
+    client.post(f"/api/learning-path/{student.user_id}", headers=headers)
+    client.post(f"/api/learning-path/{student.user_id}", headers=headers)  # older path must be ignored
+    url = f"/api/learning-path/{student.user_id}"
+
+    with count_queries() as counter:
+        body = client.get(url).get_json()
+    assert len(body["timeline"]) == 6
+    assert len(body["skill_profile"]["recommended_courses"]) == 4
+    # latest profile + latest path items + one batched course lookup
+    assert counter.count == 3, counter.statements
+
+
+def test_legacy_rows_resolve_courses_outside_the_profile(client, make_student, make_course):
+    student = make_student()
+    recommended, other = make_course(), make_course(title="Outside", slug="outside")
+    _profile(student.user_id, [recommended.id])
+    path = LearningPath(user_id=student.user_id)
+    path.items.append(LearningPathItem(week_number=1, title="Week 1", course_ids=[other.id]))
+    db.session.add(path)
+    db.session.commit()
+
+    timeline = client.get(f"/api/learning-path/{student.user_id}").get_json()["timeline"]
+    assert timeline[0]["courses"] == [{"id": other.id, "title": "Outside", "slug": "outside"}]
+    assert timeline[0]["description"] == generate_week_description("beginner", ["logic"], ["web"], 1)
+
+
+def test_missing_profile(client, auth_header):
+    assert client.post("/api/learning-path/999", headers=auth_header(999)).status_code == 404
+    body = client.get("/api/learning-path/999").get_json()
+    assert body["timeline"] == [] and body["skill_profile"]["level"] == "pending"
+
+
+def test_creation_is_limited_to_the_user_or_an_admin(client, auth_header, make_student):
+    student = make_student()
+    _profile(student.user_id, [])
+    url = f"/api/learning-path/{student.user_id}"
+    assert client.post(url).status_code == 401
+    assert client.post(url, headers=auth_header(make_student().user_id)).status_code == 403
+    assert client.post(url, headers=auth_header(1000, "admin")).status_code == 201
@@ -0,0 +1,148 @@
+"""Shared LLM client: retries, deadlines, rate limiting, concurrency caps, metrics, fake backend."""
+import json
+import threading
+import time
+
+import pytest
+
+from app.services import llm_client
+from app.services.llm_client import (
+    FakeLLMBackend, GeminiBackend, LLMClient, LLMHTTPError, LLMTimeout,
+)
+
+
+def _client(backend, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    kwargs.setdefault("rate", 0)
+    client = LLMClient(**kwargs)
+    client.override = backend
+    return client
+
+
+def test_retries_retryable_errors_with_backoff():
+    backend = FakeLLMBackend(responder=lambda prompt, model: "ok", failures=2)
+    client = _client(backend)
+
+    result = client.generate("hi", "m1")
+    assert result.text == "ok" and result.attempts == 3
+    stats = client.stats()[0]
+    assert stats["calls"] == 1 and stats["retries"] == 2 and stats["errors"] == 0
+
+
+def test_gives_up_after_max_retries_and_on_client_errors():
+    client = _client(FakeLLMBackend(failures=5), max_retries=1)
+    with pytest.raises(LLMHTTPError):
+        client.generate("hi", "m1")
+    assert len(client.override.calls) == 2
+
+    def _bad_request(prompt, model):
+        raise LLMHTTPError(400, "bad prompt")
+
+    backend = FakeLLMBackend(responder=_bad_request)
+    with pytest.raises(LLMHTTPError):
+        _client(backend).generate("hi", "m1")
+    assert len(backend.calls) == 1
+
+
+def test_concurrency_is_capped_per_model():
+    active = peak = 0
+    lock = threading.Lock()
+
+    def _slow(prompt, model):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.05)
+        with lock:
+            active -= 1
+        return "ok"
+
+    client = _client(FakeLLMBackend(responder=_slow), model_concurrency=2)
+    threads = [threading.Thread(target=client.generate, args=("hi", "m1")) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak == 2
+    assert client.stats()[0]["calls"] == 6
+
+
+def test_deadline_covers_waiting_for_a_slot():
+    client = _client(FakeLLMBackend(latency=0.3), model_concurrency=1)
+    worker = threading.Thread(target=client.generate, args=("hi", "m1"))
+    worker.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(LLMTimeout):
+        client.generate("hi", "m1", timeout=0.1)
+    assert time.monotonic() - started < 0.25
+    worker.join()
+
+
+def test_token_bucket_limits_call_rate():
+    client = _client(FakeLLMBackend(), rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        client.generate("hi", "m1")
+    assert time.monotonic() - started >= 4 / 20 * 0.9
+
+
+def test_stream_yields_chunks_and_records_tokens():
+    client = _client(FakeLLMBackend(responder=lambda prompt, model: "xin chao ban"))
+    assert list(client.stream("one two", "m1")) == ["xin ", "chao ", "ban"]
+    stats = client.stats()[0]
+    assert stats["inputTokens"] == 2 and stats["outputTokens"] == 3
+
+
+class _Response:
+    def __init__(self, status, payload, headers=None):
+        self.status_code = status
+        self._payload = payload
+        self.headers = headers or {}
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+
+class _Session:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        return self.responses.pop(0)
+
+
+def test_gemini_rest_backend_parses_text_and_usage(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "k")
+    session = _Session([
+        _Response(503, {"error": {"message": "overloaded"}}, {"Retry-After": "0"}),
+        _Response(200, {
+            "candidates": [{"content": {"parts": [{"text": "Hello "}, {"text": "world"}]}}],
+            "usageMetadata": {"promptTokenCount": 4, "candidatesTokenCount": 2},
+        }),
+    ])
+    client = LLMClient(backends={"gemini": GeminiBackend(base_url="http://llm.test")}, rate=0, backoff_base=0.01)
+    client._session = session
+
+    result = client.generate("hi", "models/gemini-x", temperature=0.2)
+    assert result.text == "Hello world"
+    assert (result.input_tokens, result.output_tokens, result.attempts) == (4, 2, 2)
+    method, url, kwargs = session.requests[-1]
+    assert url == "http://llm.test/models/gemini-x:generateContent"
+    assert kwargs["headers"] == {"x-goog-api-key": "k"}
+    assert kwargs["json"]["generationConfig"] == {"temperature": 0.2}
+
+
+def test_routes_use_the_shared_client(client):
+    quiz = [{"question": "Q?", "options": ["a", "b", "c", "d"], "correctAnswer": 1}]
+    llm_client.set_llm_backend(FakeLLMBackend(responder=lambda prompt, model: json.dumps(quiz)))
+
+    body = client.post("/api/ai/quiz/generate", json={"lesson_title": "Loops"}).get_json()
+    assert body["questions"] == quiz
+
+    stats = client.get("/api/admin/llm/stats").get_json()["models"]
+    assert [(s["provider"], s["model"], s["calls"]) for s in stats] == [("fake", "gemini-2.5-flash", 1)]
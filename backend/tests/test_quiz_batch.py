@@ -0,0 +1,149 @@
+"""Concurrent /api/ai/quiz/generate-batch against a stubbed model client with latency."""
+import json
+import threading
+import time
+
+import pytest
+
+from app.routes import AIQuiz
+from app.services import quiz_batch
+from app.utils.cache import BoundedCache
+
+
+class SlowModel:
+    """Stands in for Gemini: sleeps, tracks peak concurrency, returns one question."""
+
+    def __init__(self, latency=0.1, slow_titles=(), slow_latency=1.0):
+        self.latency = latency
+        self.slow_titles = set(slow_titles)
+        self.slow_latency = slow_latency
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, model_name=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            slow = any(f'"{t}"' in prompt for t in self.slow_titles)
+            time.sleep(self.slow_latency if slow else self.latency)
+            return json.dumps([{"question": "Q?", "options": ["a", "b", "c", "d"], "correctAnswer": 0}])
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture()
+def slow_model(monkeypatch):
+    def _install(**kwargs):
+        model = SlowModel(**kwargs)
+        monkeypatch.setattr(AIQuiz, "_prompt_gemini_quiz", model)
+        return model
+    return _install
+
+
+def _lessons(n):
+    return [{"id": i, "title": f"Lesson {i}"} for i in range(n)]
+
+
+def test_batch_fans_out_with_bounded_concurrency(client, slow_model):
+    model = slow_model(latency=0.15)
+    started = time.monotonic()
+    resp = client.post("/api/ai/quiz/generate-batch", json={"lessons": _lessons(6), "concurrency": 3})
+    elapsed = time.monotonic() - started
+
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert [r["lesson_id"] for r in body["results"]] == list(range(6))
+    assert body["successful"] == 6 and body["timed_out"] == 0
+    assert model.peak == 3
+    assert elapsed < 6 * 0.15 * 0.75  # serial would take ~0.9s
+
+
+def test_slow_lesson_times_out_with_partial_results(client, slow_model):
+    slow_model(latency=0.05, slow_titles=["Lesson 1"], slow_latency=1.0)
+    resp = client.post("/api/ai/quiz/generate-batch",
+                       json={"lessons": _lessons(3), "concurrency": 3, "lesson_timeout": 0.3})
+    results = resp.get_json()["results"]
+    assert results[1]["timed_out"] and results[1]["questions"] == []
+    assert results[0]["count"] == 1 and results[2]["count"] == 1
+    assert resp.get_json()["successful"] == 2
+
+
+def test_batch_validation(client):
+    assert client.post("/api/ai/quiz/generate-batch", json={"lessons": []}).status_code == 400
+    resp = client.post("/api/ai/quiz/generate-batch", json={"lessons": _lessons(1), "lesson_timeout": -1})
+    assert resp.status_code == 400
+
+
+def test_async_job_submit_poll_fetch(client, slow_model):
+    slow_model(latency=0.05)
+    resp = client.post("/api/ai/quiz/generate-batch/jobs", json={"lessons": _lessons(5), "concurrency": 2})
+    assert resp.status_code == 202
+    job = resp.get_json()
+    assert job["total"] == 5
+
+    status = None
+    for _ in range(100):
+        status = client.get(job["status_url"]).get_json()
+        if status["status"] == "done":
+            break
+        time.sleep(0.02)
+    assert status["status"] == "done" and status["completed"] == 5
+
+    results = client.get(job["results_url"])
+    assert results.status_code == 200
+    assert sorted(r["lesson_id"] for r in results.get_json()["results"]) == list(range(5))
+    assert client.get("/api/ai/quiz/generate-batch/jobs/unknown").status_code == 404
+
+
+def _wait_for_abandoned_calls(limit=0, attempts=200):
+    for _ in range(attempts):
+        if quiz_batch.abandoned_calls() <= limit:
+            return
+        time.sleep(0.02)
+    raise AssertionError("abandoned calls never finished")
+
+
+def test_hung_calls_are_capped_and_released(client, slow_model, monkeypatch):
+    _wait_for_abandoned_calls()  # leftovers from earlier timeouts
+    monkeypatch.setattr(quiz_batch, "MAX_ABANDONED", 1)
+    slow_model(latency=0.02, slow_titles=["Lesson 0"], slow_latency=0.6)
+
+    first = client.post("/api/ai/quiz/generate-batch", json={"lessons": _lessons(2), "lesson_timeout": 0.1})
+    assert first.get_json()["timed_out"] == 1
+    assert quiz_batch.abandoned_calls() == 1
+
+    # Cap reached: new work fails fast instead of queueing behind the hung call
+    blocked = client.post("/api/ai/quiz/generate-batch", json={"lessons": _lessons(3)[1:]}).get_json()
+    assert blocked["timed_out"] == 2 and blocked["successful"] == 0
+    assert "stalled" in blocked["results"][0]["error"]
+
+    _wait_for_abandoned_calls()
+    recovered = client.post("/api/ai/quiz/generate-batch", json={"lessons": _lessons(3)[1:]}).get_json()
+    assert recovered["successful"] == 2
+
+
+def test_running_job_is_not_evicted(client, slow_model, monkeypatch):
+    monkeypatch.setattr(quiz_batch, "_JOBS", BoundedCache("test.jobs", maxsize=1, ttl=60))
+    slow_model(latency=0.02, slow_titles=["Lesson 0"], slow_latency=0.4)
+    slow = client.post("/api/ai/quiz/generate-batch/jobs", json={"lessons": _lessons(1)}).get_json()
+
+    quick = [client.post("/api/ai/quiz/generate-batch/jobs", json={"lessons": _lessons(3)[1:]}).get_json()
+             for _ in range(3)]
+    for _ in range(100):
+        if all(client.get(j["status_url"]).status_code == 404 for j in quick[:-1]):
+            break
+        time.sleep(0.02)
+    # Finished jobs compete for the one slot; the running one stays pollable
+    assert client.get(quick[0]["status_url"]).status_code == 404
+    running = client.get(slow["status_url"])
+    assert running.status_code == 200 and running.get_json()["status"] != "done"
+
+    for _ in range(100):
+        status = client.get(slow["status_url"]).get_json()
+        if status["status"] == "done":
+            break
+        time.sleep(0.02)
+    assert status["status"] == "done" and status["completed"] == 1
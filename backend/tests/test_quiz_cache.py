@@ -0,0 +1,117 @@
+"""Persistent quiz cache behind /api/ai/quiz/generate."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import AIQuizCacheEntry, db
+from app.routes import AIQuiz
+from app.services.quiz_cache import quiz_cache, quiz_cache_key
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, prompt, model_name=None):
+        self.calls += 1
+        return json.dumps([{"question": f"Q{self.calls}?", "options": ["a", "b", "c", "d"], "correctAnswer": 0}])
+
+
+@pytest.fixture()
+def model(monkeypatch):
+    stub = CountingModel()
+    monkeypatch.setattr(AIQuiz, "_prompt_gemini_quiz", stub)
+    return stub
+
+
+@pytest.fixture()
+def limits(monkeypatch):
+    def _set(ttl=None, max_entries=None):
+        if ttl is not None:
+            monkeypatch.setattr(quiz_cache, "ttl", ttl)
+        if max_entries is not None:
+            monkeypatch.setattr(quiz_cache, "max_entries", max_entries)
+    return _set
+
+
+def _generate(client, title="Python Loops", **extra):
+    body = {"lesson_title": title, "num_questions": 3, "difficulty": "easy", **extra}
+    resp = client.post("/api/ai/quiz/generate", json=body)
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_repeated_generation_is_served_from_cache(client, model):
+    before = quiz_cache.stats()
+    first = _generate(client)
+    second = _generate(client, title="  python   LOOPS ")
+
+    assert model.calls == 1
+    assert first["cached"] is False and second["cached"] is True
+    assert second["questions"] == first["questions"]
+    after = quiz_cache.stats()
+    assert after["hits"] - before["hits"] == 1
+    assert after["misses"] - before["misses"] == 1
+    assert after["size"] == 1
+
+
+def test_any_key_part_changes_the_entry(client, model, monkeypatch):
+    _generate(client)
+    _generate(client, difficulty="hard")
+    _generate(client, num_questions=4)
+    _generate(client, model="gemini-other")
+    monkeypatch.setattr(AIQuiz, "QUIZ_PROMPT_VERSION", "2")
+    _generate(client)
+    assert model.calls == 5
+    assert len({
+        quiz_cache_key("1", "Python Loops", 3, "easy", "gemini-2.5-flash"),
+        quiz_cache_key("2", "Python Loops", 3, "easy", "gemini-2.5-flash"),
+        quiz_cache_key("1", "Python Loops", 3, "hard", "gemini-2.5-flash"),
+    }) == 3
+
+
+def test_regenerate_bypasses_and_replaces_entry(client, model):
+    _generate(client)
+    fresh = _generate(client, regenerate=True)
+    again = _generate(client)
+
+    assert model.calls == 2
+    assert fresh["cached"] is False
+    assert again["cached"] is True and again["questions"] == fresh["questions"]
+
+
+def test_expired_entries_are_regenerated(app, client, model):
+    _generate(client)
+    entry = AIQuizCacheEntry.query.one()
+    entry.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    assert _generate(client)["cached"] is False
+    assert model.calls == 2
+
+
+def test_least_recently_used_entries_are_evicted(client, model, limits):
+    limits(max_entries=2)
+    _generate(client, title="A")
+    _generate(client, title="B")
+    _generate(client, title="A")  # hit: B is now the least recently used
+    _generate(client, title="C")
+
+    titles = {e.lesson_title for e in AIQuizCacheEntry.query.all()}
+    assert titles == {"A", "C"}
+    assert _generate(client, title="B")["cached"] is False
+
+
+def test_failed_generation_is_not_cached(client, monkeypatch):
+    monkeypatch.setattr(AIQuiz, "_prompt_gemini_quiz", lambda prompt, model_name=None: "not json")
+    resp = client.post("/api/ai/quiz/generate", json={"lesson_title": "X"})
+    assert resp.status_code == 206
+    assert AIQuizCacheEntry.query.count() == 0
+
+
+def test_stats_endpoint_lists_quiz_cache(client, model, auth_header):
+    _generate(client)
+    resp = client.get("/api/admin/cache/stats", headers=auth_header(1, "admin"))
+    names = [c["name"] for c in resp.get_json()["caches"]]
+    assert "ai_quiz.generations" in names
@@ -0,0 +1,47 @@
+"""Keyword recommender served from the in-memory course keyword index."""
+from app.models import db
+from app.services.course_keyword_index import course_keyword_index, ensure_course_keyword_index
+from app.services.course_sync import on_course_deleted, on_course_saved
+from app.services.recommender import recommend_courses
+
+
+def test_filters_rank_and_relax_to_three(make_course):
+    target = make_course(level="advanced")
+    make_course(level="advanced")
+    make_course(level="beginner")
+    make_course(level="beginner")
+
+    result = recommend_courses(level="advanced", major="Category 1", limit=6)
+    # Only one course matches both filters: topic relaxation is a no-op, then the level is relaxed,
+    # then the most recent courses fill up to three results.
+    assert result[0]["id"] == target.id
+    assert len(result) == 3
+    assert result[0]["categories"] == ["Category 1"]
+    assert result[0]["instructorName"] == "Instructor 1"
+
+
+def test_recommend_runs_without_queries_once_indexed(make_course, count_queries):
+    for _ in range(5):
+        make_course()
+    ensure_course_keyword_index()
+    with count_queries() as counter:
+        recommend_courses(major="category-2", topic="topic 2", limit=3)
+    assert counter.count == 0
+
+
+def test_index_follows_course_writes(make_course):
+    course = make_course(title="Intro to Rust")
+    make_course()
+    ensure_course_keyword_index()
+    assert course.id in course_keyword_index.keyword_hits("rust")
+
+    course.title = "JavaScript in depth"
+    db.session.commit()
+    on_course_saved(course)
+    assert course.id not in course_keyword_index.keyword_hits("rust")
+    # exact token hit in the title = full weight, partial containment = half
+    assert course_keyword_index.keyword_hits("javascript")[course.id] == 3.0
+    assert course_keyword_index.keyword_hits("java")[course.id] == 1.5
+
+    on_course_deleted(course.id)
+    assert course.id not in course_keyword_index.filter_ids()
@@ -0,0 +1,139 @@
+"""Session store backends (memory, shared SQL table) and the stores built on them."""
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from app.models.session_entry import SessionEntry
+from app.routes import EmailVerification as email_routes
+from app.routes import Student as student_routes
+from app.services.ai_streaming import set_stream_provider
+from app.utils import session_store as store_module
+from app.utils.session_store import MemoryBackend, SQLBackend, SessionStore, set_session_backend
+
+
+def test_memory_backend_expires_keys(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(store_module.time, "time", lambda: now[0])
+    backend = MemoryBackend()
+    set_session_backend(backend)
+    store = SessionStore("t", ttl=10)
+
+    store.set(("u1", "s1"), {"history": []})
+    store.set("short", 1, ttl=2)
+    assert store.get(("u1", "s1")) == {"history": []}
+    assert "short" in store
+
+    now[0] += 5
+    assert store.get("short") is None
+    store.set("other", 2)  # writes purge expired deadlines
+    assert len(backend) == 2
+    now[0] += 6
+    assert store.get(("u1", "s1")) is None
+
+
+def test_sql_backend_is_shared_and_pops_once(app):
+    set_session_backend(SQLBackend())
+    a = SessionStore("newbie_test", ttl=60)
+    b = SessionStore("newbie_test", ttl=60)  # e.g. another worker
+
+    a.set("t1", {"answers": {"1": "B"}})
+    assert b.get("t1") == {"answers": {"1": "B"}}
+    a.set("t1", {"answers": {"1": "C"}})
+    assert SessionEntry.query.count() == 1
+
+    assert b.pop("t1") == {"answers": {"1": "C"}}
+    assert a.pop("t1") is None
+    assert not a.delete("t1")
+
+
+def test_sql_backend_ignores_expired_rows(app):
+    set_session_backend(SQLBackend())
+    store = SessionStore("email_otp", ttl=60)
+    store.set("a@example.com", {"code": "123456"})
+    SessionEntry.query.update({SessionEntry.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    store_module.db.session.commit()
+    assert store.get("a@example.com") is None
+
+
+def test_recommend_chat_runs_on_sql_backend(client, auth_header, make_student):
+    set_session_backend(SQLBackend())
+    student = make_student()
+    headers = auth_header(student.user_id)
+    session_id = client.post("/api/student/recommend/chat/init", headers=headers).get_json()["sessionId"]
+    set_stream_provider(lambda prompt, model_name: iter(["Chào bạn!"]))
+
+    resp = client.post("/api/student/recommend/chat/message?stream=1", headers=headers,
+                       json={"sessionId": session_id, "message": "Xin chào"})
+    resp.get_data()
+    history = student_routes._AI_CHAT_SESSIONS.get((student.user_id, session_id))["history"]
+    assert [m["role"] for m in history] == ["user", "assistant"]
+
+    resp = client.delete("/api/student/recommend/chat/clear", headers=headers, json={"sessionId": session_id})
+    assert resp.status_code == 200
+    assert SessionEntry.query.count() == 0
+
+
+def test_otp_verify_uses_store(app):
+    otp_app = Flask(__name__)
+    otp_app.register_blueprint(email_routes.email_verification_bp)
+    otp_client = otp_app.test_client()
+    email = "new@example.com"
+    email_routes._OTP_STORAGE.set(email, {
+        "code": "123456",
+        "expires_at": (datetime.utcnow() + timedelta(minutes=5)).isoformat(),
+        "verified": False,
+        "attempts": 0,
+    })
+
+    resp = otp_client.post("/api/auth/verify-otp", json={"email": email, "code": "000000"})
+    assert resp.get_json()["remaining"] == 4
+    resp = otp_client.post("/api/auth/verify-otp", json={"email": email, "code": "123456"})
+    assert resp.status_code == 200
+    assert email_routes.is_email_verified(email)
+    email_routes.clear_otp(email)
+    assert not email_routes.is_email_verified(email)
+
+
+def test_memory_backend_drains_only_due_buckets(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(store_module.time, "time", lambda: now[0])
+    backend = MemoryBackend()
+    for i in range(1000):
+        backend.set(f"k{i}", "{}", ttl=10 + i % 50)
+    backend.set("k0", "{}", ttl=100)  # rewritten: its old deadline is skipped
+    now[0] += 20
+    backend.set("x", "{}", ttl=60)
+    assert len(backend) == 1000 - 199 + 1  # ttl 10..19 came due, except the rewritten k0
+    assert backend.get("k0") == "{}"
+    now[0] += 10_000  # idle gap: only existing buckets are visited
+    backend.set("y", "{}", ttl=60)
+    assert len(backend) == 1 and len(backend._wheel) == 1
+
+
+def test_recommend_chat_caps_sessions_and_history(client, auth_header, make_student, monkeypatch):
+    monkeypatch.setattr(student_routes, "_MAX_SESSIONS_PER_USER", 2)
+    monkeypatch.setattr(student_routes, "_MAX_HISTORY_MESSAGES", 3)
+    student = make_student()
+    headers = auth_header(student.user_id)
+    ids = [client.post("/api/student/recommend/chat/init", headers=headers).get_json()["sessionId"]
+           for _ in range(3)]
+    assert student_routes._AI_CHAT_SESSIONS.get((student.user_id, ids[0])) is None
+    assert [e[0] for e in student_routes._AI_CHAT_USER_SESSIONS.get(student.user_id)] == ids[1:]
+
+    set_stream_provider(lambda prompt, model_name: iter(["ok"]))
+    for text in ("một", "hai"):
+        client.post("/api/student/recommend/chat/message?stream=1", headers=headers,
+                    json={"sessionId": ids[2], "message": text}).get_data()
+    history = student_routes._AI_CHAT_SESSIONS.get((student.user_id, ids[2]))["history"]
+    assert [m["text"] for m in history] == ["ok", "hai", "ok"]
+
+    client.delete("/api/student/recommend/chat/clear", headers=headers, json={"sessionId": ids[1]})
+    assert [e[0] for e in student_routes._AI_CHAT_USER_SESSIONS.get(student.user_id)] == ids[2:]
+
+
+def test_sql_backend_value_is_longtext_on_mysql():
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateTable
+
+    ddl = str(CreateTable(SessionEntry.__table__).compile(dialect=mysql.dialect()))
+    assert "`Value` LONGTEXT NOT NULL" in ddl
@@ -0,0 +1,173 @@
+"""Grading path for POST /api/student/tests/<id>/submit."""
+import pytest
+
+from app.models import db
+
+
+def _answers(test, pick_correct):
+    answers = []
+    for q in test.questions:
+        choice = next(c for c in q.choices if c.is_correct == pick_correct)
+        answers.append({"questionId": q.id, "choiceId": choice.id})
+    return answers
+
+
+def _post(client, test_id, answers, headers):
+    res = client.post(f"/api/student/tests/{test_id}/submit", json={"answers": answers}, headers=headers)
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def _submit(client, test, headers, pick_correct):
+    return _post(client, test.id, _answers(test, pick_correct), headers)
+
+
+def test_submit_scores_on_scale_of_ten(client, make_course, make_test, make_student, auth_header):
+    test = make_test(make_course(), num_questions=4)
+    headers = auth_header(make_student().user_id)
+    body = _submit(client, test, headers, pick_correct=True)
+    assert body["score"] == 10
+    assert body["correctCount"] == 4
+    assert body["totalQuestions"] == 4
+    assert all(r["isCorrect"] for r in body["questionResults"])
+
+    body = _submit(client, test, headers, pick_correct=False)
+    assert body["score"] == 0
+    assert body["passed"] is False
+
+
+def test_grading_query_count_does_not_grow_with_questions(client, make_course, make_test, make_student,
+                                                          auth_header, count_queries):
+    course = make_course()
+    headers = auth_header(make_student().user_id)
+    counts = []
+    for n in (2, 30):
+        test = make_test(course, num_questions=n)
+        answers = _answers(test, pick_correct=True)
+        db.session.expire_all()
+        with count_queries() as counter:
+            _post(client, test.id, answers, headers)
+        counts.append(counter.count)
+    assert counts[0] == counts[1]
+
+
+def test_question_edit_invalidates_answer_key(client, make_course, make_test, make_student, auth_header):
+    course = make_course()
+    test = make_test(course, num_questions=1)
+    headers = auth_header(make_student().user_id)
+    assert _submit(client, test, headers, pick_correct=True)["score"] == 10
+
+    question = test.questions[0]
+    res = client.put(
+        f"/questions/{question.id}",
+        json={"choices": [{"text": "new right", "isCorrect": True}, {"text": "new wrong"}]},
+        headers=auth_header(course.instructor.user_id, role="instructor"),
+    )
+    assert res.status_code == 200
+    db.session.expire_all()
+    assert _submit(client, test, headers, pick_correct=True)["score"] == 10
+    assert _submit(client, test, headers, pick_correct=False)["score"] == 0
+
+
+def test_attempts_are_numbered_and_limited(client, make_course, make_test, make_student, auth_header):
+    from app.models.model import Answer, TestAttempt as Attempt
+
+    test = make_test(make_course(), num_questions=3)
+    test.attempts_allowed = 2
+    db.session.commit()
+    student = make_student()
+    headers = auth_header(student.user_id)
+
+    first = _submit(client, test, headers, pick_correct=True)
+    second = _submit(client, test, headers, pick_correct=False)
+    res = client.post(f"/api/student/tests/{test.id}/submit",
+                      json={"answers": _answers(test, True)}, headers=headers)
+    assert res.status_code == 403
+
+    attempts = Attempt.query.filter_by(student_id=student.id).order_by(Attempt.attempt_number).all()
+    assert [a.attempt_number for a in attempts] == [1, 2]
+    assert [a.id for a in attempts] == [first["attemptId"], second["attemptId"]]
+    answers = Answer.query.filter_by(attempt_id=first["attemptId"]).all()
+    assert len(answers) == 3
+    assert all(float(a.score_given) == 1 for a in answers)
+
+
+def test_unknown_choice_is_graded_as_unanswered(client, make_course, make_test, make_student, auth_header,
+                                                foreign_keys):
+    from app.models.model import Answer
+
+    test = make_test(make_course(), num_questions=2)
+    other = make_test(make_course(), num_questions=1)
+    answers = _answers(test, pick_correct=True)
+    answers[1]["choiceId"] = other.questions[0].choices[0].id  # correct choice of another test
+    body = _post(client, test.id, answers, auth_header(make_student().user_id))
+    assert body["correctCount"] == 1
+    assert body["questionResults"][1]["userChoiceId"] is None
+    stored = Answer.query.filter_by(attempt_id=body["attemptId"]).order_by(Answer.question_id).all()
+    assert [a.choice_id for a in stored] == [answers[0]["choiceId"], None]
+
+
+def test_submit_fails_when_attempt_is_not_stored(client, make_course, make_test, make_student, auth_header,
+                                                 monkeypatch):
+    from app.routes import Student as student_routes
+
+    def _broken(*args, **kwargs):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(student_routes, "record_attempt", _broken)
+    test = make_test(make_course(), num_questions=1)
+    res = client.post(f"/api/student/tests/{test.id}/submit",
+                      json={"answers": _answers(test, True)}, headers=auth_header(make_student().user_id))
+    assert res.status_code == 500
+    assert res.get_json()["success"] is False
+
+
+def test_only_attempt_number_conflicts_are_retried(client, make_course, make_test, make_student, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from app.services import grading
+
+    test = make_test(make_course(), num_questions=1)
+    student = make_student()
+    graded = grading.grade_submission(grading.get_answer_key(test.id), {})
+    calls = []
+    real_bump = grading._bump_test_stats
+
+    def _failing_bump(*args):
+        calls.append(args)
+        raise IntegrityError("INSERT INTO Answers ...", {}, Exception("NOT NULL constraint failed: Answers.X"))
+
+    monkeypatch.setattr(grading, "_bump_test_stats", _failing_bump)
+    with pytest.raises(IntegrityError):
+        grading.record_attempt(test, student.id, 0, graded)
+    assert len(calls) == 1
+
+    def _racing_bump(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise IntegrityError("INSERT INTO student_test_stats ...", {},
+                                 Exception("UNIQUE constraint failed: student_test_stats.StudentId"))
+        return real_bump(*args)
+
+    monkeypatch.setattr(grading, "_bump_test_stats", _racing_bump)
+    assert grading.record_attempt(test, student.id, 0, graded) is not None
+    assert len(calls) == 3
+
+
+def test_question_edits_keep_answers_consistent(client, make_course, make_test, make_student, auth_header,
+                                                foreign_keys):
+    from app.models.model import Answer
+
+    course = make_course()
+    test = make_test(course, num_questions=2)
+    headers = auth_header(make_student().user_id)
+    instructor = auth_header(course.instructor.user_id, role="instructor")
+    attempt_id = _submit(client, test, headers, pick_correct=True)["attemptId"]
+    edited, removed = test.questions[0].id, test.questions[1].id
+
+    res = client.put(f"/questions/{edited}", json={"choices": [{"text": "new", "isCorrect": True}]},
+                     headers=instructor)
+    assert res.status_code == 200
+    assert client.delete(f"/questions/{removed}", headers=instructor).status_code == 200
+
+    stored = Answer.query.filter_by(attempt_id=attempt_id).all()
+    assert [(a.question_id, a.choice_id, float(a.score_given)) for a in stored] == [(edited, None, 1)]
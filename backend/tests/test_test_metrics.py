@@ -0,0 +1,71 @@
+"""Aggregated /api/student/test-metrics and the stats backfill."""
+from datetime import datetime
+
+from app.models import db
+from app.models.model import TestAttempt as Attempt
+from app.models.student_test_stats import StudentTestStats
+from app.services.grading import rebuild_test_stats
+
+
+def _metrics(client, headers):
+    res = client.get("/api/student/test-metrics", headers=headers)
+    assert res.status_code == 200
+    return res.get_json()
+
+
+def _submit_all(client, test, headers, correct):
+    answers = [
+        {"questionId": q.id, "choiceId": next(c.id for c in q.choices if c.is_correct == correct)}
+        for q in test.questions
+    ]
+    res = client.post(f"/api/student/tests/{test.id}/submit", json={"answers": answers}, headers=headers)
+    assert res.status_code == 200
+
+
+def test_metrics_follow_submissions(client, make_course, make_test, make_student, auth_header):
+    test = make_test(make_course(), num_questions=2)
+    student = make_student()
+    headers = auth_header(student.user_id)
+    assert _metrics(client, headers)["testsTaken"] == 0
+
+    _submit_all(client, test, headers, correct=True)
+    _submit_all(client, test, headers, correct=False)
+    body = _metrics(client, headers)
+    assert body["testsTaken"] == 2
+    assert body["averageScore10"] == 5.0
+    assert body["averagePercentage"] == 50.0
+
+    stats = db.session.get(StudentTestStats, (student.id, test.id))
+    assert stats.attempt_count == 2
+    assert float(stats.best_score) == 10
+
+
+def test_rebuild_stats_from_existing_attempts(client, make_course, make_test, make_student, auth_header):
+    test = make_test(make_course(), num_questions=1)
+    student = make_student()
+    now = datetime.utcnow()
+    for number, score in enumerate((2, 6, 7), start=1):
+        db.session.add(Attempt(student_id=student.id, test_id=test.id, attempt_number=number,
+                               start_time=now, total_score=score))
+    db.session.commit()
+
+    assert rebuild_test_stats() == 1
+    body = _metrics(client, auth_header(student.user_id))
+    assert body["testsTaken"] == 3
+    assert body["averageScore10"] == 5.0
+
+
+def test_deleting_tests_drops_their_stats(client, make_course, make_test, make_student, auth_header, foreign_keys):
+    course = make_course()
+    first, second = make_test(course, num_questions=1), make_test(course, num_questions=1)
+    headers = auth_header(make_student().user_id)
+    instructor = auth_header(course.instructor.user_id, role="instructor")
+    _submit_all(client, first, headers, correct=True)
+    _submit_all(client, second, headers, correct=True)
+    assert _metrics(client, headers)["testsTaken"] == 2
+
+    assert client.delete(f"/tests/{first.id}", headers=instructor).status_code == 200
+    assert _metrics(client, headers)["testsTaken"] == 1
+    assert client.delete(f"/lessons/{second.lesson_id}", headers=instructor).status_code == 200
+    assert _metrics(client, headers)["testsTaken"] == 0
+    assert StudentTestStats.query.count() == 0 and Attempt.query.count() == 0
@@ -0,0 +1,80 @@
+"""Streaming chat/AI uploads: content-hash names, size limits while streaming, range and ETag serving."""
+import hashlib
+import io
+
+import pytest
+
+from app.routes import AI as ai_routes
+from app.routes import Chat as chat_routes
+
+
+@pytest.fixture()
+def upload_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_routes, "UPLOAD_DIR", tmp_path / "chat")
+    monkeypatch.setattr(ai_routes, "UPLOAD_DIR", tmp_path / "ai")
+    return tmp_path
+
+
+@pytest.fixture()
+def headers(auth_header, make_student):
+    return auth_header(make_student().user_id)
+
+
+def _post_file(client, headers, content, name="notes.txt"):
+    return client.post("/api/chat/upload", headers=headers,
+                       data={"file": (io.BytesIO(content), name)}, content_type="multipart/form-data")
+
+
+def test_chat_upload_is_named_by_content_hash(client, headers, upload_dirs):
+    content = b"hello chat\n" * 100
+    first = _post_file(client, headers, content)
+    second = _post_file(client, headers, content, name="copy.txt")
+    assert first.status_code == 200
+    digest = hashlib.sha256(content).hexdigest()
+    assert first.get_json()["content"] == f"/api/chat/uploads/{digest}.txt"
+    assert second.get_json()["content"] == first.get_json()["content"]
+    assert second.get_json()["original_filename"] == "copy.txt"
+    assert [p.name for p in (upload_dirs / "chat").iterdir()] == [f"{digest}.txt"]
+
+
+def test_size_limit_is_enforced_while_streaming(client, headers, upload_dirs, monkeypatch):
+    monkeypatch.setattr(chat_routes, "MAX_SIZE", 1000)
+    resp = _post_file(client, headers, b"x" * 5000)  # under the Content-Length pre-check
+    assert resp.status_code == 413
+    assert list((upload_dirs / "chat").iterdir()) == []
+
+    resp = _post_file(client, headers, b"x" * 200_000)  # rejected from Content-Length alone
+    assert resp.status_code == 413
+
+
+def test_rejects_unsupported_type(client, headers, upload_dirs):
+    resp = _post_file(client, headers, b"MZ", name="tool.exe")
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "Unsupported file type"
+
+
+def test_ai_raw_body_upload(client, upload_dirs):
+    content = b"# notes\n"
+    resp = client.post("/api/ai/upload?filename=my notes.md", data=content,
+                       content_type="application/octet-stream")
+    body = resp.get_json()
+    assert body["file_name"] == "my_notes.md"
+    assert body["size"] == len(content)
+    assert body["url"].endswith(f"{hashlib.sha256(content).hexdigest()}.md")
+
+
+def test_serving_supports_range_and_etag(client, headers, upload_dirs):
+    content = bytes(range(256)) * 4
+    url = _post_file(client, headers, content, name="data.zip").get_json()["content"]
+
+    full = client.get(url)
+    assert full.data == content
+    assert full.headers["ETag"] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert "immutable" in full.headers["Cache-Control"]
+
+    partial = client.get(url, headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.data == content[10:20]
+
+    cached = client.get(url, headers={"If-None-Match": full.headers["ETag"]})
+    assert cached.status_code == 304
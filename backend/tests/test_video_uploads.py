@@ -0,0 +1,171 @@
+"""Resumable video uploads: spooled parts, background push with retries, job status."""
+import io
+import time
+
+import pytest
+
+from app.services import video_uploads
+from app.services.video_uploads import LocalVideoStorage, set_video_storage
+
+VIDEO = bytes(range(256)) * 40  # 10 KiB
+
+
+class FlakyStorage(LocalVideoStorage):
+    """Local stand-in whose parts fail ``failures`` times before going through."""
+
+    def __init__(self, root, failures=0):
+        super().__init__(root=root, base_url="/videos")
+        self.failures = failures
+        self.offsets = []
+
+    def put_chunk(self, state, offset, data, size):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        self.offsets.append(offset)
+        return super().put_chunk(state, offset, data, size)
+
+
+@pytest.fixture()
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_uploads, "SPOOL_DIR", tmp_path / "spool")
+    monkeypatch.setattr(video_uploads, "PUSH_CHUNK_SIZE", 4096)
+    monkeypatch.setattr(video_uploads, "PUSH_BACKOFF", 0)
+    backend = FlakyStorage(tmp_path / "videos")
+    set_video_storage(backend)
+    return backend
+
+
+@pytest.fixture()
+def headers(auth_header):
+    return auth_header(42, "instructor")
+
+
+def _wait_for(client, url, headers, statuses=("done", "failed"), timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(url, headers=headers).get_json()
+        if status["status"] in statuses or time.monotonic() > deadline:
+            return status
+        time.sleep(0.02)
+
+
+def test_resumable_upload_is_pushed_in_background(client, headers, storage):
+    created = client.post("/api/upload/video/sessions", headers=headers,
+                          json={"filename": "Bài 1.mp4", "size": len(VIDEO)})
+    assert created.status_code == 201
+    url = created.get_json()["upload_url"]
+
+    first = client.put(url, headers={**headers, "Content-Range": f"bytes 0-2999/{len(VIDEO)}"}, data=VIDEO[:3000])
+    assert first.status_code == 200 and first.get_json()["received"] == 3000
+
+    # A client that lost track resends from the wrong offset and is told where to resume
+    stale = client.put(url + "?offset=0", headers=headers, data=VIDEO[:3000])
+    assert stale.status_code == 409 and stale.get_json()["received"] == 3000
+
+    last = client.put(url + "?offset=3000", headers=headers, data=VIDEO[3000:])
+    assert last.status_code == 202
+
+    status = _wait_for(client, url, headers)
+    assert status["status"] == "done" and status["progress"] == 1.0
+    assert storage.offsets == [0, 4096, 8192]
+    stored = storage.root / (status["publicId"] + ".mp4")
+    assert stored.read_bytes() == VIDEO
+    assert status["url"] == f"/videos/{status['publicId']}.mp4"
+    assert not (video_uploads.SPOOL_DIR / status["upload_id"] / "data.part").exists()
+
+
+def test_failed_parts_are_retried(storage):
+    storage.failures = 2
+    session = video_uploads.create_session("lecture.mp4", len(VIDEO))
+    video_uploads.append_chunk(session.id, 0, io.BytesIO(VIDEO))
+    session = video_uploads.push_session(session.id)
+    assert session.status == "done"
+    assert session.attempts == 2
+    assert storage.offsets == [0, 4096, 8192]
+
+
+def test_push_resumes_after_giving_up(client, headers, storage, monkeypatch):
+    monkeypatch.setattr(video_uploads, "PUSH_MAX_RETRIES", 0)
+    created = client.post("/api/upload/video/sessions", headers=headers,
+                          json={"filename": "lecture.mp4", "size": len(VIDEO)}).get_json()
+    upload_id = created["upload_id"]
+    video_uploads.append_chunk(upload_id, 0, io.BytesIO(VIDEO))
+
+    real_put = FlakyStorage.put_chunk
+    monkeypatch.setattr(FlakyStorage, "put_chunk",
+                        lambda self, state, offset, data, size: (_ for _ in ()).throw(ConnectionError("down"))
+                        if offset == 4096 else real_put(self, state, offset, data, size))
+    failed = video_uploads.push_session(upload_id)
+    assert failed.status == "failed" and failed.pushed == 4096
+
+    monkeypatch.setattr(FlakyStorage, "put_chunk", real_put)
+    resp = client.post(f"/api/upload/video/sessions/{upload_id}/retry", headers=headers)
+    assert resp.status_code == 202
+    status = _wait_for(client, created["upload_url"], headers)
+    assert status["status"] == "done"
+    assert storage.offsets == [0, 4096, 8192]
+    assert (storage.root / (status["publicId"] + ".mp4")).read_bytes() == VIDEO
+
+
+def test_legacy_endpoint_pushes_through_storage(client, storage):
+    locks_before = set(video_uploads._SESSION_LOCKS)
+    resp = client.post("/api/upload/video", data={"file": (io.BytesIO(VIDEO), "intro.mp4")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert (storage.root / (body["publicId"] + ".mp4")).read_bytes() == VIDEO
+    assert list(video_uploads.SPOOL_DIR.iterdir()) == []
+    assert set(video_uploads._SESSION_LOCKS) <= locks_before
+
+
+def test_legacy_endpoint_async_status_and_failure_cleanup(client, headers, storage, monkeypatch):
+    def _post(url, **kwargs):
+        return client.post(url, data={"file": (io.BytesIO(VIDEO), "intro.mp4")},
+                           content_type="multipart/form-data", **kwargs)
+
+    assert _post("/api/upload/video?async=1").status_code == 401
+    queued = _post("/api/upload/video?async=1", headers=headers)
+    assert queued.status_code == 202
+    status = _wait_for(client, f"/api/upload/video/sessions/{queued.get_json()['upload_id']}", headers)
+    assert status["status"] == "done"
+
+    monkeypatch.setattr(video_uploads, "PUSH_MAX_RETRIES", 0)
+    storage.failures = 1
+    assert _post("/api/upload/video", headers=headers).status_code == 500
+    assert [d.name for d in video_uploads.SPOOL_DIR.iterdir()] == [status["upload_id"]]
+
+
+def test_sweep_requeues_stale_pushes_and_expires_spool(storage):
+    from datetime import datetime, timedelta
+
+    stalled = video_uploads.create_session("lecture.mp4", len(VIDEO))
+    video_uploads.append_chunk(stalled.id, 0, io.BytesIO(VIDEO))
+    stalled = video_uploads.UploadSession.load(stalled.id)
+    stalled.status = "uploading"  # its worker died mid-push
+    stalled.save()
+    abandoned = video_uploads.create_session("draft.mp4", len(VIDEO))
+
+    later = datetime.utcnow() + timedelta(seconds=video_uploads.STALE_JOB_AFTER + 1)
+    assert video_uploads.sweep_sessions(now=later) == {"requeued": [stalled.id], "expired": []}
+    deadline = time.monotonic() + 5
+    while video_uploads.UploadSession.load(stalled.id).status != "done" and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert video_uploads.UploadSession.load(stalled.id).status == "done"
+
+    much_later = datetime.utcnow() + timedelta(seconds=video_uploads.SPOOL_TTL + 1)
+    swept = video_uploads.sweep_sessions(now=much_later)
+    assert sorted(swept["expired"]) == sorted([stalled.id, abandoned.id])
+    assert list(video_uploads.SPOOL_DIR.iterdir()) == []
+    assert stalled.id not in video_uploads._SESSION_LOCKS and abandoned.id not in video_uploads._SESSION_LOCKS
+
+
+def test_sessions_are_private_and_validated(client, headers, auth_header, storage):
+    resp = client.post("/api/upload/video/sessions", headers=headers, json={"filename": "notes.pdf", "size": 10})
+    assert resp.status_code == 400
+    created = client.post("/api/upload/video/sessions", headers=headers,
+                          json={"filename": "a.mp4", "size": 10}).get_json()
+    other = auth_header(7, "instructor")
+    assert client.get(created["upload_url"], headers=other).status_code == 404
+    too_much = client.put(created["upload_url"] + "?offset=0", headers=headers, data=b"x" * 11)
+    assert too_much.status_code == 413 and too_much.get_json()["received"] == 0
@@ -0,0 +1,79 @@
+"""Batched week descriptions of a learning path (app.services.ai_learning_path)."""
+import json
+import time
+
+from app.services import ai_learning_path, llm_client
+from app.services.ai_learning_path import generate_week_description, generate_week_descriptions
+from app.services.llm_client import FakeLLMBackend
+
+WEEKS = [[{"title": "Python cơ bản"}], [{"title": "OOP"}], [{"title": "Flask"}, {"title": "SQL"}]]
+
+
+def _batched_reply(prompt, model):
+    if '"weeks"' in prompt:
+        return json.dumps({"weeks": [{"week": w, "description": f"AI tuần {w}"} for w in (1, 2, 3)]})
+    return "per-week"
+
+
+def _install(**kwargs):
+    backend = FakeLLMBackend(**kwargs)
+    llm_client.set_llm_backend(backend)
+    return backend
+
+
+def test_one_structured_call_covers_every_week(app):
+    backend = _install(responder=_batched_reply)
+    assert generate_week_descriptions("beginner", ["logic"], ["web"], WEEKS) == ["AI tuần 1", "AI tuần 2", "AI tuần 3"]
+    assert len(backend.calls) == 1
+    assert "Flask" in backend.calls[0][2] and "SQL" in backend.calls[0][2]
+
+
+def test_weeks_missing_from_the_batch_are_fanned_out(app):
+    def _partial(prompt, model):
+        if '"weeks"' in prompt:
+            return json.dumps({"weeks": [{"week": 2, "description": "AI tuần 2"}]})
+        return "riêng tuần " + ("1" if "Week number: 1" in prompt else "3")
+
+    backend = _install(responder=_partial)
+    result = generate_week_descriptions("beginner", [], [], WEEKS)
+    assert result == ["riêng tuần 1", "AI tuần 2", "riêng tuần 3"]
+    assert len(backend.calls) == 3
+
+
+def test_deadline_falls_back_to_deterministic_text(app):
+    _install(responder=lambda prompt, model: "not json", latency=0.3)
+    started = time.monotonic()
+    result = generate_week_descriptions("beginner", ["logic"], ["web"], WEEKS, deadline=0.4)
+    assert time.monotonic() - started < 0.8
+    assert result == [generate_week_description("beginner", ["logic"], ["web"], w) for w in (1, 2, 3)]
+    assert len(ai_learning_path._DESCRIPTION_CACHE) == 0  # partial results are not cached
+
+
+def test_results_are_cached_per_profile_and_course_set(app):
+    backend = _install(responder=_batched_reply)
+    generate_week_descriptions("beginner", ["logic", "oop"], ["web"], WEEKS)
+    generate_week_descriptions("Beginner", ["oop", "logic"], ["web"], WEEKS)
+    assert len(backend.calls) == 1
+
+    generate_week_descriptions("beginner", ["logic", "oop"], ["web"], WEEKS[:2] + [[{"title": "Django"}]])
+    assert len(backend.calls) == 2
+
+
+def test_without_a_provider_every_week_is_deterministic(app):
+    assert generate_week_descriptions("advanced", [], [], WEEKS[:2]) == [
+        generate_week_description("advanced", [], [], 1),
+        generate_week_description("advanced", [], [], 2),
+    ]
+
+
+def test_fenced_json_answer_for_a_long_path_is_one_call(app):
+    weeks = [[{"title": f"Khóa {w}"}] for w in range(1, 13)]
+    fenced = "```json\n" + json.dumps(
+        {"weeks": [{"week": w, "description": f"AI tuần {w}"} for w in range(1, 13)]}, ensure_ascii=False
+    ) + "\n```"
+    backend = _install(responder=lambda prompt, model: fenced)
+    result = generate_week_descriptions("beginner", ["logic"], ["web"], weeks)
+    assert result == [f"AI tuần {w}" for w in range(1, 13)]
+    assert len(backend.calls) == 1
+    assert backend.options[0]["json"] is True
+    assert backend.options[0]["max_tokens"] > ai_learning_path.AI_MAX_TOKENS